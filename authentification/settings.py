@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,6 +54,11 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Identifiant de corrélation (X-Request-ID) des événements de la requête
+    "users.evenements.CorrelationMiddleware",
+    # Mesure aussi les requêtes SQL des middlewares suivants
+    "users.profilage.ProfilageSQLMiddleware",
+    "users.metriques.MetriquesMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -62,6 +68,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "users.audit.TamponAuditMiddleware",
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -100,6 +107,59 @@ WSGI_APPLICATION = "authentification.wsgi.application"
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication',)
 }
+# Cache des réponses de lecture (users/cache.py). Cache fichier partagé par
+# tous les workers de la machine : une invalidation (nouvelle version
+# d'étiquette) faite par l'un est vue par les autres, ce que ne permet pas
+# un cache mémoire propre à chaque processus.
+CACHE_DIR = os.environ.get(
+    'CACHE_DIR', os.path.join(tempfile.gettempdir(), 'afriktexia-cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+CACHE_REPONSES_DUREE = 60  # Durée de vie (s) d'une réponse en cache
+# Tableau de bord : servi frais pendant 30 s, puis périmé (et recalculé en
+# arrière-plan) jusqu'à 300 s
+CACHE_REVALIDATION_FRAICHE = 30
+CACHE_REVALIDATION_PERIMEE = 300
+
+# Journal d'audit : écrit par lots en fin de requête ; AUDIT_ASYNCHRONE
+# confie les lots à un thread d'arrière-plan (file de AUDIT_TAILLE_FILE lots)
+AUDIT_TAILLE_LOT = 500
+AUDIT_ASYNCHRONE = os.environ.get('AUDIT_ASYNCHRONE') == '1'
+AUDIT_TAILLE_FILE = 10000
+# Rétention : les entrées plus anciennes sont déplacées par archiver_audit
+# vers des archives mensuelles compressées (hors MEDIA_ROOT : non servies)
+AUDIT_RETENTION_JOURS = 365
+AUDIT_ARCHIVES_DIR = os.environ.get(
+    'AUDIT_ARCHIVES_DIR', os.path.join(BASE_DIR, 'archives', 'audit'))
+
+# Profilage SQL (users/profilage.py) : en-tête Server-Timing sur une fraction
+# PROFILAGE_SQL_ECHANTILLON des requêtes, requêtes de plus de
+# PROFILAGE_SQL_SEUIL_MS écrites avec leurs requêtes SQL les plus lentes
+PROFILAGE_SQL_ECHANTILLON = float(os.environ.get('PROFILAGE_SQL_ECHANTILLON', '1'))
+PROFILAGE_SQL_SEUIL_MS = int(os.environ.get('PROFILAGE_SQL_SEUIL_MS', '500'))
+PROFILAGE_SQL_ENTETE_REQUETES = DEBUG
+PROFILAGE_SQL_FICHIER = os.environ.get(
+    'PROFILAGE_SQL_FICHIER', os.path.join(BASE_DIR, 'logs', 'requetes-lentes.log'))
+
+# Métriques Prometheus (users/metriques.py), servies sur /metrics/ avec
+# le jeton METRIQUES_JETON. Avec plusieurs workers gunicorn, METRIQUES_DIR
+# est un répertoire local commun où chaque worker dépose ses valeurs
+METRIQUES_JETON = os.environ.get('METRIQUES_JETON')
+METRIQUES_DIR = os.environ.get('METRIQUES_DIR')
+
+# Journal d'événements structuré (users/evenements.py), en lignes JSON écrites
+# par un thread d'arrière-plan ; STOCK_TRACE=1 ajoute la trace détaillée de
+# chaque mouvement de stock (niveau DEBUG)
+STOCK_TRACE = os.environ.get('STOCK_TRACE') == '1'
+EVENEMENTS_NIVEAU = os.environ.get('EVENEMENTS_NIVEAU', 'DEBUG' if STOCK_TRACE else 'INFO')
+EVENEMENTS_FICHIER = os.environ.get(
+    'EVENEMENTS_FICHIER', os.path.join(BASE_DIR, 'logs', 'evenements.log'))
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -114,6 +174,13 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            # Les threads d'arrière-plan (PDF, images, audit) écrivent aussi :
+            # prendre le verrou d'écriture dès le début de la transaction
+            # évite les « database is locked » immédiats sur conflit
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
         }
     }
 
@@ -179,6 +246,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 # Configuration pour les images (optionnel)
 IMAGE_MAX_SIZE = (800, 800)  # Taille max des images
 THUMBNAIL_SIZE = (150, 150)  # Taille des miniatures
+IMAGES_WORKERS = 2  # Processus de traitement d'images par worker
+
+# Factures PDF (users/factures.py)
+FACTURE_ENTREPRISE = 'Afriktexia'
+FACTURES_PDF_WORKERS = 2  # Processus de rendu par worker
+FACTURES_PDF_TIMEOUT = 15  # Attente max (s) d'un rendu lors d'un téléchargement
 
 
 # Default primary key field type
@@ -10,5 +10,8 @@ pip install -r requirements.txt
 # Appliquer les migrations
 python manage.py migrate
 
+# Factures des ventes confirmées avant leur génération automatique
+python manage.py creer_factures_manquantes
+
 # Collecter les fichiers statiques
 python manage.py collectstatic --noinput
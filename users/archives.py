@@ -0,0 +1,156 @@
+# archives.py
+"""
+Archives froides du journal d'audit.
+
+Les entrées plus anciennes que AUDIT_RETENTION_JOURS sont déplacées par
+`archiver_audit` dans des fichiers JSONL compressés, un par mois
+(AUDIT_ARCHIVES_DIR/audit-AAAA-MM.jsonl.gz). Chaque exécution ajoute un
+membre gzip au fichier du mois ; gzip relit les membres à la suite.
+
+Par lot : les lignes sont d'abord écrites (et synchronisées sur disque),
+puis supprimées de la base dans la même transaction que le cumul de leurs
+comptes journaliers (AuditJournalier). Une interruption entre les deux
+laisse au pire des doublons dans l'archive, ignorés à la lecture.
+"""
+import gzip
+import json
+import os
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+AUDIT_RETENTION_JOURS = getattr(settings, 'AUDIT_RETENTION_JOURS', 365)
+AUDIT_ARCHIVES_DIR = getattr(
+    settings, 'AUDIT_ARCHIVES_DIR', os.path.join(settings.BASE_DIR, 'archives', 'audit'))
+
+CHAMPS_ARCHIVE = (
+    'id', 'created_at', 'user_id', 'user__email', 'action', 'modele', 'objet_id',
+    'entrepot_id', 'produit_id', 'vente_id', 'montant', 'details',
+)
+FORMAT_MOIS = re.compile(r'^\d{4}-\d{2}$')
+
+
+def chemin_archive(mois):
+    return os.path.join(AUDIT_ARCHIVES_DIR, f'audit-{mois}.jsonl.gz')
+
+
+def _ligne(entree):
+    ligne = dict(entree)
+    ligne['created_at'] = timezone.localtime(entree['created_at']).isoformat()
+    ligne['user_email'] = ligne.pop('user__email')
+    if ligne['montant'] is not None:
+        ligne['montant'] = str(ligne['montant'])
+    return ligne
+
+
+def _ecrire_archives(lignes_par_mois):
+    os.makedirs(AUDIT_ARCHIVES_DIR, exist_ok=True)
+    for mois, lignes in lignes_par_mois.items():
+        with open(chemin_archive(mois), 'ab') as fichier:
+            with gzip.GzipFile(fileobj=fichier, mode='wb') as gz:
+                for ligne in lignes:
+                    gz.write(json.dumps(ligne, ensure_ascii=False).encode('utf-8'))
+                    gz.write(b'\n')
+            fichier.flush()
+            os.fsync(fichier.fileno())
+
+
+def archiver_audit(jours=AUDIT_RETENTION_JOURS, taille_lot=5000):
+    """
+    Archiver puis supprimer les entrées de plus de `jours` jours.
+    Retourne le nombre d'entrées archivées par mois.
+    """
+    from .models import AuditLog, AuditJournalier
+    from .recherche import desindexer
+
+    limite = timezone.now() - timedelta(days=jours)
+    anciennes = AuditLog.objects.filter(created_at__lt=limite).order_by('created_at', 'id')
+    archives = Counter()
+
+    while True:
+        lot = list(anciennes.values(*CHAMPS_ARCHIVE)[:taille_lot])
+        if not lot:
+            break
+
+        lignes_par_mois = {}
+        comptes = Counter()
+        for entree in lot:
+            ligne = _ligne(entree)
+            jour = timezone.localtime(entree['created_at']).date()
+            lignes_par_mois.setdefault(jour.strftime('%Y-%m'), []).append(ligne)
+            comptes[(jour, entree['action'], entree['modele'])] += 1
+        _ecrire_archives(lignes_par_mois)
+
+        ids = [entree['id'] for entree in lot]
+        with transaction.atomic():
+            AuditJournalier.cumuler(comptes)
+            AuditLog.objects.filter(pk__in=ids).delete()
+            desindexer(AuditLog, ids)
+
+        for mois, lignes in lignes_par_mois.items():
+            archives[mois] += len(lignes)
+
+    return dict(archives)
+
+
+def mois_archives():
+    """Mois archivés, du plus récent au plus ancien, avec leurs comptes"""
+    from django.db.models import Sum
+    from django.db.models.functions import TruncMonth
+
+    from .models import AuditJournalier
+
+    comptes = {
+        ligne['mois'].strftime('%Y-%m'): ligne['nombre']
+        for ligne in AuditJournalier.objects.annotate(
+            mois=TruncMonth('date')).values('mois').annotate(nombre=Sum('nombre'))
+    }
+    if not os.path.isdir(AUDIT_ARCHIVES_DIR):
+        return []
+    resultat = []
+    for nom in sorted(os.listdir(AUDIT_ARCHIVES_DIR), reverse=True):
+        correspondance = re.match(r'^audit-(\d{4}-\d{2})\.jsonl\.gz$', nom)
+        if correspondance:
+            mois = correspondance.group(1)
+            resultat.append({
+                'mois': mois,
+                'nombre_entrees': comptes.get(mois, 0),
+                'taille_octets': os.path.getsize(chemin_archive(mois)),
+            })
+    return resultat
+
+
+def rechercher_archive(mois, filtres=None, texte=None, limite=100):
+    """
+    Entrées archivées d'un mois correspondant aux `filtres` (égalité sur les
+    champs de l'archive) et contenant `texte`. Lecture séquentielle du
+    fichier : réservé aux consultations ponctuelles.
+    """
+    if not FORMAT_MOIS.match(mois or ''):
+        raise ValueError("Mois invalide (format attendu: AAAA-MM)")
+    chemin = chemin_archive(mois)
+    if not os.path.exists(chemin):
+        raise FileNotFoundError(f"Aucune archive pour {mois}")
+
+    filtres = filtres or {}
+    texte = texte.lower() if texte else None
+    vus = set()
+    resultats = []
+    with gzip.open(chemin, 'rt', encoding='utf-8') as fichier:
+        for brut in fichier:
+            if texte and texte not in brut.lower():
+                continue
+            ligne = json.loads(brut)
+            if ligne['id'] in vus:
+                continue
+            if any(str(ligne.get(champ)) != str(valeur) for champ, valeur in filtres.items()):
+                continue
+            vus.add(ligne['id'])
+            resultats.append(ligne)
+            if len(resultats) >= limite:
+                break
+    return resultats
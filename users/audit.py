@@ -0,0 +1,192 @@
+# audit.py
+"""
+Écriture groupée du journal d'audit.
+
+Les entrées ne sont plus insérées une à une dans la transaction de la
+requête : `journaliser` les retient jusqu'à la validation de la transaction
+(elles disparaissent avec elle en cas d'annulation, savepoints compris),
+puis les met en tampon. Le tampon est écrit en un seul `bulk_create` :
+- à la fin de la requête (TamponAuditMiddleware) ou du bloc `tampon_audit()` ;
+- dès qu'il atteint AUDIT_TAILLE_LOT entrées ;
+- immédiatement hors de ces deux contextes.
+
+En mode asynchrone (AUDIT_ASYNCHRONE), le tampon est confié à une file
+bornée vidée par un thread d'arrière-plan. Si la file est pleine, l'écriture
+redevient synchrone : aucune entrée n'est perdue.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import metriques
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal d'entrées par bulk_create
+AUDIT_TAILLE_LOT = getattr(settings, 'AUDIT_TAILLE_LOT', 500)
+# Écriture par un thread d'arrière-plan, et taille de sa file d'attente
+AUDIT_ASYNCHRONE = getattr(settings, 'AUDIT_ASYNCHRONE', False)
+AUDIT_TAILLE_FILE = getattr(settings, 'AUDIT_TAILLE_FILE', 10000)
+
+_local = threading.local()
+
+
+def _ecrire(entrees):
+    from .models import AuditLog
+    from .recherche import indexer
+
+    # bulk_create n'émet pas post_save : indexation explicite
+    try:
+        with transaction.atomic():
+            indexer(AuditLog.objects.bulk_create(entrees, batch_size=AUDIT_TAILLE_LOT))
+    except Exception:
+        metriques.entrees_audit.inc(len(entrees), resultat='echec')
+        raise
+    metriques.entrees_audit.inc(len(entrees), resultat='ecrite')
+
+
+class _Ecrivain:
+    """Thread d'écriture du mode asynchrone, un par processus worker"""
+
+    def __init__(self, taille_file):
+        self.taille_file = taille_file
+        self._verrou = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def _demarrer(self):
+        # Un thread hérité du processus parent (fork gunicorn) n'existe plus
+        with self._verrou:
+            if self._file is None or self._pid != os.getpid():
+                self._file = queue.Queue(maxsize=self.taille_file)
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._boucle, args=(self._file,), daemon=True
+                ).start()
+        return self._file
+
+    def soumettre(self, entrees):
+        file = self._demarrer()
+        try:
+            file.put_nowait(entrees)
+        except queue.Full:
+            logger.warning("File d'audit pleine : écriture synchrone de %d entrée(s)",
+                           len(entrees))
+            _ecrire(entrees)
+
+    def _boucle(self, file):
+        while True:
+            lot = list(file.get())
+            # Regrouper ce qui est déjà en attente
+            while len(lot) < AUDIT_TAILLE_LOT:
+                try:
+                    lot.extend(file.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                _ecrire(lot)
+            except Exception:
+                logger.exception("Écriture de %d entrée(s) d'audit impossible", len(lot))
+            finally:
+                close_old_connections()
+
+    def vider(self):
+        """Écrire ce qui reste dans la file (arrêt du processus)"""
+        if self._file is None or self._pid != os.getpid():
+            return
+        lot = []
+        while True:
+            try:
+                lot.extend(self._file.get_nowait())
+            except queue.Empty:
+                break
+        if lot:
+            _ecrire(lot)
+
+
+ecrivain = _Ecrivain(AUDIT_TAILLE_FILE)
+
+
+def _tampon():
+    if not hasattr(_local, 'tampon'):
+        _local.tampon = []
+        _local.profondeur = 0
+    return _local.tampon
+
+
+def vider_tampon():
+    """Écrire les entrées validées en attente"""
+    tampon = _tampon()
+    if not tampon:
+        return
+    entrees = tampon[:]
+    tampon.clear()
+    if AUDIT_ASYNCHRONE:
+        ecrivain.soumettre(entrees)
+    else:
+        _ecrire(entrees)
+
+
+def _valider(entrees):
+    tampon = _tampon()
+    tampon.extend(entrees)
+    if not _local.profondeur or len(tampon) >= AUDIT_TAILLE_LOT:
+        vider_tampon()
+
+
+def journaliser_entrees(entrees):
+    """Journaliser des AuditLog non enregistrés, à la validation de la transaction"""
+    entrees = list(entrees)
+    if entrees:
+        transaction.on_commit(lambda: _valider(entrees))
+
+
+def journaliser(**champs):
+    """Équivalent différé et groupé de `AuditLog.objects.create(**champs)`"""
+    from .models import AuditLog
+
+    journaliser_entrees([AuditLog(**champs)])
+
+
+@contextmanager
+def tampon_audit():
+    """Regrouper les entrées d'audit du bloc, écrites à sa sortie"""
+    _tampon()
+    _local.profondeur += 1
+    try:
+        yield
+    finally:
+        _local.profondeur -= 1
+        if not _local.profondeur:
+            # Les transactions sont déjà validées : un échec d'écriture du
+            # journal ne doit pas faire échouer la requête
+            try:
+                vider_tampon()
+            except Exception:
+                logger.exception("Écriture du journal d'audit impossible")
+
+
+class TamponAuditMiddleware:
+    """Écrire les entrées d'audit d'une requête en un lot, après la vue"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with tampon_audit():
+            return self.get_response(request)
+
+
+@atexit.register
+def _vider_a_la_sortie():
+    try:
+        vider_tampon()
+        ecrivain.vider()
+    except Exception:
+        logger.exception("Entrées d'audit non écrites à l'arrêt")
@@ -0,0 +1,308 @@
+# benchmark.py
+"""
+Mesure du coût de chaque point d'accès GET de l'API (users/urls.py) :
+nombre de requêtes SQL, latences p50/p95 et pic mémoire Python.
+
+Utilisé par la commande `benchmark_api`, qui travaille sur une base de test
+créée pour l'occasion et peuplée par `peupler()`. Les résultats sont
+comparés à une référence versionnée (benchmarks/reference.json) : une
+requête SQL de plus est une régression, les latences et la mémoire ont une
+tolérance relative. Un point d'accès en erreur serveur (5xx) fait échouer
+la comparaison : ses temps ne sont pas mesurés.
+"""
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .factures import pool_factures
+
+# Actions exclues : rendu PDF dans un pool de processus, mesuré à part
+EXCLUSIONS = {'facture', 'factures_periode'}
+# Routes exclues : ProfileViewset sert le profil de l'utilisateur connecté
+# et n'a pas de route sans pk dans le routeur
+ROUTES_EXCLUES = {('profile', 'retrieve')}
+
+# En dessous, le p95 n'est que le maximum des échantillons : il n'est ni
+# significatif ni comparé à la référence
+REPETITIONS_MIN_P95 = 20
+
+# Paramètres obligatoires de certains points d'accès
+PARAMETRES = {
+    ('historique-client', 'list'): lambda ids: {'client_id': ids['client']},
+    ('stock-disponible', 'list'): lambda ids: {'produit': ids['produit']},
+}
+
+
+def peupler(echelle=1, graine=42):
+    """
+    Jeu de données synthétique, créé par les chemins de l'application
+    (API pour les ventes) afin que les données dérivées soient cohérentes
+    """
+    from .models import (
+        Categorie, Client, CustomUser, Entrepot, Fournisseur, MouvementStock,
+        Produit, StockEntrepot,
+    )
+
+    aleatoire = random.Random(graine)
+    admin = CustomUser.objects.create_user(
+        username='benchmark', email='benchmark@afriktexia.local',
+        password='benchmark', role='admin')
+
+    categories = [Categorie.objects.create(nom=f'Catégorie {i}') for i in range(10)]
+    fournisseurs = [
+        Fournisseur.objects.create(
+            nom=f'Fournisseur {i}', contact=f'Contact {i}',
+            telephone=f'70000{i:04d}', adresse=f'Zone industrielle {i}')
+        for i in range(5)
+    ]
+    entrepots = [
+        Entrepot.objects.create(nom=f'Entrepôt {i}', adresse=f'Zone {i}', created_by=admin)
+        for i in range(max(2, 2 * echelle))
+    ]
+    produits = []
+    for i in range(100 * echelle):
+        prix = Decimal(aleatoire.randint(500, 50000))
+        produits.append(Produit.objects.create(
+            code=f'BM{i:06d}', nom=f'Produit {i}',
+            categorie=aleatoire.choice(categories),
+            fournisseur=aleatoire.choice(fournisseurs),
+            prix_achat=prix, prix_vente=prix * Decimal('1.3'),
+            prix_vente_gros=prix * Decimal('1.2'), prix_vente_detail=prix * Decimal('1.3'),
+            created_by=admin,
+        ))
+    for produit in produits:
+        for entrepot in entrepots:
+            StockEntrepot.objects.create(
+                produit=produit, entrepot=entrepot,
+                quantite=aleatoire.randint(0, 500), stock_alerte=10)
+    clients = [
+        Client.objects.create(
+            nom=f'Client {i}', telephone=f'77{i:07d}', adresse=f'Quartier {i}',
+            created_by=admin)
+        for i in range(50 * echelle)
+    ]
+
+    for _ in range(200 * echelle):
+        MouvementStock.objects.create(
+            produit=aleatoire.choice(produits), entrepot=aleatoire.choice(entrepots),
+            type_mouvement='entree', quantite=aleatoire.randint(1, 20),
+            prix_unitaire=Decimal('100'), motif='Réapprovisionnement',
+            created_by=admin)
+
+    api = APIClient()
+    api.force_authenticate(admin)
+    for _ in range(100 * echelle):
+        entrepot = aleatoire.choice(entrepots)
+        reponse = api.post('/ventes/', {
+            'client': aleatoire.choice(clients).id,
+            'type_vente': 'detail',
+            'lignes_vente': [
+                {'produit': produit.id, 'entrepot': entrepot.id,
+                 'quantite': aleatoire.randint(1, 3),
+                 'prix_unitaire': str(produit.prix_vente_detail)}
+                for produit in aleatoire.sample(produits, aleatoire.randint(1, 4))
+            ],
+        }, format='json')
+        if reponse.status_code in (200, 201) and aleatoire.random() < 0.8:
+            api.post(f"/ventes/{reponse.data['vente']['id']}/confirmer/")
+
+    # Les PDF des factures se rendent en arrière-plan : ne pas mesurer
+    # pendant qu'ils s'écrivent
+    pool_factures.attendre()
+    return admin
+
+
+def _modele(viewset):
+    from .models import TransfertEntrepot
+
+    serializer_class = getattr(viewset, 'serializer_class', None)
+    meta = getattr(serializer_class, 'Meta', None)
+    if meta is not None and hasattr(meta, 'model'):
+        return meta.model
+    return {'TransfertEntrepotViewSet': TransfertEntrepot}.get(viewset.__name__)
+
+
+def points_d_acces():
+    """(nom, url, paramètres) de chaque route GET du routeur"""
+    from .models import Client, Produit
+    from .urls import router
+
+    ids = {
+        'client': Client.objects.values_list('pk', flat=True).first(),
+        'produit': Produit.objects.values_list('pk', flat=True).first(),
+    }
+    routes = []
+    for prefixe, viewset, _ in router.registry:
+        modele = _modele(viewset)
+        pk = modele.objects.order_by('pk').values_list('pk', flat=True).first() if modele else None
+
+        actions = []
+        if hasattr(viewset, 'list'):
+            actions.append(('list', f'/{prefixe}/'))
+        if hasattr(viewset, 'retrieve') and pk is not None:
+            actions.append(('retrieve', f'/{prefixe}/{pk}/'))
+        for extra in viewset.get_extra_actions():
+            if 'get' not in extra.mapping or extra.__name__ in EXCLUSIONS:
+                continue
+            if extra.detail:
+                if pk is not None:
+                    actions.append((extra.__name__, f'/{prefixe}/{pk}/{extra.url_path}/'))
+            else:
+                actions.append((extra.__name__, f'/{prefixe}/{extra.url_path}/'))
+
+        for action, url in actions:
+            if (prefixe, action) in ROUTES_EXCLUES:
+                continue
+            parametres = PARAMETRES.get((prefixe, action), lambda ids: {})(ids)
+            routes.append((f'GET /{prefixe}/ {action}', url, parametres))
+    return routes
+
+
+class _CompteurRequetes:
+    """execute_wrapper comptant les requêtes SQL (indépendant de DEBUG et
+    de la taille limitée de connection.queries)"""
+
+    def __init__(self):
+        self.nombre = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.nombre += 1
+        return execute(sql, params, many, context)
+
+
+def _executer(api, url, parametres):
+    reponse = api.get(url, parametres)
+    # Les exports sont streamés : les consommer fait partie du coût
+    if getattr(reponse, 'streaming', False):
+        for _ in reponse.streaming_content:
+            pass
+    return reponse
+
+
+def erreur_serveur(mesure):
+    return mesure['statut'] >= 500
+
+
+def mesurer(utilisateur, repetitions=REPETITIONS_MIN_P95, avec_cache=False):
+    """
+    Mesures de chaque point d'accès, indexées par nom (sans latences pour
+    un point d'accès en erreur serveur)
+    """
+    api = APIClient()
+    api.force_authenticate(utilisateur)
+    api.raise_request_exception = False
+
+    routes = points_d_acces()
+    resultats = {}
+    for nom, url, parametres in routes:
+        # Appel de chauffe : imports paresseux et initialisations du premier
+        # appel ne comptent ni dans la mémoire ni dans les latences
+        cache.clear()
+        _executer(api, url, parametres)
+
+        # Requêtes SQL et pic mémoire : une exécution cache vide
+        cache.clear()
+        requetes = _CompteurRequetes()
+        tracemalloc.start()
+        with connection.execute_wrapper(requetes):
+            reponse = _executer(api, url, parametres)
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultats[nom] = {
+            'url': url,
+            'statut': reponse.status_code,
+            'requetes': requetes.nombre,
+            'memoire_pic_ko': round(pic / 1024, 1),
+        }
+
+    # Latences : tours successifs sur tous les points d'accès, pour qu'une
+    # contention passagère de la machine se répartisse sur tous au lieu de
+    # fausser un seul d'entre eux ; le ramasse-miettes ne tourne qu'entre
+    # deux tours
+    routes = [route for route in routes if not erreur_serveur(resultats[route[0]])]
+    durees = {nom: [] for nom, _, _ in routes}
+    for _ in range(repetitions):
+        gc.collect()
+        gc.disable()
+        try:
+            for nom, url, parametres in routes:
+                if not avec_cache:
+                    cache.clear()
+                debut = time.perf_counter()
+                _executer(api, url, parametres)
+                durees[nom].append((time.perf_counter() - debut) * 1000)
+        finally:
+            gc.enable()
+
+    for mesure in resultats.values():
+        mesure['p50_ms'] = mesure['p95_ms'] = None
+    for nom, echantillons in durees.items():
+        centiles = (statistics.quantiles(echantillons, n=20, method='inclusive')
+                    if len(echantillons) > 1 else echantillons * 19)
+        resultats[nom]['p50_ms'] = round(statistics.median(echantillons), 2)
+        resultats[nom]['p95_ms'] = round(centiles[18], 2)
+    return resultats
+
+
+def vitesse_relative(resultats, reference, plancher_ms=5.0):
+    """
+    Rapport médian des p50 mesurés à ceux de la référence : lenteur de la
+    machine pendant la mesure (1.3 = tout est 30 % plus lent)
+    """
+    rapports = [
+        mesure['p50_ms'] / reference[nom]['p50_ms']
+        for nom, mesure in resultats.items()
+        if mesure['p50_ms'] is not None and nom in reference
+        and (reference[nom]['p50_ms'] or 0) >= plancher_ms
+    ]
+    return statistics.median(rapports) if rapports else 1.0
+
+
+def comparer(resultats, reference, tolerance_temps=0.5, tolerance_memoire=0.5,
+             plancher_ms=5.0, comparer_p95=True):
+    """
+    Régressions de `resultats` par rapport à `reference` : toute erreur
+    serveur (sans autre comparaison pour ce point d'accès), toute requête SQL
+    supplémentaire, les pics mémoire au-delà de la tolérance relative, un
+    ralentissement d'ensemble au-delà de `tolerance_temps`, et les latences
+    d'un point d'accès au-delà de la tolérance une fois ramenées à la
+    vitesse de la machine (les écarts sous `plancher_ms` sont ignorés ; le
+    p95 seulement si `comparer_p95`)
+    """
+    cles_temps = ('p50_ms', 'p95_ms') if comparer_p95 else ('p50_ms',)
+    regressions = []
+    vitesse = vitesse_relative(resultats, reference, plancher_ms)
+    if vitesse > 1 + tolerance_temps:
+        regressions.append(f"ensemble des points d'accès : p50 x{vitesse:.2f}")
+    # Une machine plus rapide que lors de la référence ne resserre pas la tolérance
+    vitesse = max(vitesse, 1.0)
+
+    for nom, mesure in resultats.items():
+        if erreur_serveur(mesure):
+            regressions.append(f"{nom}: erreur serveur {mesure['statut']}")
+            continue
+        attendu = reference.get(nom)
+        if attendu is None:
+            continue
+        if mesure['statut'] != attendu['statut']:
+            regressions.append(f"{nom}: statut {attendu['statut']} -> {mesure['statut']}")
+        if mesure['requetes'] > attendu['requetes']:
+            regressions.append(
+                f"{nom}: {attendu['requetes']} -> {mesure['requetes']} requêtes SQL")
+        for cle in cles_temps:
+            if attendu[cle] is None:
+                continue
+            if (mesure[cle] > attendu[cle] * vitesse * (1 + tolerance_temps)
+                    and mesure[cle] - attendu[cle] * vitesse > plancher_ms):
+                regressions.append(f"{nom}: {cle} {attendu[cle]} -> {mesure[cle]}")
+        if mesure['memoire_pic_ko'] > attendu['memoire_pic_ko'] * (1 + tolerance_memoire):
+            regressions.append(
+                f"{nom}: mémoire {attendu['memoire_pic_ko']} -> {mesure['memoire_pic_ko']} Ko")
+    return regressions
@@ -0,0 +1,200 @@
+# cache.py
+"""
+Cache des réponses des vues de lecture (tableau de bord, rapports,
+statistiques, stocks, catalogue).
+
+Chaque réponse est stockée sous une clé dérivée de la vue, du rôle, de
+l'utilisateur, des paramètres de requête et de la version courante de ses
+étiquettes (produit, entrepot, vente...). Invalider une étiquette revient à
+changer sa version : les entrées qui en dépendent ne sont plus jamais lues
+et expirent d'elles-mêmes. Aucune suppression par motif n'est nécessaire,
+ce qui rend le mécanisme compatible avec les backends locmem et fichier.
+
+Pour les calculs coûteux et très demandés (tableau de bord), `valeur_revalidee`
+ajoute deux garanties :
+- un seul calcul à la fois par clé (single-flight) : les requêtes
+  identiques simultanées attendent et partagent le résultat ;
+- stale-while-revalidate : une valeur un peu ancienne ou invalidée est servie
+  immédiatement pendant qu'un thread la recalcule en arrière-plan.
+Le calcul est une fonction de la seule clé (rôle, périmètre, filtres), jamais
+une vue liée à la requête : il peut s'exécuter après la fin de celle-ci, et
+toutes les requêtes portant la même clé partagent un seul calcul.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie (secondes) d'une réponse en cache
+DUREE_REPONSE = getattr(settings, 'CACHE_REPONSES_DUREE', 60)
+# Les versions d'étiquettes doivent survivre aux réponses qui en dépendent
+DUREE_ETIQUETTE = 24 * 3600
+# Revalidation : âge (s) en deçà duquel une valeur est fraîche, et au-delà
+# duquel elle n'est plus servie du tout
+DUREE_FRAICHE = getattr(settings, 'CACHE_REVALIDATION_FRAICHE', 30)
+DUREE_PERIMEE = getattr(settings, 'CACHE_REVALIDATION_PERIMEE', 300)
+# Durée max (s) d'un calcul : au-delà, le verrou expire et un autre worker
+# peut recalculer
+DUREE_VERROU = 30
+# Attente max (s) du résultat d'un calcul mené par un autre worker
+ATTENTE_MAX = 10
+
+
+def _cle_etiquette(etiquette):
+    return f'cache-etiquette:{etiquette}'
+
+
+def versions_etiquettes(etiquettes):
+    """Version courante de chaque étiquette (créée si elle n'existe pas)"""
+    cles = [_cle_etiquette(etiquette) for etiquette in etiquettes]
+    versions = cache.get_many(cles)
+    for cle in cles:
+        if cle not in versions:
+            # Une version horodatée ne peut pas réactiver d'anciennes entrées
+            # si l'étiquette a été évincée du cache
+            cache.add(cle, time.time_ns(), DUREE_ETIQUETTE)
+            versions[cle] = cache.get(cle)
+    return [versions[cle] for cle in cles]
+
+
+def invalider_cache(*etiquettes):
+    """
+    Invalider les réponses portant ces étiquettes, une fois la transaction
+    en cours validée (immédiatement hors transaction)
+    """
+    def invalider():
+        cache.set_many(
+            {_cle_etiquette(etiquette): time.time_ns() for etiquette in etiquettes},
+            DUREE_ETIQUETTE
+        )
+    transaction.on_commit(invalider, robust=True)
+
+
+def cle_reponse(request, vue, etiquettes=()):
+    """Clé d'une réponse : vue, rôle, utilisateur, paramètres et versions"""
+    user = request.user
+    parametres = sorted(
+        (cle, valeur) for cle in request.query_params
+        for valeur in request.query_params.getlist(cle)
+    )
+    empreinte = hashlib.sha1(
+        repr((parametres, versions_etiquettes(etiquettes))).encode('utf-8')
+    ).hexdigest()
+    return f'cache-reponse:{vue}:{user.role}:{user.pk}:{empreinte}'
+
+
+def reponse_en_cache(*etiquettes, duree=None):
+    """
+    Décorateur d'action de viewset : sert la réponse depuis le cache, ou
+    la calcule et la met en cache si elle est valide (HTTP 200)
+    """
+    def decorateur(methode):
+        @wraps(methode)
+        def wrapper(self, request, *args, **kwargs):
+            vue = f'{self.__class__.__name__}.{methode.__name__}'
+            cle = cle_reponse(request, vue, etiquettes)
+            donnees = cache.get(cle)
+            if donnees is not None:
+                return Response(donnees)
+
+            response = methode(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(cle, response.data,
+                          DUREE_REPONSE if duree is None else duree)
+            return response
+        return wrapper
+    return decorateur
+
+
+def _calculer_et_stocker(cle, calculer, etiquettes, perimee):
+    # Versions lues avant le calcul : une invalidation pendant le calcul
+    # rend le résultat aussitôt périmé
+    versions = versions_etiquettes(etiquettes)
+    entree = {'valeur': calculer(), 'calcule_le': time.time(), 'versions': versions}
+    cache.set(cle, entree, perimee)
+    return entree
+
+
+def _calculer_une_fois(cle, calculer, etiquettes, perimee, ancienne):
+    """Calcul synchrone, mené par une seule requête à la fois pour `cle`"""
+    verrou = f'{cle}:calcul'
+    if cache.add(verrou, True, DUREE_VERROU):
+        try:
+            return _calculer_et_stocker(cle, calculer, etiquettes, perimee)
+        finally:
+            cache.delete(verrou)
+
+    # Un autre worker calcule déjà : attendre son résultat
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(0.05)
+        entree = cache.get(cle)
+        if entree and (ancienne is None or entree['calcule_le'] > ancienne['calcule_le']):
+            return entree
+        if cache.get(verrou) is None:
+            break
+    return _calculer_et_stocker(cle, calculer, etiquettes, perimee)
+
+
+def _revalider_en_arriere_plan(cle, calculer, etiquettes, perimee):
+    """Recalculer `cle` dans un thread, sauf si un calcul est déjà en cours"""
+    verrou = f'{cle}:calcul'
+    if not cache.add(verrou, True, DUREE_VERROU):
+        return
+
+    def revalider():
+        close_old_connections()
+        try:
+            _calculer_et_stocker(cle, calculer, etiquettes, perimee)
+        except Exception:
+            logger.exception("Revalidation de %s impossible", cle)
+        finally:
+            cache.delete(verrou)
+            # Connexions ouvertes par ce thread, qui se termine
+            close_old_connections()
+            connections.close_all()
+
+    threading.Thread(target=revalider, daemon=True).start()
+
+
+def _fraicheur(entree, perimee, revalidation=False):
+    return {
+        'calcule_le': datetime.fromtimestamp(
+            entree['calcule_le'], dt_timezone.utc).isoformat(),
+        'age_secondes': round(time.time() - entree['calcule_le'], 1),
+        'perimee': perimee,
+        'revalidation_en_cours': revalidation,
+    }
+
+
+def valeur_revalidee(cle, calculer, etiquettes=(), fraiche=None, perimee=None):
+    """
+    Valeur de `cle`, calculée par `calculer()` au besoin, avec single-flight
+    et stale-while-revalidate. Retourne (valeur, métadonnées de fraîcheur).
+    `calculer` ne doit dépendre que de ce que `cle` décrit (pas de la
+    requête) : il peut être rappelé par un thread d'arrière-plan.
+    """
+    fraiche = DUREE_FRAICHE if fraiche is None else fraiche
+    perimee = DUREE_PERIMEE if perimee is None else perimee
+
+    entree = cache.get(cle)
+    if entree is not None:
+        age = time.time() - entree['calcule_le']
+        if age < fraiche and entree['versions'] == versions_etiquettes(etiquettes):
+            return entree['valeur'], _fraicheur(entree, perimee=False)
+        if age < perimee:
+            _revalider_en_arriere_plan(cle, calculer, etiquettes, perimee)
+            return entree['valeur'], _fraicheur(entree, perimee=True, revalidation=True)
+
+    entree = _calculer_une_fois(cle, calculer, etiquettes, perimee, entree)
+    return entree['valeur'], _fraicheur(entree, perimee=False)
@@ -0,0 +1,229 @@
+# evenements.py
+"""
+Journal d'événements structuré.
+
+`evenement(nom, niveau, **donnees)` écrit une ligne JSON (date, niveau,
+nom de l'événement, identifiant de corrélation de la requête HTTP, pid,
+données, trace de l'exception en cours si `exception=True`) dans un fichier
+à rotation (EVENEMENTS_FICHIER). L'appelant ne fait que déposer l'événement
+dans une file bornée : la sérialisation et l'écriture sont faites par un
+thread d'arrière-plan (logging.handlers.QueueListener), un par processus
+worker. Si la file est pleine, l'événement est abandonné et compté.
+
+Les événements sous EVENEMENTS_NIVEAU ne sont pas écrits ; tous sont
+comptés dans la métrique `evenements_total`. Les traces détaillées de
+chaque mouvement de stock (`trace_stock`) ne sont produites que si
+STOCK_TRACE est activé.
+
+CorrelationMiddleware reprend l'en-tête `X-Request-ID` de la requête (ou en
+génère un) et le renvoie dans la réponse. Le journal se consulte avec
+`python manage.py evenements` (lire_evenements).
+"""
+import atexit
+import contextvars
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import traceback
+import uuid
+from datetime import timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metriques
+
+# Niveau minimal écrit (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+EVENEMENTS_NIVEAU = getattr(settings, 'EVENEMENTS_NIVEAU', 'INFO')
+# Fichier des événements (None : pas d'écriture), taille maximale (octets)
+# et nombre de fichiers conservés à la rotation
+EVENEMENTS_FICHIER = getattr(
+    settings, 'EVENEMENTS_FICHIER',
+    os.path.join(settings.BASE_DIR, 'logs', 'evenements.log'))
+EVENEMENTS_FICHIER_TAILLE = getattr(settings, 'EVENEMENTS_FICHIER_TAILLE', 10 * 1024 * 1024)
+EVENEMENTS_FICHIER_NOMBRE = getattr(settings, 'EVENEMENTS_FICHIER_NOMBRE', 5)
+EVENEMENTS_TAILLE_FILE = getattr(settings, 'EVENEMENTS_TAILLE_FILE', 10000)
+# Trace détaillée de chaque mouvement, prélèvement et libération de stock
+STOCK_TRACE = getattr(settings, 'STOCK_TRACE', False)
+
+NIVEAUX = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_niveau_minimal = logging.getLevelName(EVENEMENTS_NIVEAU.upper())
+
+logger = logging.getLogger(__name__)
+_correlation = contextvars.ContextVar('correlation', default=None)
+_format_correlation = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+def correlation():
+    """Identifiant de corrélation de la requête en cours (None hors requête)"""
+    return _correlation.get()
+
+
+def _en_json(valeur):
+    # Decimal, dates, instances de modèles...
+    return str(valeur)
+
+
+class _Formateur(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=_en_json)
+
+
+class _FileEvenements(QueueHandler):
+    def prepare(self, record):
+        # Le dictionnaire de l'événement est sérialisé par le thread d'écriture
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            evenements_perdus.inc()
+
+
+class _Journal:
+    """File et thread d'écriture, recréés dans chaque processus worker"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._ecoute = None
+
+    def demarrer(self):
+        if self._pid == os.getpid():
+            return
+        with self._verrou:
+            if self._pid == os.getpid():
+                return
+            # Un thread hérité du processus parent (fork gunicorn) n'existe plus
+            for handler in [h for h in logger.handlers if isinstance(h, _FileEvenements)]:
+                logger.removeHandler(handler)
+            if EVENEMENTS_FICHIER and not logger.handlers:
+                os.makedirs(os.path.dirname(EVENEMENTS_FICHIER), exist_ok=True)
+                fichier = RotatingFileHandler(
+                    EVENEMENTS_FICHIER, maxBytes=EVENEMENTS_FICHIER_TAILLE,
+                    backupCount=EVENEMENTS_FICHIER_NOMBRE, encoding='utf-8')
+                fichier.setFormatter(_Formateur())
+                self._file = queue.Queue(maxsize=EVENEMENTS_TAILLE_FILE)
+                self._ecoute = QueueListener(self._file, fichier)
+                self._ecoute.start()
+                logger.addHandler(_FileEvenements(self._file))
+                logger.propagate = False
+            # Un handler déclaré dans settings.LOGGING est conservé
+            logger.setLevel(_niveau_minimal)
+            self._pid = os.getpid()
+
+    def arreter(self):
+        """Écrire les événements en attente (arrêt du processus)"""
+        if self._ecoute is not None and self._pid == os.getpid():
+            self._ecoute.stop()
+            self._ecoute = None
+            self._pid = None
+
+
+journal = _Journal()
+atexit.register(journal.arreter)
+
+
+def evenement(nom, niveau='INFO', exception=False, **donnees):
+    """
+    Enregistrer l'événement `nom` ; `exception=True` joint la trace de
+    l'exception en cours de traitement
+    """
+    niveau = niveau.upper()
+    evenements.inc(evenement=nom, niveau=niveau)
+    numero = logging.getLevelName(niveau)
+    if numero < _niveau_minimal:
+        return
+    journal.demarrer()
+    ligne = {
+        'date': timezone.now().isoformat(),
+        'niveau': niveau,
+        'evenement': nom,
+        'correlation': _correlation.get(),
+        'pid': os.getpid(),
+        'donnees': donnees,
+    }
+    if exception:
+        ligne['exception'] = traceback.format_exc()
+    # Sans logger.log : pas de recherche de l'appelant dans la pile
+    logger.handle(logger.makeRecord(logger.name, numero, __file__, 0, ligne, None, None))
+
+
+def trace_stock(nom, **donnees):
+    """Événement DEBUG de suivi du stock, seulement si STOCK_TRACE"""
+    if STOCK_TRACE:
+        evenement(nom, 'DEBUG', **donnees)
+
+
+def lire_evenements(niveau=None, nom=None, correlation=None, depuis=None, limite=None):
+    """
+    Événements écrits dans EVENEMENTS_FICHIER et ses fichiers de rotation,
+    du plus ancien au plus récent, filtrés par niveau minimal, préfixe du
+    nom, identifiant de corrélation et date minimale (datetime)
+    """
+    if not EVENEMENTS_FICHIER:
+        return []
+    journal.arreter()
+    minimum = logging.getLevelName(niveau.upper()) if niveau else None
+    # Dates écrites en UTC (timezone.now()) : comparaison des chaînes ISO
+    depuis = depuis.astimezone(dt_timezone.utc).isoformat() if depuis else None
+
+    # evenements.log.5 (le plus ancien) ... evenements.log
+    fichiers = sorted(
+        glob.glob(f'{glob.escape(EVENEMENTS_FICHIER)}.[0-9]*'),
+        key=lambda chemin: int(chemin.rsplit('.', 1)[1]), reverse=True,
+    ) + [EVENEMENTS_FICHIER]
+
+    resultats = []
+    for chemin in fichiers:
+        try:
+            with open(chemin, encoding='utf-8') as fichier:
+                for texte in fichier:
+                    try:
+                        ligne = json.loads(texte)
+                    except ValueError:
+                        continue
+                    if minimum is not None and logging.getLevelName(ligne['niveau']) < minimum:
+                        continue
+                    if nom and not ligne['evenement'].startswith(nom):
+                        continue
+                    if correlation and ligne['correlation'] != correlation:
+                        continue
+                    if depuis and ligne['date'] < depuis:
+                        continue
+                    resultats.append(ligne)
+        except FileNotFoundError:
+            continue
+    return resultats[-limite:] if limite else resultats
+
+
+class CorrelationMiddleware:
+    """Identifiant de corrélation des événements d'une requête (X-Request-ID)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        identifiant = request.headers.get('X-Request-ID', '')
+        if not _format_correlation.match(identifiant):
+            identifiant = uuid.uuid4().hex
+        jeton = _correlation.set(identifiant)
+        try:
+            response = self.get_response(request)
+        finally:
+            _correlation.reset(jeton)
+        response['X-Request-ID'] = identifiant
+        return response
+
+
+evenements = metriques.Compteur(
+    'evenements_total', "Événements du journal structuré", ('evenement', 'niveau'))
+evenements_perdus = metriques.Compteur(
+    'evenements_perdus_total', "Événements abandonnés, file d'écriture pleine")
@@ -0,0 +1,132 @@
+# exports.py
+"""
+Exports CSV en flux continu.
+
+Les lignes sont lues par paquets (`QuerySet.iterator(chunk_size=...)` sur un
+`values_list`) et écrites au fil de l'eau dans la réponse : aucune instance
+de modèle n'est construite et la mémoire du worker reste constante, quel que
+soit le nombre de lignes exportées.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime
+from io import StringIO
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Nombre de lignes lues en base et écrites dans la réponse à chaque passe
+TAILLE_PAQUET_EXPORT = 2000
+
+COLONNES_EXPORT_VENTES = [
+    ('ID', 'id'),
+    ('Numéro', 'numero_vente'),
+    ('Date', 'created_at'),
+    ('Client', 'client__nom'),
+    ('Type de vente', 'type_vente'),
+    ('Statut', 'statut'),
+    ('Statut paiement', 'statut_paiement'),
+    ('Mode paiement', 'mode_paiement'),
+    ('Montant avant réduction', 'montant_avant_reduction'),
+    ('Type réduction', 'type_reduction'),
+    ('Montant réduction', 'montant_reduction'),
+    ('Montant total', 'montant_total'),
+    ('Montant payé', 'montant_paye'),
+    ('Montant restant', 'montant_restant'),
+    ('Date échéance', 'date_echeance'),
+    ('Créée par', 'created_by__email'),
+]
+
+COLONNES_EXPORT_MOUVEMENTS = [
+    ('ID', 'id'),
+    ('Date', 'created_at'),
+    ('Type', 'type_mouvement'),
+    ('Source', 'source'),
+    ('Code produit', 'produit__code'),
+    ('Produit', 'produit__nom'),
+    ('Entrepôt', 'entrepot__nom'),
+    ('Quantité', 'quantite'),
+    ('Prix unitaire', 'prix_unitaire'),
+    ('Motif', 'motif'),
+    ('Vente', 'vente__numero_vente'),
+    ('Créé par', 'created_by__email'),
+]
+
+COLONNES_EXPORT_AUDIT = [
+    ('ID', 'id'),
+    ('Date', 'created_at'),
+    ('Utilisateur', 'user__email'),
+    ('Action', 'action'),
+    ('Modèle', 'modele'),
+    ('Objet', 'objet_id'),
+    ('Entrepôt', 'entrepot_id'),
+    ('Produit', 'produit_id'),
+    ('Vente', 'vente_id'),
+    ('Montant', 'montant'),
+    ('Détails', 'details'),
+]
+
+
+def _formater(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, (dict, list)):
+        return json.dumps(valeur, ensure_ascii=False)
+    return valeur
+
+
+def iterer_csv(queryset, colonnes, chunk_size=TAILLE_PAQUET_EXPORT):
+    """Produire le CSV (en-tête puis données) par blocs de `chunk_size` lignes"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    # BOM UTF-8 pour qu'Excel détecte l'encodage
+    buffer.write('\ufeff')
+    writer.writerow([entete for entete, _ in colonnes])
+
+    # prefetch_related est sans objet sur un values_list
+    lignes = queryset.prefetch_related(None).values_list(
+        *[champ for _, champ in colonnes]
+    ).iterator(chunk_size=chunk_size)
+
+    for numero, ligne in enumerate(lignes, start=1):
+        writer.writerow([_formater(valeur) for valeur in ligne])
+        if numero % chunk_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def compresser_gzip(blocs):
+    """Compresser un flux d'octets au format gzip, bloc par bloc"""
+    compresseur = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for bloc in blocs:
+        donnees = compresseur.compress(bloc)
+        if donnees:
+            yield donnees
+    yield compresseur.flush()
+
+
+def reponse_export_csv(request, queryset, colonnes, nom):
+    """
+    Réponse HTTP streamée contenant le CSV du queryset. Avec
+    `?compression=gzip`, le fichier est servi compressé (.csv.gz).
+    """
+    nom_fichier = f'{nom}_{timezone.localdate():%Y%m%d}.csv'
+    flux = iterer_csv(queryset, colonnes)
+
+    if request.query_params.get('compression') == 'gzip':
+        response = StreamingHttpResponse(
+            compresser_gzip(flux), content_type='application/gzip')
+        nom_fichier += '.gz'
+    else:
+        response = StreamingHttpResponse(
+            flux, content_type='text/csv; charset=utf-8')
+
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
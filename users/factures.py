@@ -0,0 +1,189 @@
+# factures.py
+"""
+Génération des PDF de factures hors du chemin de la requête.
+
+Le rendu reportlab est confié à un pool de processus (users/pdf.py). Chaque
+PDF est stocké sous un nom dérivé de la vente et d'une version (empreinte du
+contenu facturé) : tant que la facture ne change pas, les téléchargements
+suivants sont servis depuis le stockage sans nouveau rendu.
+"""
+import hashlib
+import json
+import tempfile
+import threading
+import zipfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .pdf import rendre_facture_pdf
+from .taches import PoolProcessus, apres_execution
+
+# Nombre de processus de rendu par worker
+PDF_WORKERS = getattr(settings, 'FACTURES_PDF_WORKERS', 2)
+# Attente maximale (secondes) d'un rendu demandé par un téléchargement
+PDF_TIMEOUT = getattr(settings, 'FACTURES_PDF_TIMEOUT', 15)
+
+pool_factures = PoolProcessus(PDF_WORKERS)
+_enregistrement_verrou = threading.Lock()
+
+
+def _soumettre(chemin, donnees):
+    """Lancer le rendu d'un PDF, ou réutiliser le rendu déjà en cours"""
+    return pool_factures.soumettre(chemin, rendre_facture_pdf, donnees)
+
+
+def donnees_facture(facture):
+    """Contenu facturé, sous forme sérialisable pour les processus de rendu"""
+    vente = facture.vente
+    client = vente.client
+    reduction = ''
+    if vente.type_reduction == 'pourcentage':
+        reduction = f'Réduction ({vente.valeur_reduction} %)'
+    elif vente.type_reduction == 'montant':
+        reduction = 'Réduction'
+
+    return {
+        'entreprise': getattr(settings, 'FACTURE_ENTREPRISE', ''),
+        'numero_facture': facture.numero_facture,
+        'date_facture': facture.date_facture.strftime('%d/%m/%Y'),
+        'numero_vente': vente.numero_vente,
+        'type_vente': vente.get_type_vente_display(),
+        'client': {
+            'nom': client.nom,
+            'numero_client': client.numero_client or '',
+            'adresse': client.adresse,
+            'telephone': client.telephone,
+            'email': client.email,
+        } if client else None,
+        'lignes': [
+            {
+                'code': ligne.produit.code,
+                'produit': ligne.produit.nom,
+                'entrepot': ligne.entrepot.nom,
+                'quantite': str(ligne.quantite),
+                'prix_unitaire': str(ligne.prix_unitaire),
+                'montant_total': str(ligne.montant_total),
+            }
+            for ligne in vente.lignes_vente.all()
+        ],
+        'reduction': reduction,
+        'montant_avant_reduction': str(vente.montant_avant_reduction),
+        'montant_reduction': str(vente.montant_reduction),
+        'montant_ht': str(facture.montant_ht),
+        'tva': str(facture.tva),
+        'montant_ttc': str(facture.montant_ttc),
+        'montant_paye': str(vente.montant_paye),
+        'montant_restant': str(vente.montant_restant),
+        'statut_paiement': vente.get_statut_paiement_display(),
+    }
+
+
+def chemin_pdf(facture, donnees):
+    """Nom de stockage du PDF : vente + version du contenu facturé"""
+    version = hashlib.sha1(
+        json.dumps(donnees, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:12]
+    return f'factures/{facture.vente_id}/{facture.numero_facture}-{version}.pdf'
+
+
+def _enregistrer_pdf(facture, chemin, contenu):
+    """Écrire le PDF rendu et y faire pointer la facture (idempotent)"""
+    from .models import Facture
+
+    storage = facture.pdf_facture.storage
+    with _enregistrement_verrou:
+        if not storage.exists(chemin):
+            chemin = storage.save(chemin, ContentFile(contenu))
+        ancien = Facture.objects.filter(pk=facture.pk).values_list(
+            'pdf_facture', flat=True).first()
+        Facture.objects.filter(pk=facture.pk).update(pdf_facture=chemin)
+        # La version précédente n'est plus servie
+        if ancien and ancien != chemin and storage.exists(ancien):
+            storage.delete(ancien)
+    facture.pdf_facture.name = chemin
+    return chemin
+
+
+def _pdf_en_cache(facture, chemin):
+    storage = facture.pdf_facture.storage
+    if not storage.exists(chemin):
+        return False
+    if facture.pdf_facture.name != chemin:
+        _enregistrer_pdf(facture, chemin, None)
+    return True
+
+
+def obtenir_pdf_facture(facture, timeout=PDF_TIMEOUT):
+    """
+    Retourner le nom de stockage du PDF à jour de la facture, en attendant
+    son rendu au plus `timeout` secondes (TimeoutError au-delà ; le rendu
+    continue et sera enregistré à la fin)
+    """
+    donnees = donnees_facture(facture)
+    chemin = chemin_pdf(facture, donnees)
+    if _pdf_en_cache(facture, chemin):
+        return chemin
+
+    future = _soumettre(chemin, donnees)
+    try:
+        contenu = future.result(timeout=timeout)
+    except TimeoutError:
+        _enregistrer_en_arriere_plan(facture, chemin, future)
+        raise
+    return _enregistrer_pdf(facture, chemin, contenu)
+
+
+def _enregistrer_en_arriere_plan(facture, chemin, future):
+    apres_execution(
+        future,
+        lambda contenu: _enregistrer_pdf(facture, chemin, contenu),
+        f"Rendu de la facture {facture.numero_facture}"
+    )
+
+
+def planifier_pdf_facture(facture_id):
+    """Lancer en arrière-plan le rendu du PDF d'une facture"""
+    from .models import Facture
+
+    facture = Facture.objects.select_related('vente__client').prefetch_related(
+        'vente__lignes_vente__produit', 'vente__lignes_vente__entrepot'
+    ).get(pk=facture_id)
+    donnees = donnees_facture(facture)
+    chemin = chemin_pdf(facture, donnees)
+    if _pdf_en_cache(facture, chemin):
+        return
+    _enregistrer_en_arriere_plan(facture, chemin, _soumettre(chemin, donnees))
+
+
+def preparer_factures(factures):
+    """
+    Nom de stockage du PDF à jour de chaque facture ; le rendu des PDF
+    manquants est lancé en arrière-plan, sans l'attendre. Retourne
+    ({facture.pk: chemin}, nombre de rendus en attente)
+    """
+    chemins = {}
+    en_attente = 0
+    for facture in factures:
+        donnees = donnees_facture(facture)
+        chemin = chemin_pdf(facture, donnees)
+        chemins[facture.pk] = chemin
+        if not _pdf_en_cache(facture, chemin):
+            # Un rendu déjà en cours pour ce chemin est réutilisé
+            _enregistrer_en_arriere_plan(facture, chemin, _soumettre(chemin, donnees))
+            en_attente += 1
+    return chemins, en_attente
+
+
+def archive_factures(factures, chemins):
+    """
+    Regrouper des PDF déjà rendus (voir preparer_factures) dans une archive
+    zip (fichier temporaire retourné ouvert, positionné au début)
+    """
+    archive = tempfile.TemporaryFile()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for facture in factures:
+            with facture.pdf_facture.storage.open(chemins[facture.pk], 'rb') as pdf:
+                zf.writestr(f'{facture.numero_facture}.pdf', pdf.read())
+    archive.seek(0)
+    return archive
@@ -0,0 +1,106 @@
+# images.py
+"""
+Traitement des images produits hors de la requête.
+
+À chaque nouvel upload, l'image est confiée au pool de processus : elle est
+ramenée à IMAGE_MAX_SIZE, et ses variantes miniature (THUMBNAIL_SIZE) et
+WebP sont produites par les fonctions de users/utils.py, puis enregistrées
+sur le produit.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .taches import PoolProcessus, apres_execution
+from .utils import traiter_image_produit
+
+# Nombre de processus de traitement d'images par worker
+IMAGES_WORKERS = getattr(settings, 'IMAGES_WORKERS', 2)
+
+pool_images = PoolProcessus(IMAGES_WORKERS)
+
+
+def arguments_traitement(nom_image):
+    """Arguments de traiter_image_produit pour l'image stockée sous `nom_image`"""
+    from .models import Produit
+
+    storage = Produit._meta.get_field('image').storage
+    with storage.open(nom_image, 'rb') as fichier:
+        contenu = fichier.read()
+    return (
+        contenu,
+        os.path.basename(nom_image),
+        tuple(getattr(settings, 'IMAGE_MAX_SIZE', (800, 800))),
+        tuple(getattr(settings, 'THUMBNAIL_SIZE', (150, 150))),
+    )
+
+
+def enregistrer_variantes(produit_id, nom_image, variantes):
+    """
+    Écrire les variantes produites et les associer au produit, à condition
+    que son image n'ait pas été remplacée entre-temps
+    """
+    from .models import Produit
+
+    champs = {
+        'image': Produit._meta.get_field('image'),
+        'thumbnail': Produit._meta.get_field('thumbnail'),
+        'image_webp': Produit._meta.get_field('image_webp'),
+    }
+    fichiers = {
+        'image': variantes['image'],
+        'thumbnail': variantes['thumbnail'],
+        'image_webp': variantes['webp'],
+    }
+
+    mises_a_jour = {}
+    for champ, fichier in fichiers.items():
+        if fichier is None:
+            continue
+        nom, contenu = fichier
+        field = champs[champ]
+        mises_a_jour[champ] = field.storage.save(
+            field.generate_filename(None, nom), ContentFile(contenu))
+
+    if not mises_a_jour:
+        return False
+
+    anciens = Produit.objects.filter(pk=produit_id).values(
+        'thumbnail', 'image_webp').first() or {}
+    anciens['image'] = nom_image
+
+    modifies = Produit.objects.filter(
+        pk=produit_id, image=nom_image).update(**mises_a_jour)
+
+    # Image remplacée entre-temps : ces variantes sont déjà périmées
+    if not modifies:
+        for champ, nom in mises_a_jour.items():
+            champs[champ].storage.delete(nom)
+        return False
+
+    for champ, nom in mises_a_jour.items():
+        ancien = anciens.get(champ)
+        if ancien and ancien != nom:
+            champs[champ].storage.delete(ancien)
+    return True
+
+
+def planifier_traitement_image(produit_id):
+    """Lancer en arrière-plan le traitement de l'image d'un produit"""
+    from .models import Produit
+
+    nom_image = Produit.objects.filter(pk=produit_id).values_list(
+        'image', flat=True).first()
+    if not nom_image:
+        return
+
+    future = pool_images.soumettre(
+        f'{produit_id}:{nom_image}', traiter_image_produit,
+        *arguments_traitement(nom_image)
+    )
+    apres_execution(
+        future,
+        lambda variantes: enregistrer_variantes(produit_id, nom_image, variantes),
+        f"Traitement de l'image du produit {produit_id}"
+    )
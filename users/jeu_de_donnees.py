@@ -0,0 +1,660 @@
+# jeu_de_donnees.py
+"""
+Jeu de données synthétique à l'échelle de la production (commande
+`generate_dataset`).
+
+À l'échelle 1 : 50 000 produits, 20 entrepôts, 20 000 clients, 1 000 000 de
+ventes avec leurs lignes et leurs factures, environ 5 000 000 de mouvements
+de stock (inventaire initial, réapprovisionnements, sorties des ventes
+confirmées) et les entrées d'audit correspondantes, réparties sur une
+période de `jours` jours. Tout est tiré d'un générateur initialisé par la
+graine : deux exécutions sur une même base produisent les mêmes données.
+
+Les lignes sont insérées avec des clés primaires attribuées à l'avance
+(aucune relecture des identifiants), par lots validés chacun dans sa
+transaction, les receivers de users.models étant déconnectés. Le
+référentiel passe par bulk_create ; les tables volumineuses (ventes,
+lignes, factures, mouvements, audit) par un INSERT executemany dont les
+valeurs sont adaptées directement : la préparation champ par champ de
+bulk_create coûte plusieurs fois l'écriture elle-même. Ce que
+les receivers et les méthodes save() maintiennent d'habitude est produit
+directement : numéros de séquence, journal d'audit, index de recherche,
+table de faits VenteJournaliere, stocks par entrepôt et totaux des produits.
+"""
+import inspect
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from operator import attrgetter
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, signals
+from django.utils import timezone
+
+from .cache import invalider_cache
+from .models import (
+    AuditLog, Categorie, Client, CustomUser, Entrepot, Facture, Fournisseur,
+    LigneDeVente, MouvementStock, Produit, StockEntrepot, Vente,
+    VenteJournaliere, colonnes_audit_mouvement, details_audit_mouvement,
+)
+from .recherche import indexer
+from .sequences import sequence_client, sequence_facture, sequence_vente
+
+# Volumes à l'échelle 1 (les mouvements incluent ceux des ventes)
+VOLUMES = {
+    'vendeurs': 20,
+    'fournisseurs': 200,
+    'entrepots': 20,
+    'produits': 50000,
+    'clients': 20000,
+    'ventes': 1000000,
+    'mouvements': 5000000,
+}
+
+CATEGORIES = (
+    'Wax', 'Bazin', 'Kente', 'Bogolan', 'Faso Dan Fani', 'Coton', 'Lin',
+    'Soie', 'Velours', 'Dentelle', 'Satin', 'Mercerie',
+)
+FINITIONS = ('imprimé', 'brodé', 'uni', 'rayé', 'teint', 'damassé', 'tissé', 'brillant')
+COULEURS = (
+    'rouge', 'bleu', 'vert', 'jaune', 'noir', 'blanc', 'or', 'indigo',
+    'orange', 'violet', 'bordeaux', 'turquoise',
+)
+PRENOMS = (
+    'Awa', 'Moussa', 'Fatou', 'Ibrahima', 'Aminata', 'Ousmane', 'Mariam',
+    'Seydou', 'Kadiatou', 'Abdoulaye', 'Aïcha', 'Boubacar', 'Ramatou', 'Issa',
+)
+NOMS = (
+    'Traoré', 'Diallo', 'Koné', 'Ouédraogo', 'Sawadogo', 'Coulibaly',
+    'Diarra', 'Sanogo', 'Kaboré', 'Zongo', 'Touré', 'Cissé', 'Sy', 'Ndiaye',
+)
+VILLES = ('Ouagadougou', 'Bobo-Dioulasso', 'Bamako', 'Abidjan', 'Dakar', 'Lomé', 'Niamey')
+
+# Tirages pondérés (valeur, poids)
+NOMBRE_LIGNES = ((1, 30), (2, 30), (3, 20), (4, 12), (5, 8))
+STATUTS = (('confirmee', 88), ('brouillon', 12))
+REDUCTIONS = (('aucune', 80), ('pourcentage', 12), ('montant', 8))
+PAIEMENTS = (('paye', 70), ('partiel', 15), ('non_paye', 15))
+MODES_PAIEMENT = [mode for mode, _ in Vente.MODE_PAIEMENT]
+
+# Lignes par appel à VenteJournaliere.cumuler (limite de paramètres SQL)
+TAILLE_CUMUL = 1000
+# Cache de pages SQLite de la connexion de chargement (Ko)
+TAILLE_CACHE_SQLITE_KO = 256 * 1024
+
+SIGNAUX = (
+    signals.pre_save, signals.post_save, signals.pre_delete,
+    signals.post_delete, signals.m2m_changed,
+)
+
+
+@contextmanager
+def signaux_suspendus():
+    """Déconnecter les receivers de users.models le temps du chargement"""
+    from . import models as module
+
+    fonctions = [
+        objet for objet in vars(module).values()
+        if inspect.isfunction(objet) and objet.__module__ == module.__name__
+    ]
+    deconnectes = []
+    for modele in apps.get_app_config('users').get_models(include_auto_created=True):
+        for signal in SIGNAUX:
+            for fonction in fonctions:
+                if signal.disconnect(fonction, sender=modele):
+                    deconnectes.append((signal, fonction, modele))
+    try:
+        yield
+    finally:
+        for signal, fonction, modele in deconnectes:
+            signal.connect(fonction, sender=modele)
+
+
+@contextmanager
+def horodatages_libres(*modeles):
+    """Désactiver auto_now et auto_now_add : les dates générées sont conservées"""
+    champs = [
+        (champ, champ.auto_now, champ.auto_now_add)
+        for modele in modeles for champ in modele._meta.concrete_fields
+        if getattr(champ, 'auto_now', False) or getattr(champ, 'auto_now_add', False)
+    ]
+    for champ, _, _ in champs:
+        champ.auto_now = champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ, auto_now, auto_now_add in champs:
+            champ.auto_now, champ.auto_now_add = auto_now, auto_now_add
+
+
+def _montant(valeur):
+    return Decimal(valeur).quantize(Decimal('0.01'))
+
+
+@lru_cache(maxsize=4096)
+def _date_heure_sql(valeur):
+    # Une même date sert à la vente, à ses mouvements et à leur audit
+    return connection.ops.adapt_datetimefield_value(valeur)
+
+
+def _adaptateur(champ, ops):
+    """
+    Conversion d'une valeur de `champ` pour l'INSERT (sous-ensemble de
+    get_db_prep_save couvrant les types produits par ce module), ou None si
+    la valeur passe telle quelle
+    """
+    type_interne = champ.get_internal_type()
+    if type_interne == 'DateTimeField':
+        return lambda valeur: None if valeur is None else _date_heure_sql(valeur)
+    if type_interne == 'DateField':
+        return ops.adapt_datefield_value
+    if type_interne == 'JSONField':
+        return lambda valeur: ops.adapt_json_value(valeur, champ.encoder)
+    if type_interne == 'FileField':
+        return lambda valeur: valeur.name or ''
+    return None
+
+
+def _inserer_en_masse(modele, objets):
+    """
+    INSERT executemany des objets, tous champs renseignés (clé primaire
+    comprise) : ni valeurs par défaut calculées, ni auto_now, ni signaux
+    """
+    if not objets:
+        return objets
+    ops = connection.ops
+    champs = modele._meta.concrete_fields
+    sql = (
+        f"INSERT INTO {ops.quote_name(modele._meta.db_table)} "
+        f"({', '.join(ops.quote_name(champ.column) for champ in champs)}) "
+        f"VALUES ({', '.join(['%s'] * len(champs))})"
+    )
+    valeurs = attrgetter(*(champ.attname for champ in champs))
+    adaptateurs = [
+        (index, adaptateur) for index, adaptateur in enumerate(
+            _adaptateur(champ, ops) for champ in champs)
+        if adaptateur is not None
+    ]
+    lignes = []
+    for objet in objets:
+        ligne = list(valeurs(objet))
+        for index, adaptateur in adaptateurs:
+            ligne[index] = adaptateur(ligne[index])
+        lignes.append(ligne)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, lignes)
+    return objets
+    ops = connection.ops
+    champs = modele._meta.concrete_fields
+    sql = (
+        f"INSERT INTO {ops.quote_name(modele._meta.db_table)} "
+        f"({', '.join(ops.quote_name(champ.column) for champ in champs)}) "
+        f"VALUES ({', '.join(['%s'] * len(champs))})"
+    )
+    attributs = [champ.attname for champ in champs]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            tuple(_valeur_sql(getattr(objet, attribut), ops) for attribut in attributs)
+            for objet in objets
+        ])
+    return objets
+
+
+class _Generateur:
+    def __init__(self, echelle, graine, jours, taille_lot, progression):
+        self.aleatoire = random.Random(graine)
+        self.volumes = {
+            nom: max(1, round(volume * echelle)) for nom, volume in VOLUMES.items()
+        }
+        self.volumes['entrepots'] = max(2, self.volumes['entrepots'])
+        self.taille_lot = taille_lot
+        self.progression = progression or (lambda message: None)
+        self.fin = timezone.now()
+        self.debut = self.fin - timedelta(days=jours)
+        self.comptes = dict.fromkeys(
+            ('utilisateurs', 'produits', 'clients', 'ventes', 'lignes',
+             'factures', 'mouvements', 'audit', 'stocks'), 0)
+        self._ids = {}
+        # Stock courant de chaque emplacement {(produit, entrepôt):
+        # [quantité, quantité réservée]}
+        self.stocks = {}
+
+    def _id(self, modele):
+        if modele not in self._ids:
+            dernier = modele.objects.aggregate(dernier=Max('pk'))['dernier']
+            self._ids[modele] = (dernier or 0) + 1
+        valeur = self._ids[modele]
+        self._ids[modele] += 1
+        return valeur
+
+    def _tirage(self, ponderations):
+        valeurs, poids = zip(*ponderations)
+        return self.aleatoire.choices(valeurs, poids)[0]
+
+    def _inserer(self, modele, objets):
+        modele.objects.bulk_create(objets, batch_size=self.taille_lot)
+        return objets
+
+    # Référentiel
+
+    def referentiel(self):
+        with transaction.atomic():
+            self.admin = CustomUser(
+                pk=self._id(CustomUser), role='admin', password=make_password(None))
+            self.vendeurs = [
+                CustomUser(pk=self._id(CustomUser), role='vendeur',
+                           password=make_password(None),
+                           first_name=self.aleatoire.choice(PRENOMS),
+                           last_name=self.aleatoire.choice(NOMS))
+                for _ in range(self.volumes['vendeurs'])
+            ]
+            for utilisateur in [self.admin, *self.vendeurs]:
+                utilisateur.email = f'{utilisateur.role}-{utilisateur.pk}@jeu-de-donnees.local'
+                utilisateur.username = utilisateur.email
+            self.comptes['utilisateurs'] = len(self._inserer(
+                CustomUser, [self.admin, *self.vendeurs]))
+
+            self.categories = self._inserer(Categorie, [
+                Categorie(pk=self._id(Categorie), nom=nom, created_by=self.admin)
+                for nom in CATEGORIES
+            ])
+            self.fournisseurs = self._inserer(Fournisseur, [
+                Fournisseur(
+                    pk=pk, nom=f'Fournisseur {pk}',
+                    contact=f'{self.aleatoire.choice(PRENOMS)} {self.aleatoire.choice(NOMS)}',
+                    telephone=f'70{self.aleatoire.randrange(10 ** 6):06d}',
+                    adresse=self.aleatoire.choice(VILLES), created_by=self.admin)
+                for pk in (self._id(Fournisseur) for _ in range(self.volumes['fournisseurs']))
+            ])
+            self.entrepots = self._inserer(Entrepot, [
+                Entrepot(
+                    pk=pk, nom=f'Entrepôt {pk}', adresse=self.aleatoire.choice(VILLES),
+                    responsable=self.aleatoire.choice(self.vendeurs), created_by=self.admin)
+                for pk in (self._id(Entrepot) for _ in range(self.volumes['entrepots']))
+            ])
+        self.progression(
+            f"Référentiel : {len(self.vendeurs)} vendeur(s), "
+            f"{len(self.entrepots)} entrepôt(s)")
+
+        self.produits = []
+        self.produits_par_entrepot = {entrepot: [] for entrepot in self.entrepots}
+        for debut in range(0, self.volumes['produits'], self.taille_lot):
+            lot = [self._produit() for _ in range(min(
+                self.taille_lot, self.volumes['produits'] - debut))]
+            with transaction.atomic():
+                self._inserer(Produit, lot)
+                self._audit_creations(lot, 'Produit', lambda produit: {
+                    'nom': produit.nom,
+                    'code': produit.code,
+                    'prix_vente': str(produit.prix_vente),
+                    'prix_achat': str(produit.prix_achat),
+                }, produit=True)
+                indexer(lot)
+            self.produits.extend(lot)
+        self.comptes['produits'] = len(self.produits)
+        self.emplacements = list(self.stocks)
+        self.progression(
+            f"{len(self.produits)} produit(s), {len(self.emplacements)} emplacement(s)")
+
+        self.clients = []
+        premier = sequence_client().reserver(self.volumes['clients'])
+        for debut in range(0, self.volumes['clients'], self.taille_lot):
+            lot = [
+                self._client(f'CLT{premier + index:08d}')
+                for index in range(debut, min(debut + self.taille_lot, self.volumes['clients']))
+            ]
+            with transaction.atomic():
+                self._inserer(Client, lot)
+                self._audit_creations(lot, 'Client', lambda client: {
+                    'nom': client.nom,
+                    'type_client': client.type_client,
+                    'telephone': client.telephone,
+                })
+                indexer(lot)
+            self.clients.extend(lot)
+        self.comptes['clients'] = len(self.clients)
+        self.progression(f"{len(self.clients)} client(s)")
+
+    def _produit(self):
+        pk = self._id(Produit)
+        categorie = self.aleatoire.choice(self.categories)
+        prix_achat = Decimal(self.aleatoire.randrange(500, 50000, 50))
+        produit = Produit(
+            pk=pk, code=f'JD{pk:07d}',
+            nom=f'{categorie.nom} {self.aleatoire.choice(FINITIONS)} '
+                f'{self.aleatoire.choice(COULEURS)} {pk}',
+            categorie=categorie, fournisseur=self.aleatoire.choice(self.fournisseurs),
+            prix_achat=prix_achat,
+            prix_vente=_montant(prix_achat * Decimal('1.35')),
+            prix_vente_detail=_montant(prix_achat * Decimal('1.35')),
+            prix_vente_gros=_montant(prix_achat * Decimal('1.2')),
+            stock_alerte=self.aleatoire.choice((5, 10, 20)),
+            created_by=self.admin, created_at=self.debut,
+        )
+        nombre = len(self.entrepots)
+        for entrepot in self.aleatoire.sample(
+                self.entrepots, self.aleatoire.randint(min(3, nombre), min(8, nombre))):
+            self.stocks[(produit, entrepot)] = [Decimal(0), Decimal(0)]
+            self.produits_par_entrepot[entrepot].append(produit)
+        return produit
+
+    def _client(self, numero):
+        return Client(
+            pk=self._id(Client), numero_client=numero,
+            nom=f'{self.aleatoire.choice(PRENOMS)} {self.aleatoire.choice(NOMS)}',
+            type_client='professionnel' if self.aleatoire.random() < 0.2 else 'particulier',
+            telephone=f'7{self.aleatoire.randrange(10 ** 7):07d}',
+            adresse=self.aleatoire.choice(VILLES),
+            created_by=self.aleatoire.choice(self.vendeurs), created_at=self.debut,
+        )
+
+    def _audit_creations(self, objets, modele, details, produit=False):
+        self._audit([
+            AuditLog(
+                pk=self._id(AuditLog), user_id=objet.created_by_id,
+                action='creation', modele=modele, objet_id=objet.pk,
+                produit_id=objet.pk if produit else None,
+                details=details(objet), created_at=objet.created_at)
+            for objet in objets
+        ])
+
+    def _audit(self, entrees):
+        indexer(_inserer_en_masse(AuditLog, entrees))
+        self.comptes['audit'] += len(entrees)
+
+    # Mouvements de stock et ventes
+
+    def _nouveau_lot(self):
+        self.lot = {
+            'ventes': [], 'entrepots': [], 'lignes': [], 'confirmees': [],
+            'mouvements': [], 'audit': [], 'faits': {},
+        }
+
+    def _mouvement(self, produit, entrepot, type_mouvement, quantite, source,
+                   motif, date, utilisateur, vente=None, prix_unitaire=None):
+        mouvement = MouvementStock(
+            pk=self._id(MouvementStock), produit=produit, entrepot=entrepot,
+            type_mouvement=type_mouvement, quantite=quantite,
+            prix_unitaire=prix_unitaire or produit.prix_achat, motif=motif,
+            source=source, vente=vente, created_by=utilisateur, created_at=date,
+        )
+        self.lot['mouvements'].append(mouvement)
+        self.lot['audit'].append(AuditLog(
+            pk=self._id(AuditLog), user_id=utilisateur.pk, action='mouvement_stock',
+            modele='MouvementStock', objet_id=mouvement.pk,
+            details=details_audit_mouvement(mouvement), created_at=date,
+            **colonnes_audit_mouvement(mouvement)
+        ))
+
+    def inventaire_initial(self):
+        """Une entrée d'inventaire par emplacement, au début de la période"""
+        self._nouveau_lot()
+        for produit, entrepot in self.emplacements:
+            quantite = Decimal(self.aleatoire.randint(50, 500))
+            self.stocks[(produit, entrepot)][0] += quantite
+            self._mouvement(
+                produit, entrepot, 'entree', quantite, 'inventaire',
+                'Inventaire initial', self.debut, self.admin)
+            if len(self.lot['mouvements']) >= self.taille_lot:
+                self._valider_lot()
+        self._valider_lot()
+        self.progression(f"Inventaire initial : {len(self.emplacements)} mouvement(s)")
+
+    def _reapprovisionnement(self, date):
+        produit, entrepot = self.aleatoire.choice(self.emplacements)
+        quantite = Decimal(self.aleatoire.randint(10, 200))
+        self.stocks[(produit, entrepot)][0] += quantite
+        self._mouvement(
+            produit, entrepot, 'entree', quantite, 'manuel', 'Réapprovisionnement',
+            date, self.aleatoire.choice(self.vendeurs))
+
+    def ventes(self):
+        nombre = self.volumes['ventes']
+        premier = sequence_vente().reserver(nombre)
+
+        # Réapprovisionnements répartis sur la période, pour atteindre le
+        # volume de mouvements visé avec les sorties des ventes
+        lignes_par_vente = (
+            sum(valeur * poids for valeur, poids in NOMBRE_LIGNES)
+            / sum(poids for _, poids in NOMBRE_LIGNES))
+        part_confirmees = dict(STATUTS)['confirmee'] / sum(dict(STATUTS).values())
+        reapprovisionnements = max(0, self.volumes['mouvements'] - len(self.emplacements)
+                                   - round(nombre * part_confirmees * lignes_par_vente))
+
+        duree = self.fin - self.debut
+        emis = 0
+        self._nouveau_lot()
+        for index in range(nombre):
+            date = self.debut + duree * ((index + self.aleatoire.random()) / nombre)
+            self._vente(f'DA{premier + index:08d}', date)
+            while emis < reapprovisionnements * (index + 1) // nombre:
+                self._reapprovisionnement(date)
+                emis += 1
+            if len(self.lot['ventes']) >= self.taille_lot:
+                self._valider_lot()
+                self.progression(
+                    f"{self.comptes['ventes']}/{nombre} vente(s), "
+                    f"{self.comptes['mouvements']} mouvement(s)")
+        self._valider_lot()
+        self.progression(
+            f"{self.comptes['ventes']} vente(s), {self.comptes['lignes']} ligne(s), "
+            f"{self.comptes['factures']} facture(s)")
+
+    def _vente(self, numero, date):
+        entrepot = self.aleatoire.choice(self.entrepots)
+        candidats = self.produits_par_entrepot[entrepot]
+        if not candidats:
+            return
+        vendeur = self.aleatoire.choice(self.vendeurs)
+        gros = self.aleatoire.random() < 0.2
+        statut = self._tirage(STATUTS)
+        vente = Vente(
+            pk=self._id(Vente), numero_vente=numero,
+            client=self.aleatoire.choice(self.clients) if self.aleatoire.random() < 0.9 else None,
+            type_vente='gros' if gros else 'detail', statut=statut,
+            created_by=vendeur, created_at=date,
+        )
+
+        lignes = []
+        nombre_lignes = min(len(candidats), self._tirage(NOMBRE_LIGNES))
+        for produit in self.aleatoire.sample(candidats, nombre_lignes):
+            stock = self.stocks[(produit, entrepot)]
+            demande = self.aleatoire.randint(10, 50) if gros else self.aleatoire.randint(1, 5)
+            quantite = min(Decimal(demande), stock[0] - stock[1])
+            if quantite <= 0:
+                continue
+            prix = produit.prix_vente_gros if gros else produit.prix_vente_detail
+            lignes.append(LigneDeVente(
+                pk=self._id(LigneDeVente), vente=vente, produit=produit,
+                entrepot=entrepot, quantite=quantite, prix_unitaire=prix,
+                est_prix_gros=gros, stock_preleve=statut == 'confirmee',
+                montant_total=_montant(quantite * prix),
+            ))
+        if not lignes:
+            return
+
+        avant = sum(ligne.montant_total for ligne in lignes)
+        vente.type_reduction = self._tirage(REDUCTIONS)
+        if vente.type_reduction == 'pourcentage':
+            vente.valeur_reduction = Decimal(self.aleatoire.choice((5, 10, 15)))
+            reduction = _montant(avant * vente.valeur_reduction / 100)
+        elif vente.type_reduction == 'montant':
+            vente.valeur_reduction = Decimal(self.aleatoire.choice((500, 1000, 2500, 5000)))
+            reduction = min(vente.valeur_reduction, avant)
+        else:
+            reduction = Decimal(0)
+        vente.montant_avant_reduction = avant
+        vente.montant_reduction = vente.montant_remise = reduction
+        vente.montant_total = avant - reduction
+
+        client = vente.client.nom if vente.client else 'Aucun'
+        self.lot['audit'].append(AuditLog(
+            pk=self._id(AuditLog), user_id=vendeur.pk, action='vente', modele='Vente',
+            objet_id=vente.pk, vente_id=vente.pk, montant=vente.montant_total,
+            created_at=date, details={
+                'numero_vente': numero,
+                'client': client,
+                'statut': 'brouillon',
+                'montant_total': str(vente.montant_total),
+            }
+        ))
+
+        if statut == 'confirmee':
+            self._confirmer(vente, lignes, client)
+        else:
+            vente.montant_restant = vente.montant_total
+            for ligne in lignes:
+                self.stocks[(ligne.produit, entrepot)][1] += ligne.quantite
+
+        self.lot['ventes'].append(vente)
+        self.lot['entrepots'].append(
+            Vente.entrepots.through(
+                pk=self._id(Vente.entrepots.through), vente_id=vente.pk,
+                entrepot_id=entrepot.pk))
+        self.lot['lignes'].extend(lignes)
+
+    def _confirmer(self, vente, lignes, client):
+        """Effets de Vente.confirmer_vente : stock prélevé, mouvements, audit, facture"""
+        date = min(vente.created_at + timedelta(minutes=self.aleatoire.randint(1, 240)), self.fin)
+        vente.date_confirmation = date
+        vente.confirmed_by = vente.created_by
+
+        paiement = self._tirage(PAIEMENTS)
+        if paiement == 'paye':
+            vente.montant_paye = vente.montant_total
+        elif paiement == 'partiel':
+            vente.montant_paye = _montant(
+                vente.montant_total * self.aleatoire.randint(10, 90) / 100)
+        vente.montant_restant = vente.montant_total - vente.montant_paye
+        # Mêmes règles que Vente.save()
+        if vente.montant_paye == 0:
+            vente.statut_paiement = 'non_paye'
+        elif vente.montant_paye < vente.montant_total:
+            vente.statut_paiement = 'partiel'
+        else:
+            vente.statut_paiement = 'paye'
+            vente.date_paiement = date
+        if vente.montant_paye:
+            vente.mode_paiement = self.aleatoire.choice(MODES_PAIEMENT)
+
+        motif = f"Vente {vente.numero_vente}" + (f" - Client: {client}" if vente.client else "")
+        for ligne in lignes:
+            self.stocks[(ligne.produit, ligne.entrepot)][0] -= ligne.quantite
+            self._mouvement(
+                ligne.produit, ligne.entrepot, 'sortie', ligne.quantite, 'vente',
+                motif, date, vente.created_by, vente=vente,
+                prix_unitaire=ligne.prix_unitaire)
+        self.lot['audit'].append(AuditLog(
+            pk=self._id(AuditLog), user_id=vente.created_by_id, action='confirmation',
+            modele='Vente', objet_id=vente.pk, vente_id=vente.pk,
+            montant=vente.montant_total, created_at=date, details={
+                'numero_vente': vente.numero_vente,
+                'client': client,
+                'montant_total': str(vente.montant_total),
+                'montant_reduction': str(vente.montant_reduction),
+                'mouvements_crees': len(lignes),
+            }
+        ))
+
+        for cle, mesures in VenteJournaliere.contributions(vente, lignes).items():
+            cumul = self.lot['faits'].setdefault(cle, dict.fromkeys(mesures, 0))
+            for mesure, valeur in mesures.items():
+                cumul[mesure] += valeur
+        self.lot['confirmees'].append(vente)
+
+    def _valider_lot(self):
+        lot = self.lot
+        with transaction.atomic():
+            _inserer_en_masse(Vente, lot['ventes'])
+            _inserer_en_masse(Vente.entrepots.through, lot['entrepots'])
+            _inserer_en_masse(LigneDeVente, lot['lignes'])
+            factures = []
+            if lot['confirmees']:
+                premier = sequence_facture().reserver(len(lot['confirmees']))
+                factures = _inserer_en_masse(Facture, [
+                    Facture(
+                        pk=self._id(Facture), vente=vente,
+                        numero_facture=f'FAC{premier + index:08d}',
+                        montant_ht=vente.montant_total, tva=0,
+                        montant_ttc=vente.montant_total,
+                        date_facture=timezone.localdate(vente.date_confirmation))
+                    for index, vente in enumerate(lot['confirmees'])
+                ])
+            _inserer_en_masse(MouvementStock, lot['mouvements'])
+            self._audit(lot['audit'])
+            faits = list(lot['faits'].items())
+            for debut in range(0, len(faits), TAILLE_CUMUL):
+                VenteJournaliere.cumuler(dict(faits[debut:debut + TAILLE_CUMUL]))
+
+        self.comptes['ventes'] += len(lot['ventes'])
+        self.comptes['lignes'] += len(lot['lignes'])
+        self.comptes['factures'] += len(factures)
+        self.comptes['mouvements'] += len(lot['mouvements'])
+        self._nouveau_lot()
+
+    # Stocks
+
+    def stocks_finaux(self):
+        """Stocks par entrepôt issus des mouvements, puis totaux des produits"""
+        for debut in range(0, len(self.emplacements), self.taille_lot):
+            with transaction.atomic():
+                self._inserer(StockEntrepot, [
+                    StockEntrepot(
+                        pk=self._id(StockEntrepot), produit=produit, entrepot=entrepot,
+                        quantite=self.stocks[(produit, entrepot)][0],
+                        quantite_reservee=self.stocks[(produit, entrepot)][1],
+                        stock_alerte=produit.stock_alerte,
+                        created_at=self.debut, updated_at=self.fin)
+                    for produit, entrepot in self.emplacements[debut:debut + self.taille_lot]
+                ])
+        self.comptes['stocks'] = len(self.emplacements)
+
+        for debut in range(0, len(self.produits), self.taille_lot):
+            lot = self.produits[debut:debut + self.taille_lot]
+            with transaction.atomic():
+                Produit.objects.filter(
+                    pk__gte=lot[0].pk, pk__lte=lot[-1].pk).synchroniser_stock()
+        self.progression(f"{self.comptes['stocks']} stock(s) par entrepôt")
+
+
+def _reinitialiser_sequences(modeles):
+    """Recaler les séquences d'auto-incrément après des clés explicites (PostgreSQL)"""
+    requetes = connection.ops.sequence_reset_sql(no_style(), modeles)
+    if requetes:
+        with connection.cursor() as cursor:
+            for requete in requetes:
+                cursor.execute(requete)
+
+
+def generer(echelle=1, graine=42, jours=730, taille_lot=5000, progression=None):
+    """
+    Charger un jeu de données synthétique de `echelle` fois les VOLUMES,
+    réparti sur les `jours` derniers jours. `progression(message)` est
+    appelée après chaque étape et chaque lot de ventes. Retourne le nombre
+    de lignes créées par table.
+    """
+    generateur = _Generateur(echelle, graine, jours, taille_lot, progression)
+    if connection.vendor == 'sqlite':
+        # Index des tables volumineuses gardés en mémoire pendant le chargement
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = -{TAILLE_CACHE_SQLITE_KO}')
+    with signaux_suspendus(), horodatages_libres(
+            Produit, Client, Vente, Facture, MouvementStock, StockEntrepot):
+        generateur.referentiel()
+        generateur.inventaire_initial()
+        generateur.ventes()
+        generateur.stocks_finaux()
+
+    _reinitialiser_sequences([
+        CustomUser, Categorie, Fournisseur, Entrepot, Produit, Client, Vente,
+        Vente.entrepots.through, LigneDeVente, Facture, MouvementStock,
+        AuditLog, StockEntrepot,
+    ])
+    invalider_cache('vente', 'produit', 'entrepot', 'stock', 'client',
+                    'categorie', 'fournisseur')
+    return generateur.comptes
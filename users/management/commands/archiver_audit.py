@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users.archives import AUDIT_ARCHIVES_DIR, AUDIT_RETENTION_JOURS, archiver_audit
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les entrées d'audit anciennes vers des archives JSONL "
+        "compressées (un fichier par mois) et conserve leurs comptes journaliers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours', type=int, default=AUDIT_RETENTION_JOURS,
+            help="Âge (en jours) au-delà duquel une entrée est archivée"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Nombre d'entrées archivées et supprimées par transaction"
+        )
+
+    def handle(self, *args, **options):
+        archives = archiver_audit(options['jours'], options['batch_size'])
+        for mois, nombre in sorted(archives.items()):
+            self.stdout.write(f"{mois}: {nombre} entrée(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(archives.values())} entrée(s) archivée(s) dans {AUDIT_ARCHIVES_DIR}"
+        ))
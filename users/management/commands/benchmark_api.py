@@ -0,0 +1,149 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+
+from users.benchmark import (
+    REPETITIONS_MIN_P95, comparer, erreur_serveur, mesurer, peupler, vitesse_relative,
+)
+
+REFERENCE = os.path.join(settings.BASE_DIR, 'benchmarks', 'reference.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure chaque point d'accès GET de l'API (requêtes SQL, latences "
+        "p50/p95, pic mémoire) sur une base de test peuplée, et compare à la "
+        "référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--echelle', type=int, default=1,
+            help="Facteur de volume du jeu de données (1 = 100 produits, 100 ventes)"
+        )
+        parser.add_argument('--graine', type=int, default=42, help="Graine aléatoire")
+        parser.add_argument(
+            '--repetitions', type=int, default=REPETITIONS_MIN_P95,
+            help=(
+                "Nombre d'exécutions chronométrées par point d'accès (le p95 "
+                f"n'est comparé qu'à partir de {REPETITIONS_MIN_P95})"
+            )
+        )
+        parser.add_argument(
+            '--avec-cache', action='store_true',
+            help="Mesurer avec le cache des réponses (vidé avant chaque appel sinon)"
+        )
+        parser.add_argument('--sortie', help="Fichier JSON des résultats")
+        parser.add_argument(
+            '--reference', default=REFERENCE,
+            help="Référence à laquelle comparer les résultats"
+        )
+        parser.add_argument(
+            '--mettre-a-jour-reference', action='store_true',
+            help="Écrire les résultats comme nouvelle référence"
+        )
+        parser.add_argument(
+            '--tolerance-temps', type=float, default=0.5,
+            help="Hausse relative de latence tolérée (0.5 = +50 %%)"
+        )
+        parser.add_argument(
+            '--tolerance-memoire', type=float, default=0.5,
+            help="Hausse relative du pic mémoire tolérée"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Le benchmark de référence s'exécute sur SQLite")
+        if options['repetitions'] < 1:
+            raise CommandError("--repetitions doit être positif")
+
+        media = tempfile.mkdtemp(prefix='benchmark-media-')
+        # Base fichier plutôt qu'en mémoire partagée : les écritures des
+        # threads d'arrière-plan (PDF, audit) attendent le verrou au lieu
+        # d'échouer
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(
+            media, 'benchmark.sqlite3')
+        setup_test_environment()
+        nom_base = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                self.stdout.write(f"Peuplement (échelle {options['echelle']})...")
+                admin = peupler(options['echelle'], options['graine'])
+                resultats = mesurer(admin, options['repetitions'], options['avec_cache'])
+        finally:
+            connection.creation.destroy_test_db(nom_base, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media, ignore_errors=True)
+
+        rapport = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'echelle': options['echelle'],
+                'graine': options['graine'],
+                'repetitions': options['repetitions'],
+                'avec_cache': options['avec_cache'],
+                'python': platform.python_version(),
+            },
+            'points_d_acces': resultats,
+        }
+        for nom, mesure in resultats.items():
+            if erreur_serveur(mesure):
+                latences = f"{'non mesuré':37}"
+            else:
+                latences = f"p50 {mesure['p50_ms']:8.2f} ms  p95 {mesure['p95_ms']:8.2f} ms"
+            self.stdout.write(
+                f"{nom:55} {mesure['statut']} {mesure['requetes']:4} req "
+                f"{latences}  {mesure['memoire_pic_ko']:8.1f} Ko"
+            )
+
+        if options['sortie']:
+            self._ecrire(options['sortie'], rapport)
+        if options['mettre_a_jour_reference']:
+            erreurs = [nom for nom, mesure in resultats.items() if erreur_serveur(mesure)]
+            if erreurs:
+                raise CommandError(
+                    "Référence non mise à jour, erreurs serveur :\n" + '\n'.join(erreurs))
+            self._ecrire(options['reference'], rapport)
+            self.stdout.write(self.style.SUCCESS(f"Référence mise à jour : {options['reference']}"))
+            return
+
+        if not os.path.exists(options['reference']):
+            self.stdout.write(self.style.WARNING("Aucune référence : comparaison ignorée"))
+            return
+        with open(options['reference'], encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+        if reference['meta']['echelle'] != options['echelle']:
+            raise CommandError(
+                f"La référence a été mesurée à l'échelle {reference['meta']['echelle']}")
+
+        comparer_p95 = min(
+            options['repetitions'], reference['meta']['repetitions']) >= REPETITIONS_MIN_P95
+        if not comparer_p95:
+            self.stdout.write(self.style.WARNING(
+                f"Moins de {REPETITIONS_MIN_P95} répétitions : p95 non comparé"))
+        self.stdout.write(
+            f"Vitesse relative à la référence : x{vitesse_relative(resultats, reference['points_d_acces']):.2f}")
+        regressions = comparer(
+            resultats, reference['points_d_acces'],
+            options['tolerance_temps'], options['tolerance_memoire'],
+            comparer_p95=comparer_p95)
+        if regressions:
+            raise CommandError(
+                "Régressions par rapport à la référence :\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence"))
+
+    def _ecrire(self, chemin, rapport):
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        with open(chemin, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+            fichier.write('\n')
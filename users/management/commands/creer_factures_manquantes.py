@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Facture, Vente
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée les factures des ventes confirmées qui n'en ont pas (ventes "
+        "confirmées avant la génération automatique des factures)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre de factures créées par transaction"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(
+            Vente.objects.filter(statut='confirmee', facture__isnull=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                for vente in Vente.objects.filter(id__in=ids[start:start + batch_size]).order_by('id'):
+                    Facture.creer_pour_vente(vente)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(ids)} facture(s) créée(s)"))
@@ -0,0 +1,63 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.evenements import EVENEMENTS_FICHIER, NIVEAUX, lire_evenements
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche les événements du journal structuré (lignes JSON), "
+        "rotations comprises, filtrés par niveau, nom, corrélation et date"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--niveau', choices=NIVEAUX, type=str.upper,
+            help="Niveau minimal (WARNING : avertissements et erreurs)"
+        )
+        parser.add_argument(
+            '--nom', help="Préfixe du nom de l'événement (stock.liberation, audit...)"
+        )
+        parser.add_argument('--correlation', help="Identifiant X-Request-ID d'une requête")
+        parser.add_argument('--depuis', help="Date ou date-heure ISO minimale")
+        parser.add_argument(
+            '--limite', type=int, default=100,
+            help="Nombre d'événements affichés (les plus récents, 0 : tous)"
+        )
+        parser.add_argument(
+            '--compter', action='store_true',
+            help="Afficher le nombre d'événements par nom et niveau"
+        )
+
+    def handle(self, *args, **options):
+        depuis = None
+        if options['depuis']:
+            try:
+                depuis = datetime.fromisoformat(options['depuis'])
+            except ValueError:
+                raise CommandError("--depuis doit être une date ISO (2025-01-31 ou 2025-01-31T08:00)")
+            if timezone.is_naive(depuis):
+                depuis = timezone.make_aware(depuis)
+
+        lignes = lire_evenements(
+            niveau=options['niveau'], nom=options['nom'],
+            correlation=options['correlation'], depuis=depuis,
+            limite=None if options['compter'] else options['limite'] or None,
+        )
+
+        if options['compter']:
+            comptes = {}
+            for ligne in lignes:
+                cle = (ligne['evenement'], ligne['niveau'])
+                comptes[cle] = comptes.get(cle, 0) + 1
+            for (nom, niveau), nombre in sorted(comptes.items()):
+                self.stdout.write(f"{nom:40} {niveau:8} {nombre:>8}")
+        else:
+            for ligne in lignes:
+                self.stdout.write(json.dumps(ligne, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(lignes)} événement(s) dans {EVENEMENTS_FICHIER}"
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.jeu_de_donnees import VOLUMES, generer
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge un jeu de données synthétique aux volumes de production "
+        "(à l'échelle 1 : {produits} produits, {entrepots} entrepôts, {ventes} "
+        "ventes, {mouvements} mouvements de stock et leur journal d'audit)"
+    ).format(**VOLUMES)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--echelle', type=float, default=1,
+            help="Facteur appliqué à tous les volumes (0.01 pour un essai rapide)"
+        )
+        parser.add_argument('--graine', type=int, default=42, help="Graine aléatoire")
+        parser.add_argument(
+            '--jours', type=int, default=730,
+            help="Période couverte par les ventes et les mouvements, jusqu'à aujourd'hui"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Nombre de ventes (ou de lignes) écrites par transaction"
+        )
+
+    def handle(self, *args, **options):
+        if options['echelle'] <= 0:
+            raise CommandError("L'échelle doit être positive")
+        if options['jours'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError("--jours et --batch-size doivent être positifs")
+
+        debut = time.monotonic()
+
+        def progression(message):
+            self.stdout.write(f"[{time.monotonic() - debut:7.1f} s] {message}")
+
+        comptes = generer(
+            echelle=options['echelle'], graine=options['graine'],
+            jours=options['jours'], taille_lot=options['batch_size'],
+            progression=progression,
+        )
+        total = sum(comptes.values())
+        for table, nombre in comptes.items():
+            self.stdout.write(f"{table:15} {nombre:>10}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} ligne(s) créée(s) en {time.monotonic() - debut:.1f} s"
+        ))
@@ -0,0 +1,65 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from users.images import arguments_traitement, enregistrer_variantes
+from users.models import Produit
+from users.utils import traiter_image_produit
+
+
+def _traiter(tache):
+    produit_id, nom_image, arguments = tache
+    return produit_id, nom_image, traiter_image_produit(*arguments)
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les variantes manquantes (image redimensionnée, miniature, "
+        "WebP) des images produits existantes, en parallèle"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count(),
+            help="Nombre de processus de traitement"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Nombre d'images chargées en mémoire à la fois"
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Retraiter aussi les produits qui ont déjà leurs variantes"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Produit.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            queryset = queryset.filter(
+                Q(thumbnail='') | Q(thumbnail__isnull=True) |
+                Q(image_webp='') | Q(image_webp__isnull=True)
+            )
+        produits = list(queryset.order_by('id').values_list('id', 'image'))
+
+        traites = erreurs = 0
+        with multiprocessing.Pool(processes=options['workers']) as pool:
+            for start in range(0, len(produits), batch_size):
+                taches = []
+                for produit_id, nom_image in produits[start:start + batch_size]:
+                    try:
+                        taches.append(
+                            (produit_id, nom_image, arguments_traitement(nom_image)))
+                    except OSError as e:
+                        erreurs += 1
+                        self.stderr.write(f"Produit {produit_id}: {nom_image} illisible ({e})")
+
+                for produit_id, nom_image, variantes in pool.imap_unordered(_traiter, taches):
+                    if enregistrer_variantes(produit_id, nom_image, variantes):
+                        traites += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Variantes générées pour {traites} produit(s)"
+            + (f", {erreurs} image(s) illisible(s)" if erreurs else "")
+        ))
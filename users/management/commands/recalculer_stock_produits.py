@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Produit
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les totaux de stock dénormalisés des produits "
+        "(stock_total, stock_reserve_total, stock_disponible) depuis StockEntrepot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Nombre de produits mis à jour par transaction"
+        )
+        parser.add_argument(
+            '--produit', type=int, action='append', dest='produits',
+            help="Limiter le recalcul à ce produit (option répétable)"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Produit.objects.order_by('id')
+        if options['produits']:
+            queryset = queryset.filter(id__in=options['produits'])
+
+        ids = list(queryset.values_list('id', flat=True))
+        total = 0
+        for start in range(0, len(ids), batch_size):
+            lot = ids[start:start + batch_size]
+            with transaction.atomic():
+                total += Produit.objects.filter(
+                    id__gte=lot[0], id__lte=lot[-1], id__in=lot
+                ).synchroniser_stock()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Totaux de stock recalculés pour {total} produit(s)"
+        ))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from users.cache import invalider_cache
+from users.models import LigneDeVente, Vente, VenteJournaliere
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit la table de faits VenteJournaliere depuis les ventes "
+        "confirmées (toute la période, ou celle indiquée)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-debut', help="Premier jour reconstruit (AAAA-MM-JJ)")
+        parser.add_argument('--date-fin', help="Dernier jour reconstruit (AAAA-MM-JJ)")
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help="Nombre de ventes lues par paquet"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ventes = Vente.objects.filter(statut='confirmee').order_by('id').prefetch_related(
+            Prefetch('lignes_vente', queryset=LigneDeVente.objects.only(
+                'vente_id', 'produit_id', 'entrepot_id', 'quantite', 'montant_total'))
+        )
+        faits_existants = VenteJournaliere.objects.all()
+        if options['date_debut']:
+            ventes = ventes.filter(created_at__date__gte=options['date_debut'])
+            faits_existants = faits_existants.filter(date__gte=options['date_debut'])
+        if options['date_fin']:
+            ventes = ventes.filter(created_at__date__lte=options['date_fin'])
+            faits_existants = faits_existants.filter(date__lte=options['date_fin'])
+
+        with transaction.atomic():
+            supprimes, _ = faits_existants.delete()
+
+            # Les faits sont cumulés en mémoire (une entrée par clé, pas par
+            # vente) puis écrits par paquets
+            faits = {}
+            nombre_ventes = 0
+            for vente in ventes.iterator(chunk_size=batch_size):
+                nombre_ventes += 1
+                for cle, mesures in VenteJournaliere.contributions(
+                        vente, vente.lignes_vente.all()).items():
+                    cumul = faits.setdefault(cle, dict.fromkeys(mesures, 0))
+                    for mesure, valeur in mesures.items():
+                        cumul[mesure] += valeur
+
+            VenteJournaliere.objects.bulk_create(
+                (
+                    VenteJournaliere(**dict(zip(VenteJournaliere.DIMENSIONS, cle)), **mesures)
+                    for cle, mesures in faits.items()
+                ),
+                batch_size=batch_size
+            )
+            invalider_cache('vente')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(faits)} fait(s) reconstruit(s) depuis {nombre_ventes} vente(s) "
+            f"({supprimes} supprimé(s))"
+        ))
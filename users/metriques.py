@@ -0,0 +1,341 @@
+# metriques.py
+"""
+Métriques applicatives au format texte Prometheus (GET /metrics/).
+
+Registre en mémoire propre à chaque processus : compteurs et histogrammes,
+mis à jour sans entrée-sortie. Avec plusieurs workers gunicorn, définir
+METRIQUES_DIR (répertoire local partagé par les workers) : chaque worker y
+écrit un instantané de ses valeurs (metriques-<pid>.json) au plus toutes les
+METRIQUES_INTERVALLE secondes et à l'arrêt, et l'export additionne les
+instantanés de tous les workers. Les instantanés des workers terminés sont
+fusionnés dans metriques-archives.json, pour que les compteurs ne
+redescendent pas au redémarrage d'un worker.
+
+Les métriques elles-mêmes sont déclarées en bas de ce module ; les
+requêtes HTTP sont mesurées par MetriquesMiddleware.
+"""
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - hors Unix, pas de fusion des archives
+    fcntl = None
+
+METRIQUES_DIR = getattr(settings, 'METRIQUES_DIR', None)
+METRIQUES_INTERVALLE = getattr(settings, 'METRIQUES_INTERVALLE', 1.0)
+# Jeton attendu dans `Authorization: Bearer <jeton>` ; sans jeton, l'export
+# n'est servi qu'en DEBUG
+METRIQUES_JETON = getattr(settings, 'METRIQUES_JETON', None)
+
+TYPE_CONTENU = 'text/plain; version=0.0.4; charset=utf-8'
+
+SEAUX_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEAUX_REQUETES_SQL = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_nombre(valeur):
+    if valeur == float('inf'):
+        return '+Inf'
+    return repr(float(valeur)) if isinstance(valeur, float) and not valeur.is_integer() else str(int(valeur))
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Registre:
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.metriques = {}
+        # {(nom de l'échantillon, ((étiquette, valeur), ...)): valeur}
+        self._valeurs = {}
+        self._pid = os.getpid()
+        self._ecrit_le = 0.0
+
+    def declarer(self, metrique):
+        self.metriques[metrique.nom] = metrique
+        return metrique
+
+    def ajouter(self, increments):
+        """Ajouter des valeurs à des échantillons [(clé, valeur), ...]"""
+        with self._verrou:
+            # Valeurs héritées du processus parent (fork gunicorn) : ignorées
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._valeurs = {}
+            for cle, valeur in increments:
+                self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+        if METRIQUES_DIR and time.monotonic() - self._ecrit_le >= METRIQUES_INTERVALLE:
+            self.ecrire_instantane()
+
+    def valeurs(self):
+        with self._verrou:
+            if self._pid != os.getpid():
+                return {}
+            return dict(self._valeurs)
+
+    # Partage entre workers
+
+    def _chemin(self, nom):
+        return os.path.join(METRIQUES_DIR, nom)
+
+    def ecrire_instantane(self):
+        """Écrire les valeurs de ce processus dans METRIQUES_DIR (remplacement atomique)"""
+        if not METRIQUES_DIR:
+            return
+        self._ecrit_le = time.monotonic()
+        _ecrire_json(self._chemin(f'metriques-{os.getpid()}.json'), self.valeurs())
+
+    def collecter(self):
+        """Valeurs de tous les workers (de ce seul processus sans METRIQUES_DIR)"""
+        if not METRIQUES_DIR:
+            return self.valeurs()
+        self.ecrire_instantane()
+        self._archiver_processus_termines()
+
+        total = {}
+        for chemin in glob.glob(self._chemin('metriques-*.json')):
+            for cle, valeur in _lire_json(chemin).items():
+                total[cle] = total.get(cle, 0) + valeur
+        return total
+
+    def _archiver_processus_termines(self):
+        if fcntl is None:
+            return
+        with open(self._chemin('.verrou'), 'w') as verrou:
+            fcntl.flock(verrou, fcntl.LOCK_EX)
+            try:
+                archives = None
+                for chemin in glob.glob(self._chemin('metriques-[0-9]*.json')):
+                    pid = int(os.path.basename(chemin)[len('metriques-'):-len('.json')])
+                    if _processus_actif(pid):
+                        continue
+                    if archives is None:
+                        archives = _lire_json(self._chemin('metriques-archives.json'))
+                    for cle, valeur in _lire_json(chemin).items():
+                        archives[cle] = archives.get(cle, 0) + valeur
+                    _ecrire_json(self._chemin('metriques-archives.json'), archives)
+                    os.remove(chemin)
+            finally:
+                fcntl.flock(verrou, fcntl.LOCK_UN)
+
+
+def _processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _ecrire_json(chemin, valeurs):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    temporaire = f'{chemin}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump([[nom, etiquettes, valeur] for (nom, etiquettes), valeur in valeurs.items()], fichier)
+    os.replace(temporaire, chemin)
+
+
+def _lire_json(chemin):
+    try:
+        with open(chemin, encoding='utf-8') as fichier:
+            lignes = json.load(fichier)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return {
+        (nom, tuple(tuple(paire) for paire in etiquettes)): valeur
+        for nom, etiquettes, valeur in lignes
+    }
+
+
+registre = _Registre()
+
+
+class _Metrique:
+    type = None
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        registre.declarer(self)
+
+    def _cle_etiquettes(self, valeurs):
+        if set(valeurs) != set(self.etiquettes):
+            raise ValueError(
+                f"{self.nom} attend les étiquettes {', '.join(self.etiquettes) or 'aucune'}")
+        return tuple((etiquette, str(valeurs[etiquette])) for etiquette in self.etiquettes)
+
+    def echantillons(self, valeurs):
+        """Lignes du format texte pour cette métrique"""
+        lignes = [f'# HELP {self.nom} {self.aide}', f'# TYPE {self.nom} {self.type}']
+        for (nom, etiquettes), valeur in sorted(valeurs.items(), key=self._ordre):
+            if etiquettes:
+                texte = ','.join(f'{cle}="{_echapper(val)}"' for cle, val in etiquettes)
+                lignes.append(f'{nom}{{{texte}}} {_format_nombre(valeur)}')
+            else:
+                lignes.append(f'{nom} {_format_nombre(valeur)}')
+        return lignes
+
+    def _ordre(self, element):
+        return element[0]
+
+
+class Compteur(_Metrique):
+    type = 'counter'
+
+    def inc(self, valeur=1, **etiquettes):
+        registre.ajouter([((self.nom, self._cle_etiquettes(etiquettes)), valeur)])
+
+    def noms_echantillons(self):
+        return (self.nom,)
+
+
+class Histogramme(_Metrique):
+    type = 'histogram'
+
+    def __init__(self, nom, aide, etiquettes=(), seaux=SEAUX_DUREE):
+        super().__init__(nom, aide, etiquettes)
+        self.seaux = [
+            (seau, ('le', _format_nombre(seau)))
+            for seau in tuple(sorted(seaux)) + (float('inf'),)
+        ]
+
+    def observe(self, valeur, **etiquettes):
+        cle = self._cle_etiquettes(etiquettes)
+        increments = [
+            ((f'{self.nom}_bucket', cle + (borne,)), 1 if valeur <= seau else 0)
+            for seau, borne in self.seaux
+        ]
+        increments.append(((f'{self.nom}_sum', cle), valeur))
+        increments.append(((f'{self.nom}_count', cle), 1))
+        registre.ajouter(increments)
+
+    def noms_echantillons(self):
+        return (f'{self.nom}_bucket', f'{self.nom}_sum', f'{self.nom}_count')
+
+    def _ordre(self, element):
+        (nom, etiquettes), _ = element
+        # Seaux dans l'ordre croissant de leur borne, puis _sum et _count
+        borne = dict(etiquettes).get('le')
+        etiquettes_serie = tuple(paire for paire in etiquettes if paire[0] != 'le')
+        rang = float(borne) if borne is not None else float('inf')
+        return (etiquettes_serie, self.noms_echantillons().index(nom), rang)
+
+
+def exporter():
+    """Toutes les métriques, au format texte Prometheus"""
+    valeurs = registre.collecter()
+    lignes = []
+    for metrique in registre.metriques.values():
+        noms = metrique.noms_echantillons()
+        lignes.extend(metrique.echantillons({
+            cle: valeur for cle, valeur in valeurs.items() if cle[0] in noms
+        }))
+    return '\n'.join(lignes) + '\n'
+
+
+def acces_autorise(request):
+    if not METRIQUES_JETON:
+        return settings.DEBUG
+    entete = request.headers.get('Authorization', '')
+    return hmac.compare_digest(entete.encode(), f'Bearer {METRIQUES_JETON}'.encode())
+
+
+@atexit.register
+def _ecrire_a_la_sortie():
+    try:
+        registre.ecrire_instantane()
+    except OSError:
+        pass
+
+
+# Requêtes HTTP
+
+class _CompteurSQL:
+    def __init__(self):
+        self.nombre = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.nombre += 1
+        return execute(sql, params, many, context)
+
+
+def _vue_action(request):
+    """(viewset ou vue, action) de la route résolue"""
+    correspondance = getattr(request, 'resolver_match', None)
+    if correspondance is None:
+        return 'aucune', 'aucune'
+    vue = correspondance.func
+    classe = getattr(vue, 'cls', None) or getattr(vue, 'view_class', None)
+    nom = classe.__name__ if classe else getattr(vue, '__name__', 'inconnue')
+    actions = getattr(vue, 'actions', None) or {}
+    return nom, actions.get(request.method.lower(), request.method.lower())
+
+
+class MetriquesMiddleware:
+    """Nombre, durée et requêtes SQL des requêtes HTTP, par vue et action"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        compteur = _CompteurSQL()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(compteur))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        vue, action = _vue_action(request)
+        requetes_http.inc(
+            vue=vue, action=action, methode=request.method, statut=response.status_code)
+        duree_requetes_http.observe(duree, vue=vue, action=action)
+        requetes_sql_http.observe(compteur.nombre, vue=vue, action=action)
+        return response
+
+
+# Catalogue des métriques
+
+requetes_http = Compteur(
+    'http_requetes_total', "Requêtes HTTP traitées",
+    ('vue', 'action', 'methode', 'statut'))
+duree_requetes_http = Histogramme(
+    'http_requete_duree_secondes', "Durée de traitement des requêtes HTTP",
+    ('vue', 'action'))
+requetes_sql_http = Histogramme(
+    'http_requete_requetes_sql', "Requêtes SQL exécutées par requête HTTP",
+    ('vue', 'action'), seaux=SEAUX_REQUETES_SQL)
+
+ventes = Compteur(
+    'ventes_total', "Créations et confirmations de ventes",
+    ('operation', 'resultat'))
+montant_ventes_confirmees = Compteur(
+    'ventes_confirmees_montant_total', "Montant cumulé des ventes confirmées")
+transferts = Compteur(
+    'transferts_confirmations_total', "Confirmations de transferts entre entrepôts",
+    ('resultat',))
+reservations_stock = Compteur(
+    'stock_reservations_total', "Réservations de stock des lignes de vente",
+    ('resultat',))
+mouvements_stock = Compteur(
+    'stock_mouvements_total', "Mouvements de stock traités par update_stock_on_mouvement",
+    ('type', 'resultat'))
+liberations_stock = Compteur(
+    'stock_liberations_total', "Libérations de stock réservé à la suppression",
+    ('origine', 'resultat'))
+entrees_audit = Compteur(
+    'audit_entrees_total', "Entrées du journal d'audit écrites", ('resultat',))
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.9 on 2026-10-17 01:53
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calculer_totaux_stock(apps, schema_editor):
+    Produit = apps.get_model("users", "Produit")
+    StockEntrepot = apps.get_model("users", "StockEntrepot")
+    zero = Value(
+        Decimal("0"), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+    def somme(champ):
+        return Coalesce(
+            Subquery(
+                StockEntrepot.objects.filter(produit=OuterRef("pk"))
+                .order_by()
+                .values("produit")
+                .annotate(total=Sum(champ))
+                .values("total")[:1]
+            ),
+            zero,
+        )
+
+    Produit.objects.update(
+        stock_total=somme("quantite"),
+        stock_reserve_total=somme("quantite_reservee"),
+        stock_disponible=somme("quantite") - somme("quantite_reservee"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0014_alter_lignedevente_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="produit",
+            name="stock_disponible",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="produit",
+            name="stock_reserve_total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="produit",
+            name="stock_total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produit",
+            index=models.Index(
+                fields=["stock_disponible"], name="users_produ_stock_d_e2e405_idx"
+            ),
+        ),
+        migrations.RunPython(calculer_totaux_stock, migrations.RunPython.noop),
+    ]
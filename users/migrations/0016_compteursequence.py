@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0015_produit_stock_disponible_produit_stock_reserve_total_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompteurSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nom", models.CharField(max_length=50, unique=True)),
+                ("valeur", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
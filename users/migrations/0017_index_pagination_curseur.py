@@ -0,0 +1,46 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0016_compteursequence"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="mouvementstock",
+            name="users_mouve_created_d9cc04_idx",
+        ),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_audit_created_790d0b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_clien_created_3e92bf_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mouvementstock",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_mouve_created_309e25_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockentrepot",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_stock_created_620d23_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vente",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_vente_created_006880_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0017_index_pagination_curseur"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="produit",
+            name="image_webp",
+            field=models.ImageField(
+                blank=True, editable=False, null=True, upload_to="produits/webp/"
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0018_produit_image_webp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VenteJournaliere",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "type_vente",
+                    models.CharField(
+                        choices=[("gros", "Gros"), ("detail", "Détail")], max_length=10
+                    ),
+                ),
+                (
+                    "type_reduction",
+                    models.CharField(
+                        choices=[
+                            ("pourcentage", "Pourcentage"),
+                            ("montant", "Montant fixe"),
+                            ("aucune", "Aucune réduction"),
+                        ],
+                        default="aucune",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "nombre_ventes",
+                    models.DecimalField(decimal_places=6, default=0, max_digits=14),
+                ),
+                (
+                    "quantite",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "montant_brut",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "montant_reduction",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "chiffre_affaires",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "entrepot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="users.entrepot",
+                    ),
+                ),
+                (
+                    "produit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="users.produit",
+                    ),
+                ),
+                (
+                    "vendeur",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date"], name="users_vente_date_76e5cf_idx"),
+                    models.Index(
+                        fields=["vendeur", "date"],
+                        name="users_vente_vendeur_95c20b_idx",
+                    ),
+                ],
+                "unique_together": {
+                    (
+                        "date",
+                        "vendeur",
+                        "entrepot",
+                        "produit",
+                        "type_vente",
+                        "type_reduction",
+                    )
+                },
+            },
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+TAILLE_LOT = 10000
+
+
+def renseigner_colonnes(apps, schema_editor):
+    """Extraire entrepot, produit, vente et montant des entrées existantes"""
+    AuditLog = apps.get_model("users", "AuditLog")
+    MouvementStock = apps.get_model("users", "MouvementStock")
+    StockEntrepot = apps.get_model("users", "StockEntrepot")
+
+    def champ_de(modele, champ):
+        return Subquery(
+            modele.objects.filter(pk=OuterRef("objet_id")).values(champ)[:1]
+        )
+
+    def cle(nom, output_field):
+        return Cast(KeyTextTransform(nom, "details"), output_field)
+
+    mises_a_jour = {
+        "Vente": {
+            "vente_id": F("objet_id"),
+            "montant": cle(
+                "montant_total", models.DecimalField(max_digits=12, decimal_places=2)
+            ),
+        },
+        "Produit": {"produit_id": F("objet_id")},
+        "MouvementStock": {
+            "produit_id": champ_de(MouvementStock, "produit_id"),
+            "entrepot_id": champ_de(MouvementStock, "entrepot_id"),
+            "vente_id": champ_de(MouvementStock, "vente_id"),
+        },
+        "StockEntrepot": {
+            "produit_id": champ_de(StockEntrepot, "produit_id"),
+            "entrepot_id": champ_de(StockEntrepot, "entrepot_id"),
+            "vente_id": cle("vente_id", models.IntegerField()),
+        },
+    }
+
+    # Par tranches d'identifiants : des UPDATE bornés plutôt qu'un balayage
+    # unique de tout le journal
+    dernier = AuditLog.objects.order_by("-pk").values_list("pk", flat=True).first()
+    for debut in range(0, (dernier or 0) + 1, TAILLE_LOT):
+        tranche = AuditLog.objects.filter(
+            pk__gte=debut, pk__lt=debut + TAILLE_LOT, objet_id__isnull=False
+        )
+        for modele, valeurs in mises_a_jour.items():
+            tranche.filter(modele=modele).update(**valeurs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0020_audit_horodatage_evenement"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auditlog",
+            name="entrepot",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="users.entrepot",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="montant",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=12, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="produit",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="users.produit",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="vente",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="users.vente",
+            ),
+        ),
+        migrations.RunPython(renseigner_colonnes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["entrepot", "created_at"], name="users_audit_entrepo_7ae59f_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["produit", "created_at"], name="users_audit_produit_d6bce0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["vente", "created_at"], name="users_audit_vente_i_e0f292_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["montant"], name="users_audit_montant_4002d1_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:18
+
+from django.db import migrations
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+# Valeurs figées à cette migration (voir users/recherche.py pour l'état courant)
+MODELES = {"produit": "Produit", "client": "Client", "auditlog": "AuditLog"}
+CHAMPS_RECHERCHE = {
+    "produit": ("nom", "code"),
+    "client": ("nom", "telephone"),
+    "auditlog": ("modele", "action", "details"),
+}
+TAILLE_LOT = 5000
+
+
+def _texte(valeur):
+    if valeur is None:
+        return ""
+    if isinstance(valeur, dict):
+        return " ".join(_texte(v) for v in valeur.values())
+    if isinstance(valeur, (list, tuple)):
+        return " ".join(_texte(v) for v in valeur)
+    return str(valeur)
+
+
+def _inserer(schema_editor, table, champs, lignes):
+    if not lignes:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table}(rowid, {', '.join(champs)}) "
+            f"VALUES ({', '.join(['%s'] * (len(champs) + 1))})",
+            lignes,
+        )
+
+
+def _creer_table_sqlite(schema_editor, modele, nom):
+    table = f"recherche_{nom}"
+    champs = CHAMPS_RECHERCHE[nom]
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {table} USING fts5("
+        f"{', '.join(champs)}, tokenize='unicode61 remove_diacritics 2', "
+        f"prefix='2 3')"
+    )
+    lot = []
+    lignes = modele.objects.order_by("pk").values_list("pk", *champs)
+    for ligne in lignes.iterator(chunk_size=TAILLE_LOT):
+        lot.append((ligne[0], *(_texte(v) for v in ligne[1:])))
+        if len(lot) >= TAILLE_LOT:
+            _inserer(schema_editor, table, champs, lot)
+            lot = []
+    _inserer(schema_editor, table, champs, lot)
+
+
+def _vecteur(nom):
+    from django.contrib.postgres.search import SearchVector
+
+    champs = [
+        Cast(champ, TextField()) if champ == "details" else champ
+        for champ in CHAMPS_RECHERCHE[nom]
+    ]
+    return SearchVector(*champs, config="simple")
+
+
+def creer_index_recherche(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for nom in CHAMPS_RECHERCHE:
+        modele = apps.get_model("users", MODELES[nom])
+        if vendor == "sqlite":
+            _creer_table_sqlite(schema_editor, modele, nom)
+        elif vendor == "postgresql":
+            from django.contrib.postgres.indexes import GinIndex
+
+            schema_editor.add_index(
+                modele, GinIndex(_vecteur(nom), name=f"recherche_{nom}_gin")
+            )
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for nom in CHAMPS_RECHERCHE:
+        if vendor == "sqlite":
+            schema_editor.execute(f"DROP TABLE IF EXISTS recherche_{nom}")
+        elif vendor == "postgresql":
+            schema_editor.execute(f"DROP INDEX IF EXISTS recherche_{nom}_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0021_audit_colonnes_structurees"),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
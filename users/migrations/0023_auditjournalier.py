@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0022_index_recherche"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditJournalier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("action", models.CharField(max_length=50)),
+                ("modele", models.CharField(max_length=100)),
+                ("nombre", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-date", "action", "modele"],
+                "unique_together": {("date", "action", "modele")},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:17
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def vider_faits(apps, schema_editor):
+    # Les doublons de la clé sans vendeur empêchent la pose de la contrainte ;
+    # la table est reconstruite depuis les ventes par 0026
+    apps.get_model("users", "VenteJournaliere").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0023_auditjournalier"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="ventejournaliere",
+            unique_together=set(),
+        ),
+        migrations.RunPython(vider_faits, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="ventejournaliere",
+            constraint=models.UniqueConstraint(
+                models.F("date"),
+                django.db.models.functions.comparison.Coalesce(
+                    "vendeur", models.Value(0), output_field=models.BigIntegerField()
+                ),
+                models.F("entrepot"),
+                models.F("produit"),
+                models.F("type_vente"),
+                models.F("type_reduction"),
+                name="vente_journaliere_cle",
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:30
+
+from django.db import migrations
+from django.db.models import Func, JSONField, TextField, Value
+from django.db.models.functions import Cast
+
+
+def _vecteur(valeurs_seules):
+    # Expressions figées de l'index GIN du journal d'audit : avant (tout
+    # `details` converti en texte) et après (valeurs du JSON seulement,
+    # comme users/recherche.py)
+    from django.contrib.postgres.search import SearchConfig, SearchVector, SearchVectorField
+
+    if not valeurs_seules:
+        return SearchVector("modele", "action", Cast("details", TextField()), config="simple")
+    valeurs = Func(
+        SearchConfig("simple"),
+        "details",
+        Cast(Value('["string", "numeric"]'), JSONField()),
+        function="jsonb_to_tsvector",
+        output_field=SearchVectorField(),
+    )
+    return Func(
+        SearchVector("modele", "action", config="simple"),
+        valeurs,
+        template="(%(expressions)s)",
+        arg_joiner=" || ",
+        output_field=SearchVectorField(),
+    )
+
+
+def _recreer_index_audit(apps, schema_editor, valeurs_seules):
+    # SQLite : la table FTS5 indexait déjà les seules valeurs de `details`
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from django.contrib.postgres.indexes import GinIndex
+
+    AuditLog = apps.get_model("users", "AuditLog")
+    schema_editor.execute("DROP INDEX IF EXISTS recherche_auditlog_gin")
+    schema_editor.add_index(
+        AuditLog, GinIndex(_vecteur(valeurs_seules), name="recherche_auditlog_gin")
+    )
+
+
+def indexer_valeurs(apps, schema_editor):
+    _recreer_index_audit(apps, schema_editor, valeurs_seules=True)
+
+
+def indexer_texte(apps, schema_editor):
+    _recreer_index_audit(apps, schema_editor, valeurs_seules=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0024_ventejournaliere_cle_sans_vendeur"),
+    ]
+
+    operations = [
+        migrations.RunPython(indexer_valeurs, indexer_texte),
+    ]
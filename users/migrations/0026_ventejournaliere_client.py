@@ -0,0 +1,135 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:28
+
+from decimal import Decimal
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Prefetch
+from django.utils import timezone
+
+TAILLE_PAQUET = 2000
+MESURES = (
+    "nombre_ventes", "quantite", "montant_brut", "montant_reduction", "chiffre_affaires"
+)
+DIMENSIONS = (
+    "date", "vendeur_id", "entrepot_id", "produit_id", "type_vente", "type_reduction",
+    "client_id",
+)
+
+
+def _decimal(valeur, places="0.01"):
+    return Decimal(str(valeur or 0)).quantize(Decimal(places))
+
+
+def _contributions(vente, lignes):
+    # Répartition de VenteJournaliere.contributions, figée à cette migration
+    montants = [_decimal(ligne.montant_total) for ligne in lignes]
+    total_brut = sum(montants)
+    if total_brut > 0:
+        parts = [montant / total_brut for montant in montants]
+    else:
+        parts = [Decimal(1) / len(lignes)] * len(lignes)
+
+    a_repartir = {
+        "nombre_ventes": (Decimal(1), "0.000001"),
+        "montant_reduction": (_decimal(vente.montant_reduction), "0.01"),
+        "chiffre_affaires": (_decimal(vente.montant_total), "0.01"),
+    }
+    repartis = {}
+    for mesure, (total, places) in a_repartir.items():
+        valeurs = [(total * part).quantize(Decimal(places)) for part in parts]
+        valeurs[-1] += total - sum(valeurs)
+        repartis[mesure] = valeurs
+
+    date = timezone.localdate(vente.created_at)
+    for index, ligne in enumerate(lignes):
+        cle = (date, vente.created_by_id, ligne.entrepot_id, ligne.produit_id,
+               vente.type_vente, vente.type_reduction, vente.client_id)
+        mesures = {
+            "quantite": _decimal(ligne.quantite),
+            "montant_brut": montants[index],
+        }
+        for mesure in a_repartir:
+            mesures[mesure] = repartis[mesure][index]
+        yield cle, mesures
+
+
+def reconstruire_faits(apps, schema_editor):
+    """Reconstruire la table de faits depuis les ventes confirmées, par client"""
+    Vente = apps.get_model("users", "Vente")
+    LigneDeVente = apps.get_model("users", "LigneDeVente")
+    VenteJournaliere = apps.get_model("users", "VenteJournaliere")
+
+    ventes = (
+        Vente.objects.filter(statut="confirmee")
+        .order_by("id")
+        .prefetch_related(
+            Prefetch(
+                "lignes_vente",
+                queryset=LigneDeVente.objects.order_by("id").only(
+                    "vente_id", "produit_id", "entrepot_id", "quantite", "montant_total"
+                ),
+            )
+        )
+    )
+    faits = {}
+    for vente in ventes.iterator(chunk_size=TAILLE_PAQUET):
+        lignes = list(vente.lignes_vente.all())
+        if not lignes:
+            continue
+        for cle, mesures in _contributions(vente, lignes):
+            cumul = faits.setdefault(cle, dict.fromkeys(MESURES, Decimal(0)))
+            for mesure, valeur in mesures.items():
+                cumul[mesure] += valeur
+
+    VenteJournaliere.objects.all().delete()
+    VenteJournaliere.objects.bulk_create(
+        (
+            VenteJournaliere(**dict(zip(DIMENSIONS, cle)), **mesures)
+            for cle, mesures in faits.items()
+        ),
+        batch_size=TAILLE_PAQUET,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0025_index_recherche_audit_valeurs"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="ventejournaliere",
+            name="vente_journaliere_cle",
+        ),
+        migrations.AddField(
+            model_name="ventejournaliere",
+            name="client",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="users.client",
+            ),
+        ),
+        migrations.RunPython(reconstruire_faits, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="ventejournaliere",
+            constraint=models.UniqueConstraint(
+                models.F("date"),
+                django.db.models.functions.comparison.Coalesce(
+                    "vendeur", models.Value(0), output_field=models.BigIntegerField()
+                ),
+                models.F("entrepot"),
+                models.F("produit"),
+                models.F("type_vente"),
+                models.F("type_reduction"),
+                django.db.models.functions.comparison.Coalesce(
+                    "client", models.Value(0), output_field=models.BigIntegerField()
+                ),
+                name="vente_journaliere_cle",
+            ),
+        ),
+    ]
@@ -3,15 +3,23 @@ from django.db.models.signals import post_save, post_delete
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Value, DecimalField, OuterRef, Subquery, Count, ExpressionWrapper, Case, When
+from django.db.models.functions import Coalesce
 from django_rest_passwordreset.signals import reset_password_token_created
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.core.mail import EmailMultiAlternatives
 from django.utils.html import strip_tags
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Q
+from django.db import transaction, connections, router
+from django.db.models import Q, Prefetch, prefetch_related_objects
+from decimal import Decimal
+
+from .cache import invalider_cache
+from .audit import journaliser, journaliser_entrees
+from .recherche import indexer, desindexer
+from . import metriques
+from .evenements import evenement, trace_stock, STOCK_TRACE
 
 
 # FONCTION UTILITAIRE POUR CONVERTIR EN FLOAT
@@ -66,6 +74,15 @@ class CustomUser(AbstractUser):
         return f"{self.email} ({self.role})"
 
 
+class CompteurSequence(models.Model):
+    """Compteur atomique des numéros de documents (voir users/sequences.py)"""
+    nom = models.CharField(max_length=50, unique=True)
+    valeur = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nom}: {self.valeur}"
+
+
 class Categorie(models.Model):
     nom = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -97,6 +114,48 @@ class Fournisseur(models.Model):
         return self.nom
 
 
+class ProduitQuerySet(models.QuerySet):
+    def en_rupture(self):
+        """Produits sans stock disponible (filtré en SQL)"""
+        return self.filter(stock_disponible__lte=0)
+
+    def stock_faible(self):
+        """Produits dont le stock disponible est sous le seuil stock_alerte"""
+        return self.filter(
+            stock_disponible__gt=0,
+            stock_disponible__lte=F('stock_alerte')
+        )
+
+    def synchroniser_stock(self):
+        """
+        Recalculer les totaux dénormalisés (stock_total, stock_reserve_total,
+        stock_disponible) à partir de StockEntrepot, en un seul UPDATE
+        """
+        zero = Value(Decimal('0'), output_field=DecimalField(
+            max_digits=12, decimal_places=2))
+
+        def somme(champ):
+            return Coalesce(Subquery(
+                StockEntrepot.objects.filter(produit=OuterRef('pk'))
+                .order_by().values('produit')
+                .annotate(total=Sum(champ)).values('total')[:1]
+            ), zero)
+
+        return self.update(
+            stock_total=somme('quantite'),
+            stock_reserve_total=somme('quantite_reservee'),
+            stock_disponible=somme('quantite') - somme('quantite_reservee'),
+        )
+
+
+def synchroniser_stock_produits(produit_ids):
+    """Mettre à jour les totaux de stock des produits touchés par une écriture"""
+    ids = {produit_ids} if isinstance(produit_ids, int) else set(produit_ids)
+    if ids:
+        Produit.objects.filter(pk__in=ids).synchroniser_stock()
+        invalider_cache('stock', 'produit')
+
+
 class Produit(models.Model):
     code = models.CharField(max_length=50, unique=True)
     nom = models.CharField(max_length=200)
@@ -130,42 +189,81 @@ class Produit(models.Model):
         blank=True,
         editable=False
     )
+    image_webp = models.ImageField(
+        upload_to='produits/webp/',
+        null=True,
+        blank=True,
+        editable=False
+    )
     created_by = models.ForeignKey(
         CustomUser, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Totaux dénormalisés, maintenus à chaque écriture sur StockEntrepot
+    # (voir synchroniser_stock_produits)
+    stock_total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False)
+    stock_reserve_total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False)
+    stock_disponible = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False)
+
+    objects = ProduitQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['stock_disponible']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Image en base, pour détecter son remplacement (champ non différé)
+        if 'image' in instance.__dict__:
+            instance._image_initiale = instance.__dict__['image'] or ''
+        return instance
+
+    def _image_en_base(self):
+        if self._state.adding:
+            return ''
+        if hasattr(self, '_image_initiale'):
+            return self._image_initiale
+        return Produit.objects.filter(pk=self.pk).values_list('image', flat=True).first() or ''
+
+    def save(self, *args, **kwargs):
+        # Fichier uploadé pas encore écrit dans le stockage, ou déjà écrit
+        # par `image.save(nom, contenu)` sous un nom différent de celui en base
+        nouvelle_image = bool(self.image) and (
+            not self.image._committed or self.image.name != self._image_en_base())
+        if not self.image:
+            self.thumbnail = None
+            self.image_webp = None
+        super().save(*args, **kwargs)
+        self._image_initiale = self.image.name or ''
+
+        if nouvelle_image:
+            # Redimensionnement, miniature et WebP hors de la requête
+            from .images import planifier_traitement_image
+            produit_id = self.pk
+            transaction.on_commit(
+                lambda: planifier_traitement_image(produit_id), robust=True)
 
     def stock_actuel(self):
         """Stock total dans tous les entrepôts"""
-        total = StockEntrepot.objects.filter(produit=self).aggregate(
-            total=Sum('quantite')
-        )['total'] or 0
-        # CORRECTION: Convertir en float
-        return to_float(total)
+        return to_float(self.stock_total)
 
     def stock_reserve(self):
         """Stock réservé dans tous les entrepôts"""
-        total = StockEntrepot.objects.filter(produit=self).aggregate(
-            total=Sum('quantite_reservee')
-        )['total'] or 0
-        # CORRECTION: Convertir en float
-        return to_float(total)
-
-    @property
-    def stock_disponible(self):
-        """Stock disponible pour vente"""
-        # CORRECTION: Utiliser to_float pour les deux
-        return to_float(self.stock_actuel()) - to_float(self.stock_reserve())
+        return to_float(self.stock_reserve_total)
 
     @property
     def en_rupture(self):
-        return self.stock_disponible <= 0
+        return to_float(self.stock_disponible) <= 0
 
     @property
     def stock_faible(self):
-        return 0 < self.stock_disponible <= to_float(self.stock_alerte)
+        return 0 < to_float(self.stock_disponible) <= to_float(self.stock_alerte)
 
     def __str__(self):
         return f"{self.nom} ({self.code})"
@@ -191,26 +289,34 @@ class Client(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Pagination par curseur (users/pagination.py)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.numero_client:
-            last_client = Client.objects.order_by('-id').first()
-            if last_client and last_client.numero_client and last_client.numero_client.startswith('CLT'):
-                try:
-                    last_number_str = last_client.numero_client[3:]
-                    last_number = int(last_number_str)
-                    new_number = last_number + 1
-                except (ValueError, IndexError):
-                    new_number = 100
-            else:
-                new_number = 100
-            self.numero_client = f'CLT{new_number:08d}'
+            from .sequences import prochain_numero_client
+            self.numero_client = prochain_numero_client()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.nom} ({self.numero_client})"
 
 
+class EntrepotQuerySet(models.QuerySet):
+    def avec_valeur_stock(self):
+        """Annoter la valeur du stock et le nombre de produits par entrepôt"""
+        valeur = ExpressionWrapper(
+            F('stockentrepot__quantite') * F('stockentrepot__produit__prix_achat'),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+        return self.annotate(
+            valeur_stock_agregee=Sum(valeur),
+            produits_count_agrege=Count('stockentrepot'),
+        )
+
+
 class Entrepot(models.Model):
     nom = models.CharField(max_length=200)
     adresse = models.TextField()
@@ -224,22 +330,28 @@ class Entrepot(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     actif = models.BooleanField(default=True)
 
+    objects = EntrepotQuerySet.as_manager()
+
     class Meta:
         ordering = ['nom']
         verbose_name_plural = 'Entrepôts'
 
     def stock_total_valeur(self):
         """Calculer la valeur totale du stock dans l'entrepôt"""
-        stocks = StockEntrepot.objects.filter(entrepot=self)
-        total = 0
-        for stock in stocks:
-            # CORRECTION: Convertir les deux en float
-            quantite = to_float(stock.quantite)
-            prix_achat = to_float(stock.produit.prix_achat)
-            total += quantite * prix_achat
-        return total
+        # Valeur déjà calculée par EntrepotQuerySet.avec_valeur_stock()
+        if hasattr(self, 'valeur_stock_agregee'):
+            return to_float(self.valeur_stock_agregee)
+        total = StockEntrepot.objects.filter(entrepot=self).aggregate(
+            total=Sum(ExpressionWrapper(
+                F('quantite') * F('produit__prix_achat'),
+                output_field=DecimalField(max_digits=20, decimal_places=2)
+            ))
+        )['total']
+        return to_float(total)
 
     def produits_count(self):
+        if hasattr(self, 'produits_count_agrege'):
+            return self.produits_count_agrege
         return StockEntrepot.objects.filter(entrepot=self).count()
 
     def __str__(self):
@@ -262,6 +374,9 @@ class StockEntrepot(models.Model):
     class Meta:
         unique_together = ['entrepot', 'produit']
         ordering = ['produit__nom']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     @property
     def quantite_disponible(self):
@@ -295,6 +410,7 @@ class StockEntrepot(models.Model):
                 quantite_reservee=F('quantite_reservee') + quantite_float,
                 updated_at=timezone.now()
             )
+            synchroniser_stock_produits(self.produit_id)
             self.refresh_from_db()
 
     def liberer_stock(self, quantite):
@@ -308,6 +424,7 @@ class StockEntrepot(models.Model):
                 quantite_reservee=F('quantite_reservee') - quantite_float,
                 updated_at=timezone.now()
             )
+            synchroniser_stock_produits(self.produit_id)
             self.refresh_from_db()
 
     def prelever_stock(self, quantite):
@@ -327,8 +444,135 @@ class StockEntrepot(models.Model):
                 quantite_reservee=F('quantite_reservee') - quantite_float,
                 updated_at=timezone.now()
             )
+            synchroniser_stock_produits(self.produit_id)
             self.refresh_from_db()
 
+    @classmethod
+    def _verrouiller_pour_lignes(cls, lignes):
+        """
+        Regrouper les quantités des lignes par (produit, entrepôt) et
+        verrouiller les stocks concernés en une requête, toujours dans
+        l'ordre des id pour éviter les interblocages entre transactions
+        """
+        quantites = {}
+        for ligne in lignes:
+            cle = (ligne.produit_id, ligne.entrepot_id)
+            quantites[cle] = quantites.get(cle, 0) + Decimal(str(ligne.quantite))
+
+        filtre = Q()
+        for produit_id, entrepot_id in quantites:
+            filtre |= Q(produit_id=produit_id, entrepot_id=entrepot_id)
+        stocks = {
+            (stock.produit_id, stock.entrepot_id): stock
+            for stock in cls.objects.select_for_update().filter(filtre).order_by('id')
+        }
+        return quantites, stocks
+
+    @classmethod
+    def reserver_lignes(cls, lignes):
+        """
+        Réserver le stock de toutes les lignes d'une vente : une lecture
+        verrouillée puis un seul UPDATE, quel que soit le nombre de lignes
+        """
+        lignes = list(lignes)
+        if not lignes:
+            return []
+        noms = {
+            (ligne.produit_id, ligne.entrepot_id): (ligne.produit.nom, ligne.entrepot.nom)
+            for ligne in lignes
+        }
+
+        with transaction.atomic():
+            quantites, stocks = cls._verrouiller_pour_lignes(lignes)
+
+            stocks_reserves = []
+            increments = []
+            for cle, quantite in quantites.items():
+                produit_nom, entrepot_nom = noms[cle]
+                stock = stocks.get(cle)
+                if stock is None:
+                    metriques.reservations_stock.inc(resultat='stock_absent')
+                    raise ValueError(
+                        f"Stock non trouvé pour {produit_nom} dans {entrepot_nom}"
+                    )
+                disponible = stock.quantite_disponible
+                if to_float(quantite) > disponible:
+                    metriques.reservations_stock.inc(resultat='stock_insuffisant')
+                    raise ValueError(
+                        f"Stock insuffisant pour {produit_nom} dans {entrepot_nom}. Disponible: {disponible:.2f}"
+                    )
+                increments.append(When(id=stock.id, then=Value(quantite)))
+                stocks_reserves.append({
+                    'produit': produit_nom,
+                    'entrepot': entrepot_nom,
+                    'quantite': to_float(quantite),
+                    'ancienne_reserve': to_float(stock.quantite_reservee),
+                    'nouvelle_reserve': to_float(stock.quantite_reservee + quantite),
+                    'stock_total': to_float(stock.quantite)
+                })
+
+            ids = [stock.id for stock in stocks.values()]
+            mis_a_jour = cls.objects.filter(id__in=ids).update(
+                quantite_reservee=F('quantite_reservee') + Case(
+                    *increments,
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                ),
+                updated_at=timezone.now()
+            )
+            if mis_a_jour != len(ids):
+                metriques.reservations_stock.inc(resultat='incomplete')
+                raise ValueError("Réservation du stock incomplète")
+
+            synchroniser_stock_produits(cle[0] for cle in quantites)
+
+        metriques.reservations_stock.inc(resultat='succes')
+        return stocks_reserves
+
+    @classmethod
+    def prelever_lignes(cls, lignes):
+        """
+        Prélever le stock réservé de toutes les lignes d'une vente confirmée :
+        une lecture verrouillée puis un seul UPDATE des quantités
+        """
+        lignes = list(lignes)
+        if not lignes:
+            return
+        noms = {
+            (ligne.produit_id, ligne.entrepot_id): (ligne.produit.nom, ligne.entrepot.nom)
+            for ligne in lignes
+        }
+
+        with transaction.atomic():
+            quantites, stocks = cls._verrouiller_pour_lignes(lignes)
+
+            decrements = []
+            for cle, quantite in quantites.items():
+                stock = stocks.get(cle)
+                if stock is None:
+                    raise ValueError(
+                        f"Stock non trouvé pour {noms[cle][0]} dans {noms[cle][1]}"
+                    )
+                if quantite > stock.quantite_reservee:
+                    raise ValueError(
+                        f"Quantité à prélever ({to_float(quantite):.2f}) supérieure au stock réservé ({to_float(stock.quantite_reservee):.2f})"
+                    )
+                decrements.append(When(id=stock.id, then=Value(quantite)))
+
+            decrement = Case(
+                *decrements,
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+            ids = [stock.id for stock in stocks.values()]
+            mis_a_jour = cls.objects.filter(id__in=ids).update(
+                quantite=F('quantite') - decrement,
+                quantite_reservee=F('quantite_reservee') - decrement,
+                updated_at=timezone.now()
+            )
+            if mis_a_jour != len(ids):
+                raise ValueError("Prélèvement du stock incomplet")
+
+            synchroniser_stock_produits(cle[0] for cle in quantites)
+
     def __str__(self):
         return f"{self.produit.nom} - {self.entrepot.nom}: {self.quantite_disponible:.2f} disponible(s)"
 
@@ -390,7 +634,7 @@ class MouvementStock(models.Model):
         indexes = [
             models.Index(fields=['produit', 'entrepot']),
             models.Index(fields=['type_mouvement', 'source']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
             models.Index(fields=['vente']),
         ]
 
@@ -544,8 +788,22 @@ class Vente(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut en base, pour détecter une sortie de l'état confirmé
+        instance._statut_initial = instance.__dict__.get('statut')
+        return instance
 
     def save(self, *args, **kwargs):
+        quitte_confirmee = (
+            getattr(self, '_statut_initial', None) == 'confirmee'
+            and self.statut != 'confirmee'
+        )
         if self.pk:
             self._calculer_totaux()
         # CORRECTION: Utiliser to_float
@@ -559,6 +817,10 @@ class Vente(models.Model):
             self.date_paiement = timezone.now()
         super().save(*args, **kwargs)
 
+        if quitte_confirmee:
+            VenteJournaliere.retirer_vente(self)
+        self._statut_initial = self.statut
+
     def _calculer_totaux(self):
         """Calculer tous les totaux de la vente"""
         # CORRECTION: Utiliser to_float
@@ -621,6 +883,14 @@ class Vente(models.Model):
         if self.statut != 'brouillon':
             raise ValueError("Seules les ventes brouillon peuvent être confirmées")
 
+        # Lignes chargées une fois (réutilisées par _calculer_totaux)
+        prefetch_related_objects([self], Prefetch(
+            'lignes_vente',
+            queryset=LigneDeVente.objects.select_related('produit', 'entrepot')
+        ))
+        lignes = [ligne for ligne in self.lignes_vente.all()
+                  if not ligne.stock_preleve]
+
         with transaction.atomic():
             self._calculer_totaux()
             self.statut = 'confirmee'
@@ -628,33 +898,66 @@ class Vente(models.Model):
             self.confirmed_by = self.created_by
             self.save()
 
-            for ligne in self.lignes_vente.all():
-                ligne.prelever_stock_entrepot()
-                MouvementStock.objects.create(
+            StockEntrepot.prelever_lignes(lignes)
+            LigneDeVente.objects.filter(
+                id__in=[ligne.id for ligne in lignes]
+            ).update(stock_preleve=True)
+            for ligne in lignes:
+                ligne.stock_preleve = True
+
+            # bulk_create n'émet pas post_save : les entrées d'audit de
+            # log_mouvement_stock sont créées ici, dans le même lot
+            motif = f"Vente {self.numero_vente}" + (f" - Client: {self.client.nom}" if self.client else "")
+            mouvements = MouvementStock.objects.bulk_create([
+                MouvementStock(
                     produit=ligne.produit,
                     type_mouvement='sortie',
                     quantite=ligne.quantite,
-                    prix_unitaire=ligne.prix_unitaire,
-                    motif=f"Vente {self.numero_vente}" + (f" - Client: {self.client.nom}" if self.client else ""),
+                    prix_unitaire=ligne.prix_unitaire or ligne.produit.prix_vente,
+                    motif=motif,
                     entrepot=ligne.entrepot,
                     created_by=self.created_by,
                     source='vente',
                     vente=self
                 )
+                for ligne in lignes
+            ])
+
+            audits = [
+                AuditLog(
+                    user=mouvement.created_by,
+                    action='mouvement_stock',
+                    modele='MouvementStock',
+                    objet_id=mouvement.id,
+                    details=details_audit_mouvement(mouvement),
+                    **colonnes_audit_mouvement(mouvement)
+                )
+                for mouvement in mouvements
+            ]
+            audits.append(AuditLog(
+                user=self.created_by,
+                action='confirmation',
+                modele='Vente',
+                objet_id=self.id,
+                vente_id=self.id,
+                montant=self.montant_total,
+                details={
+                    'numero_vente': self.numero_vente,
+                    'client': self.client.nom if self.client else 'Aucun',
+                    'montant_total': str(self.montant_total),
+                    'montant_reduction': str(self.montant_reduction),
+                    'mouvements_crees': len(mouvements)
+                }
+            ))
+            journaliser_entrees(audits)
 
-        AuditLog.objects.create(
-            user=self.created_by,
-            action='confirmation',
-            modele='Vente',
-            objet_id=self.id,
-            details={
-                'numero_vente': self.numero_vente,
-                'client': self.client.nom if self.client else 'Aucun',
-                'montant_total': str(self.montant_total),
-                'montant_reduction': str(self.montant_reduction),
-                'mouvements_crees': self.lignes_vente.count()
-            }
-        )
+            VenteJournaliere.enregistrer_vente(self, self.lignes_vente.all())
+            facture = Facture.creer_pour_vente(self)
+
+        # Rendu du PDF hors de la requête, une fois la confirmation validée
+        from .factures import planifier_pdf_facture
+        transaction.on_commit(
+            lambda: planifier_pdf_facture(facture.pk), robust=True)
 
     def __str__(self):
         reduction_str = ""
@@ -700,6 +1003,23 @@ class Facture(models.Model):
     def __str__(self):
         return f"Facture {self.numero_facture} - {self.vente.numero_vente}"
 
+    @classmethod
+    def creer_pour_vente(cls, vente):
+        """Créer la facture d'une vente confirmée, ou retourner l'existante"""
+        from .sequences import prochain_numero_facture
+
+        # Numéro alloué seulement à la création (valeur par défaut appelable) ;
+        # si une requête concurrente crée la facture entre-temps,
+        # get_or_create intercepte l'IntegrityError sur `vente` et relit la ligne
+        facture, _ = cls.objects.get_or_create(vente=vente, defaults={
+            'numero_facture': prochain_numero_facture,
+            'montant_ht': vente.montant_total,
+            'tva': 0,
+            'montant_ttc': vente.montant_total,
+        })
+        facture.vente = vente
+        return facture
+
 
 class LigneDeVente(models.Model):
     vente = models.ForeignKey(
@@ -740,7 +1060,7 @@ class LigneDeVente(models.Model):
     def prelever_stock_entrepot(self):
         """Prélever le stock de l'entrepôt (confirmation de vente)"""
         if self.stock_preleve:
-            print(f"⚠️ Stock déjà prélevé pour cette ligne: {self.id}")
+            evenement('stock.prelevement.deja_preleve', 'WARNING', ligne_vente_id=self.id)
             return
 
         try:
@@ -760,14 +1080,21 @@ class LigneDeVente(models.Model):
                 stock_entrepot.quantite = F('quantite') - quantite_float
                 stock_entrepot.quantite_reservee = F('quantite_reservee') - quantite_float
                 stock_entrepot.save()
-                stock_entrepot.refresh_from_db()
 
                 self.stock_preleve = True
                 self.save()
 
-                print(f"✅ Stock prélevé: {self.produit.nom} - {quantite_float:.2f} unités")
-                print(f"   Stock restant: {to_float(stock_entrepot.quantite):.2f}")
-                print(f"   Stock réservé restant: {to_float(stock_entrepot.quantite_reservee):.2f}")
+                if STOCK_TRACE:
+                    stock_entrepot.refresh_from_db()
+                    trace_stock(
+                        'stock.prelevement',
+                        ligne_vente_id=self.id,
+                        produit_id=self.produit_id,
+                        entrepot_id=self.entrepot_id,
+                        quantite=quantite_float,
+                        stock_restant=to_float(stock_entrepot.quantite),
+                        reserve_restante=to_float(stock_entrepot.quantite_reservee),
+                    )
 
         except StockEntrepot.DoesNotExist:
             raise ValueError(
@@ -778,6 +1105,212 @@ class LigneDeVente(models.Model):
         return f"{self.produit.nom} x{to_float(self.quantite):.2f} ({self.entrepot.nom}) - {to_float(self.sous_total()):.2f}"
 
 
+def _decimal(valeur, places='0.01'):
+    return Decimal(str(valeur or 0)).quantize(Decimal(places))
+
+
+class VenteJournaliereQuerySet(models.QuerySet):
+    def pour_utilisateur(self, user):
+        """Faits visibles par l'utilisateur (les siens pour un vendeur)"""
+        if user.role == 'admin':
+            return self
+        return self.filter(vendeur=user)
+
+    def totaux(self):
+        """Nombre de ventes, chiffre d'affaires, quantité et réductions cumulés"""
+        totaux = self.aggregate(
+            nombre_ventes=Sum('nombre_ventes'),
+            chiffre_affaires=Sum('chiffre_affaires'),
+            quantite=Sum('quantite'),
+            montant_reduction=Sum('montant_reduction'),
+        )
+        return {
+            'nombre_ventes': round(to_float(totaux['nombre_ventes'])),
+            'chiffre_affaires': to_float(totaux['chiffre_affaires']),
+            'quantite': to_float(totaux['quantite']),
+            'montant_reduction': to_float(totaux['montant_reduction']),
+        }
+
+
+class VenteJournaliere(models.Model):
+    """
+    Table de faits des ventes confirmées, agrégées par jour, vendeur,
+    entrepôt, produit, type de vente et type de réduction.
+
+    Les montants d'une vente (réduction, total) sont répartis sur ses lignes
+    au prorata de leur montant : sommés sur n'importe quel découpage, ils
+    redonnent exactement les totaux des ventes. `nombre_ventes` suit la même
+    répartition (une vente vaut 1 au total).
+    Maintenue à la confirmation et à l'annulation (ou suppression) d'une
+    vente ; reconstruite par la commande reconstruire_ventes_journalieres.
+
+    Les ventes sans vendeur (ou sans client) forment une seule clé :
+    l'unicité porte sur COALESCE(vendeur_id, 0) et COALESCE(client_id, 0),
+    NULL étant distinct de NULL dans une contrainte d'unicité ordinaire.
+    """
+    date = models.DateField()
+    vendeur = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, related_name='+')
+    client = models.ForeignKey(
+        Client, on_delete=models.SET_NULL, null=True, related_name='+')
+    entrepot = models.ForeignKey(
+        Entrepot, on_delete=models.CASCADE, related_name='+')
+    produit = models.ForeignKey(
+        Produit, on_delete=models.CASCADE, related_name='+')
+    type_vente = models.CharField(max_length=10, choices=Vente.TYPE_VENTE)
+    type_reduction = models.CharField(
+        max_length=20, choices=Vente.TYPE_REDUCTION, default='aucune')
+
+    nombre_ventes = models.DecimalField(
+        max_digits=14, decimal_places=6, default=0)
+    quantite = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    montant_brut = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    montant_reduction = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    chiffre_affaires = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+
+    MESURES = ('nombre_ventes', 'quantite', 'montant_brut',
+               'montant_reduction', 'chiffre_affaires')
+    DIMENSIONS = ('date', 'vendeur_id', 'entrepot_id', 'produit_id',
+                  'type_vente', 'type_reduction', 'client_id')
+    # Dimensions facultatives, comparées via COALESCE(..., 0)
+    DIMENSIONS_FACULTATIVES = ('vendeur_id', 'client_id')
+
+    objects = VenteJournaliereQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                F('date'),
+                Coalesce('vendeur', Value(0), output_field=models.BigIntegerField()),
+                F('entrepot'), F('produit'), F('type_vente'), F('type_reduction'),
+                Coalesce('client', Value(0), output_field=models.BigIntegerField()),
+                name='vente_journaliere_cle',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['vendeur', 'date']),
+        ]
+
+    @classmethod
+    def contributions(cls, vente, lignes):
+        """
+        Mesures apportées par une vente, par clé de la table de faits
+        (dictionnaire {dimensions: {mesure: valeur}})
+        """
+        lignes = list(lignes)
+        if not lignes:
+            return {}
+
+        montants = [_decimal(ligne.montant_total) for ligne in lignes]
+        total_brut = sum(montants)
+        if total_brut > 0:
+            parts = [montant / total_brut for montant in montants]
+        else:
+            parts = [Decimal(1) / len(lignes)] * len(lignes)
+
+        a_repartir = {
+            'nombre_ventes': (Decimal(1), '0.000001'),
+            'montant_reduction': (_decimal(vente.montant_reduction), '0.01'),
+            'chiffre_affaires': (_decimal(vente.montant_total), '0.01'),
+        }
+        repartis = {mesure: [] for mesure in a_repartir}
+        for mesure, (total, places) in a_repartir.items():
+            valeurs = [(total * part).quantize(Decimal(places)) for part in parts]
+            # L'écart d'arrondi est porté par la dernière ligne
+            valeurs[-1] += total - sum(valeurs)
+            repartis[mesure] = valeurs
+
+        date = timezone.localdate(vente.created_at)
+        faits = {}
+        for index, ligne in enumerate(lignes):
+            cle = (date, vente.created_by_id, ligne.entrepot_id,
+                   ligne.produit_id, vente.type_vente, vente.type_reduction,
+                   vente.client_id)
+            mesures = faits.setdefault(cle, {mesure: Decimal(0) for mesure in cls.MESURES})
+            mesures['quantite'] += _decimal(ligne.quantite)
+            mesures['montant_brut'] += montants[index]
+            for mesure in a_repartir:
+                mesures[mesure] += repartis[mesure][index]
+        return faits
+
+    @classmethod
+    def cumuler(cls, faits, signe=1):
+        """Ajouter (signe=1) ou retrancher (signe=-1) des faits, en un upsert"""
+        if not faits:
+            return
+        connexion = connections[router.db_for_write(cls)]
+        ops = connexion.ops
+        table = ops.quote_name(cls._meta.db_table)
+        colonnes = cls.DIMENSIONS + cls.MESURES
+
+        lignes_sql = []
+        parametres = []
+        for cle, mesures in faits.items():
+            lignes_sql.append('(' + ', '.join(['%s'] * len(colonnes)) + ')')
+            parametres.append(ops.adapt_datefield_value(cle[0]))
+            parametres.extend(cle[1:])
+            parametres.extend(
+                ops.adapt_decimalfield_value(mesures[mesure] * signe)
+                for mesure in cls.MESURES
+            )
+
+        mises_a_jour = ', '.join(
+            f'{ops.quote_name(m)} = {table}.{ops.quote_name(m)} + EXCLUDED.{ops.quote_name(m)}'
+            for m in cls.MESURES
+        )
+        # Cible ON CONFLICT : les expressions de la contrainte vente_journaliere_cle
+        cible = ', '.join(
+            f'(COALESCE({ops.quote_name(c)}, 0))' if c in cls.DIMENSIONS_FACULTATIVES
+            else ops.quote_name(c)
+            for c in cls.DIMENSIONS
+        )
+        invalider_cache('vente')
+        with connexion.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(ops.quote_name(c) for c in colonnes)}) "
+                f"VALUES {', '.join(lignes_sql)} "
+                f"ON CONFLICT ({cible}) "
+                f"DO UPDATE SET {mises_a_jour}",
+                parametres
+            )
+
+    @classmethod
+    def detacher(cls, dimension, valeur):
+        """
+        Reporter les faits où `dimension` vaut `valeur` sur la clé où elle
+        est NULL, avant la suppression de l'objet référencé (son SET_NULL
+        créerait des doublons de cette clé)
+        """
+        faits = cls.objects.filter(**{dimension: valeur})
+        position = cls.DIMENSIONS.index(dimension)
+        cumuls = {}
+        for fait in faits:
+            cle = tuple(
+                None if index == position else getattr(fait, colonne)
+                for index, colonne in enumerate(cls.DIMENSIONS)
+            )
+            cumul = cumuls.setdefault(cle, {mesure: Decimal(0) for mesure in cls.MESURES})
+            for mesure in cls.MESURES:
+                cumul[mesure] += getattr(fait, mesure)
+        if cumuls:
+            cls.cumuler(cumuls)
+            faits.delete()
+
+    @classmethod
+    def enregistrer_vente(cls, vente, lignes=None):
+        """Ajouter une vente confirmée aux faits"""
+        cls.cumuler(cls.contributions(vente, lignes if lignes is not None else vente.lignes_vente.all()))
+
+    @classmethod
+    def retirer_vente(cls, vente, lignes=None):
+        """Retirer des faits une vente qui n'est plus confirmée"""
+        cls.cumuler(cls.contributions(vente, lignes if lignes is not None else vente.lignes_vente.all()), signe=-1)
+
+
 class TransfertEntrepot(models.Model):
     STATUT_TRANSFERT = (
         ('brouillon', 'Brouillon'),
@@ -878,28 +1411,97 @@ class AuditLog(models.Model):
     modele = models.CharField(max_length=100)
     objet_id = models.IntegerField(null=True, blank=True)
     details = models.JSONField(default=dict)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Clés de filtrage extraites de `details`. Pas de contrainte : l'entrée
+    # doit survivre à la suppression de l'objet référencé.
+    entrepot = models.ForeignKey(
+        Entrepot, on_delete=models.DO_NOTHING, db_constraint=False,
+        db_index=False, null=True, blank=True, related_name='+'
+    )
+    produit = models.ForeignKey(
+        Produit, on_delete=models.DO_NOTHING, db_constraint=False,
+        db_index=False, null=True, blank=True, related_name='+'
+    )
+    vente = models.ForeignKey(
+        Vente, on_delete=models.DO_NOTHING, db_constraint=False,
+        db_index=False, null=True, blank=True, related_name='+'
+    )
+    montant = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+    # Horodatage de l'événement, et non de l'écriture (groupée, différée)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['action', 'created_at']),
             models.Index(fields=['modele', 'objet_id']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['entrepot', 'created_at']),
+            models.Index(fields=['produit', 'created_at']),
+            models.Index(fields=['vente', 'created_at']),
+            models.Index(fields=['montant']),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.action} - {self.modele} #{self.objet_id}"
 
 
+class AuditJournalier(models.Model):
+    """
+    Nombre d'entrées d'audit archivées par jour, action et modèle : ce qui
+    reste en base des entrées déplacées vers les archives (archiver_audit)
+    """
+    date = models.DateField()
+    action = models.CharField(max_length=50)
+    modele = models.CharField(max_length=100)
+    nombre = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'action', 'modele']
+        unique_together = ['date', 'action', 'modele']
+
+    def __str__(self):
+        return f"{self.date} - {self.action} - {self.modele}: {self.nombre}"
+
+    @classmethod
+    def cumuler(cls, comptes):
+        """Ajouter des comptes {(date, action, modele): nombre}, en un upsert"""
+        if not comptes:
+            return
+        connexion = connections[router.db_for_write(cls)]
+        ops = connexion.ops
+        table = ops.quote_name(cls._meta.db_table)
+        colonnes = ('date', 'action', 'modele', 'nombre')
+
+        lignes_sql = []
+        parametres = []
+        for (jour, action, modele), nombre in comptes.items():
+            lignes_sql.append('(%s, %s, %s, %s)')
+            parametres.extend([ops.adapt_datefield_value(jour), action, modele, nombre])
+
+        with connexion.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(ops.quote_name(c) for c in colonnes)}) "
+                f"VALUES {', '.join(lignes_sql)} "
+                f"ON CONFLICT ({', '.join(ops.quote_name(c) for c in colonnes[:3])}) "
+                f"DO UPDATE SET {ops.quote_name('nombre')} = "
+                f"{table}.{ops.quote_name('nombre')} + EXCLUDED.{ops.quote_name('nombre')}",
+                parametres
+            )
+
+
 # Signaux pour la traçabilité
 @receiver(post_save, sender=Produit)
 def log_produit_save(sender, instance, created, **kwargs):
+    invalider_cache('produit')
     action = 'creation' if created else 'modification'
-    AuditLog.objects.create(
+    journaliser(
         user=instance.created_by,
         action=action,
         modele='Produit',
         objet_id=instance.id,
+        produit_id=instance.id,
         details={
             'nom': instance.nom,
             'code': instance.code,
@@ -911,12 +1513,15 @@ def log_produit_save(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Vente)
 def log_vente(sender, instance, created, **kwargs):
+    invalider_cache('vente')
     if created:
-        AuditLog.objects.create(
+        journaliser(
             user=instance.created_by,
             action='vente',
             modele='Vente',
             objet_id=instance.id,
+            vente_id=instance.id,
+            montant=instance.montant_total,
             details={
                 'numero_vente': instance.numero_vente,
                 'client': instance.client.nom if instance.client else 'Aucun',
@@ -926,28 +1531,43 @@ def log_vente(sender, instance, created, **kwargs):
         )
 
 
+def details_audit_mouvement(mouvement):
+    return {
+        'produit': mouvement.produit.nom,
+        'type': mouvement.type_mouvement,
+        'quantite': to_float(mouvement.quantite),  # CORRECTION
+        'source': mouvement.source,
+        'entrepot': mouvement.entrepot.nom if mouvement.entrepot else None,
+    }
+
+
+def colonnes_audit_mouvement(mouvement):
+    return {
+        'produit_id': mouvement.produit_id,
+        'entrepot_id': mouvement.entrepot_id,
+        'vente_id': mouvement.vente_id,
+    }
+
+
 @receiver(post_save, sender=MouvementStock)
 def log_mouvement_stock(sender, instance, created, **kwargs):
+    invalider_cache('stock')
     if created:
-        AuditLog.objects.create(
+        journaliser(
             user=instance.created_by,
             action='mouvement_stock',
             modele='MouvementStock',
             objet_id=instance.id,
-            details={
-                'produit': instance.produit.nom,
-                'type': instance.type_mouvement,
-                'quantite': to_float(instance.quantite),  # CORRECTION
-                'source': instance.source,
-                'entrepot': instance.entrepot.nom if instance.entrepot else None,
-            }
+            details=details_audit_mouvement(instance),
+            **colonnes_audit_mouvement(instance)
         )
 
 
 @receiver(post_save, sender=Client)
 def log_client_save(sender, instance, created, **kwargs):
+    invalider_cache('client')
     action = 'creation' if created else 'modification'
-    AuditLog.objects.create(
+    journaliser(
         user=instance.created_by,
         action=action,
         modele='Client',
@@ -960,6 +1580,58 @@ def log_client_save(sender, instance, created, **kwargs):
     )
 
 
+# Étiquettes de cache des modèles sans receiver dédié (et des suppressions)
+ETIQUETTES_CACHE = {
+    Categorie: ('categorie',),
+    Fournisseur: ('fournisseur',),
+    Entrepot: ('entrepot',),
+    Paiement: ('vente',),
+    Produit: ('produit',),
+    Client: ('client',),
+}
+
+
+@receiver(post_save, sender=Categorie)
+@receiver(post_save, sender=Fournisseur)
+@receiver(post_save, sender=Entrepot)
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Categorie)
+@receiver(post_delete, sender=Fournisseur)
+@receiver(post_delete, sender=Entrepot)
+@receiver(post_delete, sender=Paiement)
+@receiver(post_delete, sender=Produit)
+@receiver(post_delete, sender=Client)
+def invalider_cache_sur_ecriture(sender, instance, **kwargs):
+    invalider_cache(*ETIQUETTES_CACHE[sender])
+
+
+# Index de recherche plein texte (SQLite ; PostgreSQL indexe lui-même)
+@receiver(post_save, sender=Produit)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=AuditLog)
+def indexer_sur_ecriture(sender, instance, **kwargs):
+    indexer([instance])
+
+
+# Les entrées d'audit ne sont supprimées que par archiver_audit, qui les
+# désindexe par lots (un receiver ici interdirait la suppression rapide)
+@receiver(post_delete, sender=Produit)
+@receiver(post_delete, sender=Client)
+def desindexer_sur_suppression(sender, instance, **kwargs):
+    desindexer(sender, [instance.pk])
+
+
+@receiver(post_save, sender=StockEntrepot)
+@receiver(post_delete, sender=StockEntrepot)
+def synchroniser_totaux_sur_ecriture_stock(sender, instance, **kwargs):
+    """
+    Garder les totaux dénormalisés de Produit à jour pour toute écriture
+    passant par save()/delete() (les update() appellent
+    synchroniser_stock_produits directement)
+    """
+    synchroniser_stock_produits(instance.produit_id)
+
+
 @receiver(post_save, sender=MouvementStock)
 def update_stock_on_mouvement(sender, instance, created, **kwargs):
     """
@@ -971,11 +1643,13 @@ def update_stock_on_mouvement(sender, instance, created, **kwargs):
 
     try:
         if instance.type_mouvement == 'sortie' and instance.est_mouvement_vente:
-            print(f"📋 Mouvement de vente ignoré (stock géré par la vente): {instance}")
+            metriques.mouvements_stock.inc(type=instance.type_mouvement, resultat='ignore')
+            trace_stock('stock.mouvement.ignore', mouvement_id=instance.id, motif='vente')
             return
 
         if instance.type_mouvement == 'transfert':
-            print(f"📋 Mouvement de transfert ignoré (stock géré par le transfert): {instance}")
+            metriques.mouvements_stock.inc(type=instance.type_mouvement, resultat='ignore')
+            trace_stock('stock.mouvement.ignore', mouvement_id=instance.id, motif='transfert')
             return
 
         with transaction.atomic():
@@ -998,30 +1672,32 @@ def update_stock_on_mouvement(sender, instance, created, **kwargs):
                 nouvelle_quantite = quantite_mvt
                 action = "définition"
             else:
+                metriques.mouvements_stock.inc(type=instance.type_mouvement, resultat='ignore')
                 return
 
             stock.quantite = nouvelle_quantite
             stock.save()
+            metriques.mouvements_stock.inc(type=instance.type_mouvement, resultat='applique')
+
+            trace_stock(
+                'stock.mouvement',
+                mouvement_id=instance.id,
+                produit_id=instance.produit_id,
+                entrepot_id=instance.entrepot_id,
+                type_mouvement=instance.type_mouvement,
+                source=instance.source,
+                quantite=quantite_mvt,
+                action=action,
+                ancien_stock=ancien_stock,
+                nouveau_stock=to_float(stock.quantite),
+            )
 
-            print(f"""
-            🔄 MISE À JOUR DU STOCK
-            ----------------------------
-            Produit:     {instance.produit.nom}
-            Entrepôt:    {instance.entrepot.nom}
-            Type:        {instance.get_type_mouvement_display()}
-            Source:      {instance.get_source_display()}
-            Quantité:    {quantite_mvt:.2f} ({action})
-            Ancien:      {ancien_stock:.2f}
-            Nouveau:     {to_float(stock.quantite):.2f}
-            Variation:   {to_float(stock.quantite) - ancien_stock:+.2f}
-            ----------------------------
-            """)
-
-            AuditLog.objects.create(
+            journaliser(
                 user=instance.created_by,
                 action='mouvement_stock' if not instance.est_mouvement_vente else 'vente',
                 modele='StockEntrepot',
                 objet_id=stock.id,
+                **colonnes_audit_mouvement(instance),
                 details={
                     'mouvement_id': instance.id,
                     'produit_id': instance.produit.id,
@@ -1040,9 +1716,13 @@ def update_stock_on_mouvement(sender, instance, created, **kwargs):
             )
 
     except Exception as e:
-        print(f"❌ ERREUR critique dans update_stock_on_mouvement: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        metriques.mouvements_stock.inc(type=instance.type_mouvement, resultat='erreur')
+        evenement(
+            'stock.mouvement.erreur', 'ERROR', exception=True,
+            mouvement_id=instance.id, produit_id=instance.produit_id,
+            entrepot_id=instance.entrepot_id, type_mouvement=instance.type_mouvement,
+            erreur=str(e),
+        )
 
 
 @receiver(pre_delete, sender=Vente)
@@ -1050,6 +1730,7 @@ def liberer_stock_sur_suppression_vente(sender, instance, **kwargs):
     """
     Libérer le stock réservé quand une vente est supprimée (avant confirmation)
     """
+    invalider_cache('vente', 'stock')
     try:
         with transaction.atomic():
             stocks_libérés = []
@@ -1081,17 +1762,30 @@ def liberer_stock_sur_suppression_vente(sender, instance, **kwargs):
                             'nouvelle_reserve': to_float(stock_entrepot.quantite_reservee)
                         })
 
-                        print(f"✅ Stock libéré: {ligne.produit.nom} - {quantite_ligne:.2f} unités")
+                        metriques.liberations_stock.inc(origine='vente', resultat='liberee')
+                        trace_stock(
+                            'stock.liberation', origine='vente', vente_id=instance.id,
+                            ligne_vente_id=ligne.id, produit_id=ligne.produit_id,
+                            entrepot_id=ligne.entrepot_id, quantite=quantite_ligne,
+                            nouvelle_reserve=to_float(stock_entrepot.quantite_reservee),
+                        )
 
                 except StockEntrepot.DoesNotExist:
-                    print(f"⚠️ Stock non trouvé pour {ligne.produit.nom}")
+                    metriques.liberations_stock.inc(origine='vente', resultat='stock_absent')
+                    evenement(
+                        'stock.liberation.stock_absent', 'WARNING', origine='vente',
+                        vente_id=instance.id, ligne_vente_id=ligne.id,
+                        produit_id=ligne.produit_id, entrepot_id=ligne.entrepot_id,
+                    )
                     continue
 
-            AuditLog.objects.create(
+            journaliser(
                 user=instance.created_by if instance.created_by else None,
                 action='suppression',
                 modele='Vente',
                 objet_id=instance.id,
+                vente_id=instance.id,
+                montant=instance.montant_total,
                 details={
                     'numero_vente': instance.numero_vente,
                     'statut': instance.statut,
@@ -1101,9 +1795,29 @@ def liberer_stock_sur_suppression_vente(sender, instance, **kwargs):
             )
 
     except Exception as e:
-        print(f"❌ Erreur lors de la libération du stock: {e}")
-        import traceback
-        traceback.print_exc()
+        metriques.liberations_stock.inc(origine='vente', resultat='erreur')
+        evenement(
+            'stock.liberation.erreur', 'ERROR', exception=True,
+            origine='vente', vente_id=instance.id, erreur=str(e),
+        )
+
+
+@receiver(pre_delete, sender=Vente)
+def retirer_faits_sur_suppression_vente(sender, instance, **kwargs):
+    if instance.statut == 'confirmee':
+        VenteJournaliere.retirer_vente(instance)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def fusionner_faits_sur_suppression_vendeur(sender, instance, **kwargs):
+    """Reporter les faits d'un vendeur supprimé sur la clé sans vendeur"""
+    VenteJournaliere.detacher('vendeur_id', instance.pk)
+
+
+@receiver(pre_delete, sender=Client)
+def fusionner_faits_sur_suppression_client(sender, instance, **kwargs):
+    """Reporter les faits d'un client supprimé sur la clé sans client"""
+    VenteJournaliere.detacher('client_id', instance.pk)
 
 
 @receiver(pre_delete, sender=LigneDeVente)
@@ -1130,15 +1844,31 @@ def liberer_stock_sur_suppression_ligne_vente(sender, instance, **kwargs):
                         stock_entrepot.quantite_reservee = 0
 
                     stock_entrepot.save()
-                    stock_entrepot.refresh_from_db()
 
-                    print(f"✅ Stock libéré (ligne suppression): {instance.produit.nom} - {quantite_ligne:.2f} unités")
+                    metriques.liberations_stock.inc(origine='ligne', resultat='liberee')
+                    if STOCK_TRACE:
+                        stock_entrepot.refresh_from_db()
+                        trace_stock(
+                            'stock.liberation', origine='ligne', vente_id=instance.vente_id,
+                            ligne_vente_id=instance.id, produit_id=instance.produit_id,
+                            entrepot_id=instance.entrepot_id, quantite=quantite_ligne,
+                            nouvelle_reserve=to_float(stock_entrepot.quantite_reservee),
+                        )
 
                 except StockEntrepot.DoesNotExist:
-                    print(f"⚠️ Stock non trouvé pour {instance.produit.nom}")
+                    metriques.liberations_stock.inc(origine='ligne', resultat='stock_absent')
+                    evenement(
+                        'stock.liberation.stock_absent', 'WARNING', origine='ligne',
+                        vente_id=instance.vente_id, ligne_vente_id=instance.id,
+                        produit_id=instance.produit_id, entrepot_id=instance.entrepot_id,
+                    )
 
     except Exception as e:
-        print(f"❌ Erreur lors de la libération du stock (ligne): {e}")
+        metriques.liberations_stock.inc(origine='ligne', resultat='erreur')
+        evenement(
+            'stock.liberation.erreur', 'ERROR', exception=True,
+            origine='ligne', ligne_vente_id=instance.id, erreur=str(e),
+        )
 
 
 @receiver(reset_password_token_created)
@@ -0,0 +1,119 @@
+# pagination.py
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CurseurPagination(BasePagination):
+    """
+    Pagination par clé (keyset) sur (created_at, id), du plus récent au plus
+    ancien. Le curseur opaque contient la position de la dernière ligne
+    servie : chaque page est une recherche d'index, sans OFFSET, et coûte
+    donc le même prix à la page 1 et à la page 10 000.
+    """
+    page_size = 50
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Curseur invalide'
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        try:
+            demande = int(request.query_params[self.page_size_query_param])
+            if demande > 0:
+                page_size = min(demande, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'))
+            position = parse_datetime(tokens['p'][0])
+            identifiant = int(tokens['i'][0])
+            reverse = tokens.get('r', ['0'])[0] == '1'
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, identifiant, reverse
+
+    def encode_cursor(self, objet, reverse):
+        tokens = {'p': objet.created_at.isoformat(), 'i': objet.pk}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if cursor:
+            position, identifiant, _ = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=position) |
+                    Q(created_at=position, pk__gt=identifiant)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=position) |
+                    Q(created_at=position, pk__lt=identifiant)
+                )
+
+        ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # En avançant, une page précédente existe dès qu'un curseur est
+        # fourni ; en reculant, une page suivante existe toujours
+        self.has_next = (not reverse and has_more) or reverse
+        self.has_previous = (reverse and has_more) or (not reverse and cursor is not None)
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,100 @@
+# pdf.py
+"""
+Rendu PDF des factures avec reportlab.
+
+Ce module n'importe pas Django : il est chargé tel quel par les processus
+du pool de rendu (voir users/factures.py) et ne travaille que sur le
+dictionnaire construit par `donnees_facture`.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+def _montant(valeur):
+    return f"{valeur} €"
+
+
+def _texte(valeur):
+    """Valeur saisie, échappée pour Paragraph (qui interprète son texte comme du balisage)"""
+    return escape(str(valeur))
+
+
+def rendre_facture_pdf(donnees):
+    """Produire le PDF d'une facture et le retourner en octets"""
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4,
+        leftMargin=18 * mm, rightMargin=18 * mm,
+        topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"Facture {donnees['numero_facture']}",
+    )
+    styles = getSampleStyleSheet()
+    elements = []
+
+    if donnees['entreprise']:
+        elements.append(Paragraph(_texte(donnees['entreprise']), styles['Title']))
+    elements.append(Paragraph(
+        f"Facture {_texte(donnees['numero_facture'])}", styles['Heading2']))
+    elements.append(Paragraph(
+        f"Date : {_texte(donnees['date_facture'])} — Vente {_texte(donnees['numero_vente'])} "
+        f"({_texte(donnees['type_vente'])})", styles['Normal']))
+    elements.append(Spacer(1, 6 * mm))
+
+    client = donnees['client']
+    if client:
+        lignes_client = [_texte(client['nom'])]
+        for cle in ('numero_client', 'adresse', 'telephone', 'email'):
+            if client.get(cle):
+                lignes_client.append(_texte(client[cle]))
+        elements.append(Paragraph('Client', styles['Heading4']))
+        elements.append(Paragraph('<br/>'.join(lignes_client), styles['Normal']))
+        elements.append(Spacer(1, 6 * mm))
+
+    tableau = [['Code', 'Produit', 'Entrepôt', 'Quantité', 'Prix unitaire', 'Total']]
+    for ligne in donnees['lignes']:
+        tableau.append([
+            ligne['code'], Paragraph(_texte(ligne['produit']), styles['Normal']),
+            ligne['entrepot'], ligne['quantite'],
+            _montant(ligne['prix_unitaire']), _montant(ligne['montant_total']),
+        ])
+    table = Table(tableau, repeatRows=1, colWidths=[
+        22 * mm, 58 * mm, 30 * mm, 20 * mm, 22 * mm, 22 * mm])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#eeeeee')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 6 * mm))
+
+    totaux = [['Sous-total', _montant(donnees['montant_avant_reduction'])]]
+    if donnees['reduction']:
+        totaux.append([donnees['reduction'], f"-{_montant(donnees['montant_reduction'])}"])
+    totaux += [
+        ['Montant HT', _montant(donnees['montant_ht'])],
+        ['TVA', _montant(donnees['tva'])],
+        ['Total TTC', _montant(donnees['montant_ttc'])],
+        ['Payé', _montant(donnees['montant_paye'])],
+        ['Reste à payer', _montant(donnees['montant_restant'])],
+    ]
+    table_totaux = Table(totaux, colWidths=[40 * mm, 30 * mm], hAlign='RIGHT')
+    table_totaux.setStyle(TableStyle([
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, -3), (-1, -3), 0.5, colors.black),
+        ('FONTNAME', (0, -3), (-1, -3), 'Helvetica-Bold'),
+    ]))
+    elements.append(table_totaux)
+    elements.append(Spacer(1, 4 * mm))
+    elements.append(Paragraph(
+        f"Statut du paiement : {_texte(donnees['statut_paiement'])}", styles['Normal']))
+
+    document.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,150 @@
+# profilage.py
+"""
+Profilage SQL par requête HTTP.
+
+ProfilageSQLMiddleware enveloppe chaque connexion de base de données
+(connection.execute_wrapper) le temps de la requête : nombre de requêtes
+SQL, temps SQL cumulé et les PROFILAGE_SQL_NOMBRE_LENTES requêtes les plus
+lentes (texte SQL seul : les paramètres, qui peuvent contenir des données
+personnelles, ne sont pas conservés).
+
+La réponse reçoit un en-tête `Server-Timing` (affiché par les outils de
+développement des navigateurs) et, si PROFILAGE_SQL_ENTETE_REQUETES,
+`X-Query-Count`. Les requêtes plus longues que PROFILAGE_SQL_SEUIL_MS sont
+écrites, une ligne JSON chacune, dans un fichier à rotation
+(PROFILAGE_SQL_FICHIER).
+
+Le coût par requête SQL est un appel de fonction et deux lectures
+d'horloge ; PROFILAGE_SQL_ECHANTILLON (entre 0 et 1) limite le profilage à
+une fraction des requêtes HTTP. Les réponses streamées (exports) ne sont
+mesurées que jusqu'au début de leur envoi.
+"""
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .evenements import correlation
+
+PROFILAGE_SQL_ECHANTILLON = getattr(settings, 'PROFILAGE_SQL_ECHANTILLON', 1.0)
+PROFILAGE_SQL_SEUIL_MS = getattr(settings, 'PROFILAGE_SQL_SEUIL_MS', 500)
+PROFILAGE_SQL_NOMBRE_LENTES = getattr(settings, 'PROFILAGE_SQL_NOMBRE_LENTES', 5)
+PROFILAGE_SQL_ENTETE_REQUETES = getattr(
+    settings, 'PROFILAGE_SQL_ENTETE_REQUETES', settings.DEBUG)
+# Fichier des requêtes lentes (None : pas d'écriture), taille maximale (octets)
+# et nombre de fichiers conservés à la rotation
+PROFILAGE_SQL_FICHIER = getattr(
+    settings, 'PROFILAGE_SQL_FICHIER',
+    os.path.join(settings.BASE_DIR, 'logs', 'requetes-lentes.log'))
+PROFILAGE_SQL_FICHIER_TAILLE = getattr(settings, 'PROFILAGE_SQL_FICHIER_TAILLE', 10 * 1024 * 1024)
+PROFILAGE_SQL_FICHIER_NOMBRE = getattr(settings, 'PROFILAGE_SQL_FICHIER_NOMBRE', 5)
+
+logger = logging.getLogger(__name__)
+_verrou = threading.Lock()
+
+
+class ProfilRequetes:
+    """execute_wrapper mesurant les requêtes SQL exécutées sous lui"""
+
+    def __init__(self, nombre_lentes=PROFILAGE_SQL_NOMBRE_LENTES):
+        self.nombre_lentes = nombre_lentes
+        self.nombre = 0
+        self.duree = 0.0
+        # Tas (durée, rang, sql) des requêtes les plus lentes
+        self._lentes = []
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.nombre += 1
+            self.duree += duree
+            if len(self._lentes) < self.nombre_lentes:
+                heapq.heappush(self._lentes, (duree, self.nombre, sql))
+            elif self._lentes and duree > self._lentes[0][0]:
+                heapq.heapreplace(self._lentes, (duree, self.nombre, sql))
+
+    def requetes_lentes(self):
+        """Requêtes les plus lentes, de la plus longue à la plus courte"""
+        return [
+            {'duree_ms': round(duree * 1000, 2), 'rang': rang, 'sql': sql}
+            for duree, rang, sql in sorted(self._lentes, reverse=True)
+        ]
+
+
+def _journal_requetes_lentes():
+    """Logger des requêtes lentes, relié au fichier à rotation au premier usage"""
+    if PROFILAGE_SQL_FICHIER and not logger.handlers:
+        with _verrou:
+            # Un handler déclaré dans settings.LOGGING est conservé
+            if not logger.handlers:
+                os.makedirs(os.path.dirname(PROFILAGE_SQL_FICHIER), exist_ok=True)
+                handler = RotatingFileHandler(
+                    PROFILAGE_SQL_FICHIER, maxBytes=PROFILAGE_SQL_FICHIER_TAILLE,
+                    backupCount=PROFILAGE_SQL_FICHIER_NOMBRE, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+    return logger
+
+
+class ProfilageSQLMiddleware:
+    """Mesurer les requêtes SQL de chaque requête HTTP (échantillonnée)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILAGE_SQL_ECHANTILLON <= 0 or (
+                PROFILAGE_SQL_ECHANTILLON < 1 and random.random() >= PROFILAGE_SQL_ECHANTILLON):
+            return self.get_response(request)
+
+        profil = ProfilRequetes()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(profil))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        timing = f'db;dur={profil.duree * 1000:.2f}, total;dur={duree * 1000:.2f}'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        if PROFILAGE_SQL_ENTETE_REQUETES:
+            response['X-Query-Count'] = str(profil.nombre)
+
+        if duree * 1000 >= PROFILAGE_SQL_SEUIL_MS:
+            self._journaliser(request, response, duree, profil)
+        return response
+
+    def _journaliser(self, request, response, duree, profil):
+        try:
+            _journal_requetes_lentes().warning(json.dumps({
+                'date': timezone.now().isoformat(),
+                'correlation': correlation(),
+                'methode': request.method,
+                'chemin': request.get_full_path(),
+                'statut': response.status_code,
+                'utilisateur': getattr(getattr(request, 'user', None), 'pk', None),
+                'duree_ms': round(duree * 1000, 2),
+                'sql_ms': round(profil.duree * 1000, 2),
+                'requetes': profil.nombre,
+                'requetes_lentes': profil.requetes_lentes(),
+            }, ensure_ascii=False))
+        except Exception:
+            # Le journal ne doit jamais faire échouer la requête
+            logging.getLogger('django.request').exception(
+                "Journal des requêtes lentes indisponible")
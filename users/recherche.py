@@ -0,0 +1,165 @@
+# recherche.py
+"""
+Recherche plein texte (paramètre `?q=`) sur les produits, les clients et le
+journal d'audit.
+
+Deux implémentations, choisies selon la base :
+- SQLite : une table virtuelle FTS5 par modèle (recherche_<modele>, rowid =
+  clé primaire), tenue à jour par les signaux de users/models.py et par
+  l'écriture groupée du journal d'audit ;
+- PostgreSQL : un index GIN sur l'expression SearchVector des mêmes champs,
+  que les requêtes reprennent à l'identique.
+Des champs JSON, seules les valeurs sont indexées (ni les clés, ni la
+syntaxe).
+
+Chaque mot recherché est traité comme un préfixe, et tous doivent être
+présents. Les résultats sont triés par pertinence et limités à
+RECHERCHE_LIMITE : au-delà, l'utilisateur affine sa recherche. Les exports
+ne sont pas limités.
+"""
+import json
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Func, IntegerField, JSONField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+# Nombre maximal de résultats d'une recherche
+RECHERCHE_LIMITE = getattr(settings, 'RECHERCHE_LIMITE', 100)
+
+# Champs indexés de chaque modèle
+CHAMPS_RECHERCHE = {
+    'produit': ('nom', 'code'),
+    'client': ('nom', 'telephone'),
+    'auditlog': ('modele', 'action', 'details'),
+}
+
+
+def _table(modele):
+    return f'recherche_{modele._meta.model_name}'
+
+
+def _mots(texte):
+    return re.findall(r'\w+', texte.lower())
+
+
+def _texte(valeur):
+    """Texte indexé d'une valeur de champ (valeurs seules pour le JSON)"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, dict):
+        return ' '.join(_texte(v) for v in valeur.values())
+    if isinstance(valeur, (list, tuple)):
+        return ' '.join(_texte(v) for v in valeur)
+    return str(valeur)
+
+
+def recherche_sqlite():
+    return connection.vendor == 'sqlite'
+
+
+def vecteur_recherche(modele):
+    """
+    Expression SearchVector (PostgreSQL), identique à celle de l'index GIN :
+    toute modification demande une migration qui recrée l'index
+    """
+    from django.contrib.postgres.search import SearchConfig, SearchVector, SearchVectorField
+
+    champs = CHAMPS_RECHERCHE[modele._meta.model_name]
+    vecteur = SearchVector(*(champ for champ in champs if champ != 'details'), config='simple')
+    if 'details' not in champs:
+        return vecteur
+    # Valeurs texte et numériques du JSON, à toute profondeur
+    valeurs = Func(
+        SearchConfig('simple'), 'details',
+        Cast(Value('["string", "numeric"]'), JSONField()),
+        function='jsonb_to_tsvector', output_field=SearchVectorField()
+    )
+    return Func(vecteur, valeurs, template='(%(expressions)s)', arg_joiner=' || ',
+                output_field=SearchVectorField())
+
+
+def _inserer(conn, table, champs, lignes):
+    if not lignes:
+        return
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table}(rowid, {', '.join(champs)}) "
+            f"VALUES ({', '.join(['%s'] * (len(champs) + 1))})",
+            lignes
+        )
+
+
+def indexer(instances):
+    """Indexer (ou réindexer) des instances d'un même modèle (SQLite)"""
+    if not instances or not recherche_sqlite():
+        return
+    modele = type(instances[0])
+    champs = CHAMPS_RECHERCHE[modele._meta.model_name]
+    lignes = [
+        (instance.pk, *(_texte(getattr(instance, champ)) for champ in champs))
+        for instance in instances
+    ]
+    # FTS5 n'applique pas les contraintes d'unicité sur le rowid : il faut
+    # supprimer l'ancienne version avant d'insérer la nouvelle
+    desindexer(modele, [ligne[0] for ligne in lignes])
+    _inserer(connection, _table(modele), champs, lignes)
+
+
+def desindexer(modele, pks):
+    """Retirer des lignes de l'index (SQLite)"""
+    if not pks or not recherche_sqlite():
+        return
+    pks = list(pks)
+    with connection.cursor() as cursor:
+        for debut in range(0, len(pks), 500):
+            tranche = pks[debut:debut + 500]
+            cursor.execute(
+                f"DELETE FROM {_table(modele)} WHERE rowid IN "
+                f"({', '.join(['%s'] * len(tranche))})",
+                tranche
+            )
+
+
+def rechercher(queryset, texte, limite=RECHERCHE_LIMITE):
+    """
+    Restreindre `queryset` aux objets correspondant à `texte`, triés par
+    pertinence (au plus `limite` résultats). Avec `limite=None` (exports),
+    tous les objets correspondants sont retenus, dans l'ordre de `queryset`.
+    """
+    mots = _mots(texte)
+    if not mots:
+        return queryset.none()
+    modele = queryset.model
+
+    if recherche_sqlite():
+        requete = ' '.join(f'"{mot}"*' for mot in mots)
+        correspondances = f"SELECT rowid FROM {_table(modele)} WHERE {_table(modele)} MATCH %s"
+        if limite is None:
+            return queryset.filter(pk__in=RawSQL(correspondances, [requete]))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{correspondances} ORDER BY bm25({_table(modele)}) LIMIT %s",
+                [requete, limite]
+            )
+            pks = [ligne[0] for ligne in cursor.fetchall()]
+        if not pks:
+            return queryset.none()
+        rang = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(pks)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(pk__in=pks).order_by(rang)
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    vecteur = vecteur_recherche(modele)
+    requete = SearchQuery(
+        ' & '.join(f'{mot}:*' for mot in mots), config='simple', search_type='raw')
+    if limite is None:
+        return queryset.annotate(document=vecteur).filter(document=requete)
+    return queryset.annotate(
+        document=vecteur, pertinence=SearchRank(vecteur, requete)
+    ).filter(document=requete).order_by('-pertinence', '-pk')[:limite]
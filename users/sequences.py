@@ -0,0 +1,169 @@
+# sequences.py
+"""
+Allocation des numéros de documents (ventes DA, clients CLT, factures FAC,
+transferts TRF).
+
+Chaque séquence est un compteur de la table CompteurSequence. Sur une base
+multi-connexions (PostgreSQL), chaque worker réserve un bloc de numéros
+(hi/lo) par un UPDATE atomique exécuté sur une connexion dédiée et validé
+immédiatement : les numéros suivants sont servis depuis la mémoire, sans
+verrou ni balayage de table, et un rollback de la transaction appelante ne
+peut pas faire réattribuer un bloc déjà distribué (il laisse seulement un
+trou dans la numérotation).
+
+SQLite n'accepte qu'un écrivain à la fois : le compteur y est incrémenté de
+1 dans la transaction appelante, ce qui reste sans collision.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+# Nombre de numéros réservés par worker à chaque aller-retour en base
+TAILLE_BLOC = getattr(settings, 'SEQUENCE_BLOC_TAILLE', 20)
+
+
+def _dernier_numero(queryset, champ, prefixe, defaut):
+    """
+    Dernier numéro utilisé pour un préfixe, lu une seule fois à la création
+    du compteur (les numéros sont complétés par des zéros, l'ordre
+    lexicographique suit donc l'ordre numérique)
+    """
+    dernier = queryset.filter(**{f'{champ}__startswith': prefixe}).order_by(
+        f'-{champ}').values_list(champ, flat=True).first()
+    if dernier:
+        try:
+            return int(dernier[len(prefixe):])
+        except ValueError:
+            pass
+    return defaut
+
+
+def _incrementer(connexion, nom, pas, valeur_initiale):
+    """Incrémenter le compteur `nom` de `pas` et retourner la nouvelle valeur"""
+    from .models import CompteurSequence
+
+    table = connexion.ops.quote_name(CompteurSequence._meta.db_table)
+    update = f"UPDATE {table} SET valeur = valeur + %s WHERE nom = %s"
+    with connexion.cursor() as cursor:
+        cursor.execute(update, [pas, nom])
+        if cursor.rowcount == 0:
+            cursor.execute(
+                f"INSERT INTO {table} (nom, valeur) VALUES (%s, %s) "
+                f"ON CONFLICT (nom) DO NOTHING",
+                [nom, valeur_initiale()]
+            )
+            cursor.execute(update, [pas, nom])
+        cursor.execute(f"SELECT valeur FROM {table} WHERE nom = %s", [nom])
+        return cursor.fetchone()[0]
+
+
+class Sequence:
+    """Séquence nommée servant des numéros depuis un bloc réservé par worker"""
+
+    def __init__(self, nom, valeur_initiale, taille_bloc=TAILLE_BLOC,
+                 using=DEFAULT_DB_ALIAS):
+        self.nom = nom
+        self.valeur_initiale = valeur_initiale
+        self.taille_bloc = taille_bloc
+        self.using = using
+        self._verrou = threading.Lock()
+        self._pid = None
+        self._courant = 0
+        self._limite = 0
+
+    def suivant(self):
+        connexion = connections[self.using]
+        if connexion.vendor == 'sqlite' or self.taille_bloc <= 1:
+            return _incrementer(connexion, self.nom, 1, self.valeur_initiale)
+
+        with self._verrou:
+            # Un bloc hérité du processus parent (fork gunicorn) est ignoré
+            if self._pid != os.getpid() or self._courant >= self._limite:
+                self._reserver_bloc()
+            self._courant += 1
+            return self._courant
+
+    def reserver(self, nombre):
+        """
+        Réserver `nombre` numéros consécutifs dans la transaction en cours
+        (chargements en masse) et retourner le premier
+        """
+        limite = _incrementer(
+            connections[self.using], self.nom, nombre, self.valeur_initiale)
+        return limite - nombre + 1
+
+    def _reserver_bloc(self):
+        # Connexion dédiée en autocommit : le bloc est acquis même si la
+        # transaction de la requête est annulée ensuite
+        connexion = connections.create_connection(self.using)
+        try:
+            connexion.set_autocommit(False)
+            limite = _incrementer(
+                connexion, self.nom, self.taille_bloc, self.valeur_initiale)
+            connexion.commit()
+        except Exception:
+            connexion.rollback()
+            raise
+        finally:
+            connexion.close()
+
+        self._pid = os.getpid()
+        self._limite = limite
+        self._courant = limite - self.taille_bloc
+
+
+_sequences = {}
+_sequences_verrou = threading.Lock()
+
+
+def get_sequence(nom, valeur_initiale):
+    with _sequences_verrou:
+        if nom not in _sequences:
+            _sequences[nom] = Sequence(nom, valeur_initiale)
+        return _sequences[nom]
+
+
+def sequence_vente():
+    from .models import Vente
+
+    return get_sequence('vente', lambda: _dernier_numero(
+        Vente.objects, 'numero_vente', 'DA', 99))
+
+
+def sequence_client():
+    from .models import Client
+
+    return get_sequence('client', lambda: _dernier_numero(
+        Client.objects, 'numero_client', 'CLT', 99))
+
+
+def sequence_facture():
+    from .models import Facture
+
+    return get_sequence('facture', lambda: _dernier_numero(
+        Facture.objects, 'numero_facture', 'FAC', 99))
+
+
+def prochain_numero_vente():
+    return f'DA{sequence_vente().suivant():08d}'
+
+
+def prochain_numero_client():
+    return f'CLT{sequence_client().suivant():08d}'
+
+
+def prochain_numero_facture():
+    return f'FAC{sequence_facture().suivant():08d}'
+
+
+def prochaine_reference_transfert(date=None):
+    from .models import TransfertEntrepot
+
+    jour = (date or timezone.localdate()).strftime('%Y%m%d')
+    prefixe = f'TRF{jour}'
+    sequence = get_sequence(f'transfert-{jour}', lambda: _dernier_numero(
+        TransfertEntrepot.objects, 'reference', prefixe, 0))
+    return f'{prefixe}{sequence.suivant():04d}'
@@ -1,6 +1,9 @@
 from django.db.models import Sum
 from rest_framework import serializers
 from .models import *
+from .audit import journaliser
+from .evenements import evenement
+from .sequences import prochain_numero_vente, prochaine_reference_transfert
 from django.contrib.auth import get_user_model
 from datetime import datetime
 from django.db import transaction
@@ -94,29 +97,27 @@ class ProduitSerializer(serializers.ModelSerializer):
     stocks_entrepots = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    image_webp_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Produit
         fields = '__all__'
-        read_only_fields = ('created_by', 'created_at', 'thumbnail')
+        read_only_fields = ('created_by', 'created_at', 'thumbnail', 'image_webp')
 
+    # Les totaux sont les colonnes dénormalisées de Produit et les stocks
+    # par entrepôt viennent du prefetch de ProduitViewSet : aucune requête
+    # supplémentaire par produit lors du listing.
     def get_stock_actuel(self, obj):
         return obj.stock_actuel()
 
     def get_stock_total(self, obj):
-        total = StockEntrepot.objects.filter(produit=obj).aggregate(
-            total=Sum('quantite')
-        )['total'] or 0
-        return float(total)
+        return obj.stock_actuel()
 
     def get_stock_reserve_total(self, obj):
-        total = StockEntrepot.objects.filter(produit=obj).aggregate(
-            total=Sum('quantite_reservee')
-        )['total'] or 0
-        return float(total)
+        return obj.stock_reserve()
 
     def get_stock_disponible_total(self, obj):
-        return float(self.get_stock_total(obj) - self.get_stock_reserve_total(obj))
+        return to_float(obj.stock_disponible)
 
     def get_en_rupture(self, obj):
         return obj.en_rupture
@@ -125,7 +126,7 @@ class ProduitSerializer(serializers.ModelSerializer):
         return obj.stock_faible
 
     def get_stocks_entrepots(self, obj):
-        stocks = StockEntrepot.objects.filter(produit=obj)
+        stocks = obj.stockentrepot_set.all()
         return StockEntrepotSerializer(stocks, many=True, read_only=True).data
 
     def get_image_url(self, obj):
@@ -149,6 +150,14 @@ class ProduitSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_image_webp_url(self, obj):
+        if obj.image_webp:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.image_webp.url)
+            return obj.image_webp.url
+        return None
+
 
 class ClientSerializer(serializers.ModelSerializer):
     created_by_email = serializers.CharField(
@@ -217,11 +226,47 @@ class StockDetailSerializer(serializers.ModelSerializer):
         return obj.quantite_disponible
 
 
+class PrimaryKeyRelatedFieldPrecharge(serializers.PrimaryKeyRelatedField):
+    """Résout la clé depuis les objets préchargés par LigneDeVenteListSerializer"""
+
+    def to_internal_value(self, data):
+        precharges = self.context.get('relations_prechargees', {}).get(self.field_name)
+        if precharges is not None:
+            try:
+                return precharges[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class LigneDeVenteListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Charger produits et entrepôts de toutes les lignes en deux requêtes
+        if isinstance(data, list):
+            ids = {'produit': set(), 'entrepot': set()}
+            for ligne in data:
+                if not isinstance(ligne, dict):
+                    continue
+                for champ in ids:
+                    try:
+                        ids[champ].add(int(ligne.get(champ)))
+                    except (TypeError, ValueError):
+                        pass
+            self.context['relations_prechargees'] = {
+                'produit': Produit.objects.in_bulk(ids['produit']),
+                'entrepot': Entrepot.objects.in_bulk(ids['entrepot']),
+            }
+        return super().to_internal_value(data)
+
+
 class LigneDeVenteCreateSerializer(serializers.ModelSerializer):
+    produit = PrimaryKeyRelatedFieldPrecharge(queryset=Produit.objects.all())
+    entrepot = PrimaryKeyRelatedFieldPrecharge(queryset=Entrepot.objects.all())
     quantite = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)  # MODIFICATION
 
     class Meta:
         model = LigneDeVente
+        list_serializer_class = LigneDeVenteListSerializer
         fields = ('produit', 'entrepot', 'quantite', 'prix_unitaire')
         extra_kwargs = {
             'produit': {'required': True},
@@ -327,6 +372,7 @@ class VenteCreateSerializer(serializers.ModelSerializer):
                 "Au moins une ligne de vente est requise."
             )
 
+        quantites = {}
         for ligne in lignes_data:
             produit = ligne.get('produit')
             entrepot = ligne.get('entrepot')
@@ -336,21 +382,28 @@ class VenteCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Chaque ligne doit avoir un produit, un entrepôt et une quantité positive."
                 )
-
-            try:
-                stock_entrepot = StockEntrepot.objects.get(
-                    produit=produit,
-                    entrepot=entrepot
-                )
-                disponible = stock_entrepot.quantite_disponible
-                if quantite > disponible:
-                    raise serializers.ValidationError(
-                        f"Stock insuffisant pour {produit.nom} dans {entrepot.nom}. Disponible: {disponible:.2f}"
-                    )
-            except StockEntrepot.DoesNotExist:
+            cle = (produit, entrepot)
+            quantites[cle] = quantites.get(cle, 0) + quantite
+
+        # Tous les stocks concernés en une seule requête
+        stocks = {
+            (stock.produit_id, stock.entrepot_id): stock
+            for stock in StockEntrepot.objects.filter(
+                produit__in={produit for produit, _ in quantites},
+                entrepot__in={entrepot for _, entrepot in quantites}
+            )
+        }
+        for (produit, entrepot), quantite in quantites.items():
+            stock_entrepot = stocks.get((produit.id, entrepot.id))
+            if stock_entrepot is None:
                 raise serializers.ValidationError(
                     f"Le produit {produit.nom} n'est pas disponible dans {entrepot.nom}"
                 )
+            disponible = stock_entrepot.quantite_disponible
+            if quantite > disponible:
+                raise serializers.ValidationError(
+                    f"Stock insuffisant pour {produit.nom} dans {entrepot.nom}. Disponible: {disponible:.2f}"
+                )
 
         return data
 
@@ -364,31 +417,13 @@ class VenteCreateSerializer(serializers.ModelSerializer):
                 'non_field_errors': 'Utilisateur non authentifié'
             })
 
-        last_vente = Vente.objects.order_by('-id').first()
-        if last_vente and last_vente.numero_vente and last_vente.numero_vente.startswith('DA'):
-            try:
-                last_number_str = last_vente.numero_vente[2:]
-                last_number = int(last_number_str)
-                new_number = last_number + 1
-            except (ValueError, IndexError):
-                new_number = 100
-        else:
-            new_number = 100
-        numero_vente = f'DA{new_number:08d}'
-
-        vente = Vente.objects.create(
-            numero_vente=numero_vente,
-            client=validated_data.get('client'),
-            type_vente=validated_data.get('type_vente', 'detail'),
-            type_reduction=validated_data.get('type_reduction', 'aucune'),
-            valeur_reduction=validated_data.get('valeur_reduction', 0),
-            mode_paiement=validated_data.get('mode_paiement'),
-            montant_paye=validated_data.get('montant_paye', 0),
-            date_echeance=validated_data.get('date_echeance'),
-            notes=validated_data.get('notes', ''),
-            created_by=user
-        )
+        numero_vente = prochain_numero_vente()
+        type_vente = validated_data.get('type_vente', 'detail')
 
+        # Prix et sous-totaux calculés avant toute écriture : la vente est
+        # insérée une seule fois avec ses totaux, puis toutes les lignes en
+        # un bulk_create
+        lignes = []
         entrepots_utilises = set()
         montant_total_lignes = 0
 
@@ -396,7 +431,6 @@ class VenteCreateSerializer(serializers.ModelSerializer):
             produit = ligne_data.get('produit')
             entrepot = ligne_data.get('entrepot')
             quantite = ligne_data.get('quantite')
-            type_vente = validated_data.get('type_vente', 'detail')
 
             if type_vente == 'gros':
                 prix_unitaire = produit.prix_vente_gros or produit.prix_vente or 0
@@ -405,24 +439,19 @@ class VenteCreateSerializer(serializers.ModelSerializer):
                 prix_unitaire = produit.prix_vente_detail or produit.prix_vente or 0
                 est_prix_gros = False
 
-            ligne = LigneDeVente.objects.create(
-                vente=vente,
+            sous_total = float(quantite) * float(prix_unitaire)  # MODIFICATION
+            lignes.append(LigneDeVente(
                 produit=produit,
                 entrepot=entrepot,
                 quantite=quantite,
                 prix_unitaire=prix_unitaire,
-                est_prix_gros=est_prix_gros
-            )
-
-            sous_total = float(quantite) * float(prix_unitaire)  # MODIFICATION
-            ligne.montant_total = sous_total
-            ligne.save()
+                est_prix_gros=est_prix_gros,
+                montant_total=sous_total
+            ))
 
             montant_total_lignes += sous_total
             entrepots_utilises.add(entrepot)
 
-        vente.entrepots.set(entrepots_utilises)
-
         type_reduction = validated_data.get('type_reduction', 'aucune')
         valeur_reduction = float(validated_data.get('valeur_reduction', 0))
 
@@ -437,27 +466,37 @@ class VenteCreateSerializer(serializers.ModelSerializer):
 
         montant_total_apres_reduction = montant_total_lignes - montant_reduction
 
-        vente.montant_avant_reduction = montant_total_lignes
-        vente.montant_reduction = montant_reduction
-        vente.montant_total = montant_total_apres_reduction
-        vente.montant_remise = montant_reduction
-        vente.montant_restant = max(0, montant_total_apres_reduction - float(vente.montant_paye))
-
-        if float(vente.montant_paye) >= montant_total_apres_reduction:
-            vente.statut_paiement = 'paye'
-        elif float(vente.montant_paye) > 0:
-            vente.statut_paiement = 'partiel'
-        else:
-            vente.statut_paiement = 'non_paye'
+        # Vente.save() déduit montant_restant et statut_paiement des montants
+        vente = Vente.objects.create(
+            numero_vente=numero_vente,
+            client=validated_data.get('client'),
+            type_vente=type_vente,
+            type_reduction=type_reduction,
+            valeur_reduction=validated_data.get('valeur_reduction', 0),
+            mode_paiement=validated_data.get('mode_paiement'),
+            montant_paye=validated_data.get('montant_paye', 0),
+            date_echeance=validated_data.get('date_echeance'),
+            notes=validated_data.get('notes', ''),
+            montant_avant_reduction=montant_total_lignes,
+            montant_reduction=montant_reduction,
+            montant_total=montant_total_apres_reduction,
+            montant_remise=montant_reduction,
+            created_by=user
+        )
 
-        vente.save()
+        for ligne in lignes:
+            ligne.vente = vente
+        LigneDeVente.objects.bulk_create(lignes)
+        vente.entrepots.add(*entrepots_utilises)
 
         try:
-            AuditLog.objects.create(
+            journaliser(
                 user=user,
                 action='creation',
                 modele='Vente',
                 objet_id=vente.id,
+                vente_id=vente.id,
+                montant=vente.montant_total,
                 details={
                     'numero_vente': numero_vente,
                     'montant_total': str(vente.montant_total),
@@ -469,7 +508,10 @@ class VenteCreateSerializer(serializers.ModelSerializer):
                 }
             )
         except Exception as e:
-            print(f"⚠️ Audit log error (non bloquant): {e}")
+            evenement(
+                'audit.erreur', 'ERROR', exception=True,
+                modele='Vente', vente_id=vente.id, erreur=str(e),
+            )
 
         return vente
 
@@ -736,11 +778,7 @@ class TransfertEntrepotCreateSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         lignes_data = validated_data.pop('lignes_transfert')
-        today = datetime.now().strftime('%Y%m%d')
-        last_transfert_today = TransfertEntrepot.objects.filter(
-            created_at__date=timezone.now().date()
-        ).count()
-        reference = f"TRF{today}{last_transfert_today + 1:04d}"
+        reference = prochaine_reference_transfert()
 
         transfert = TransfertEntrepot.objects.create(
             reference=reference,
@@ -0,0 +1,81 @@
+# taches.py
+"""
+Pools de processus pour les traitements lourds exécutés hors de la requête
+(rendu des factures PDF, traitement des images produits).
+
+Les processus sont démarrés en mode `spawn` : les fonctions soumises doivent
+être importables sans configuration Django et ne travailler que sur des
+données sérialisables (dictionnaires, octets).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class PoolProcessus:
+    """ProcessPoolExecutor créé à la demande, un par processus worker"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._verrou = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._en_cours = {}
+
+    def _executor(self):
+        # Un pool hérité du processus parent (fork gunicorn) est inutilisable
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+            self._en_cours.clear()
+        return self._pool
+
+    def soumettre(self, cle, fonction, *args):
+        """Lancer `fonction(*args)`, ou réutiliser le calcul en cours pour `cle`"""
+        with self._verrou:
+            future = self._en_cours.get(cle)
+            if future is None:
+                future = self._executor().submit(fonction, *args)
+                self._en_cours[cle] = future
+                future.add_done_callback(lambda f: self._en_cours.pop(cle, None))
+            return future
+
+    def attendre(self):
+        """Attendre la fin des calculs en cours et de leurs callbacks"""
+        with self._verrou:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._pool = None
+            self._en_cours.clear()
+
+
+def apres_execution(future, enregistrer, description):
+    """
+    Appeler `enregistrer(resultat)` à la fin d'un calcul, depuis le thread
+    du pool. Les erreurs sont journalisées : personne n'attend ce résultat.
+    """
+    def callback(f):
+        try:
+            if f.exception() is None:
+                enregistrer(f.result())
+            else:
+                logger.error("%s impossible: %s", description, f.exception())
+        except Exception:
+            logger.exception("%s: enregistrement impossible", description)
+        finally:
+            # Le callback s'exécute dans le thread appelant si le calcul
+            # était déjà terminé : ne jamais fermer une connexion en cours
+            # de transaction
+            if not connection.in_atomic_block:
+                close_old_connections()
+
+    future.add_done_callback(callback)
@@ -1,3 +1,207 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import (
+    CompteurSequence, CustomUser, Entrepot, LigneDeVente, MouvementStock, Produit,
+    StockEntrepot, Vente,
+)
+from .sequences import Sequence
+
+# Cache propre au processus de test (le cache fichier survit aux bases de test)
+CACHE_TEST = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def creer_stock(admin, quantites, entrepot=None):
+    """Un produit par quantité, en stock dans un même entrepôt"""
+    entrepot = entrepot or Entrepot.objects.create(
+        nom='Entrepôt test', adresse='Zone test', created_by=admin)
+    produits = []
+    for index, quantite in enumerate(quantites):
+        produit = Produit.objects.create(
+            code=f'T{index:04d}', nom=f'Produit {index}', prix_achat=Decimal('100'),
+            prix_vente=Decimal('150'), prix_vente_gros=Decimal('130'),
+            prix_vente_detail=Decimal('150'), created_by=admin)
+        StockEntrepot.objects.create(
+            produit=produit, entrepot=entrepot, quantite=quantite, stock_alerte=1)
+        produits.append(produit)
+    return entrepot, produits
+
+
+def lignes_vente(entrepot, quantites):
+    return [
+        {'produit': produit.id, 'entrepot': entrepot.id, 'quantite': quantite,
+         'prix_unitaire': '150'}
+        for produit, quantite in quantites
+    ]
+
+
+class SequenceTests(TestCase):
+    """Numéros incrémentés dans la transaction appelante (SQLite)"""
+
+    def test_numeros_uniques_et_croissants_entre_deux_instances(self):
+        a = Sequence('essai', lambda: 99)
+        b = Sequence('essai', lambda: 99)
+
+        numeros = [sequence.suivant() for _ in range(5) for sequence in (a, b)]
+
+        self.assertEqual(numeros, list(range(100, 110)))
+        self.assertEqual(CompteurSequence.objects.get(nom='essai').valeur, 109)
+
+    def test_reserver_retourne_le_premier_numero_du_lot(self):
+        sequence = Sequence('essai', lambda: 0)
+        sequence.suivant()
+
+        self.assertEqual(sequence.reserver(10), 2)
+        self.assertEqual(sequence.suivant(), 12)
+
+
+class SequenceBlocsTests(TransactionTestCase):
+    """
+    Blocs hi/lo réservés sur une connexion dédiée, comme sur PostgreSQL
+    (sans transaction englobante : la connexion dédiée valide ses blocs)
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(connection, 'vendor', 'postgresql')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_numeros_uniques_et_croissants_entre_deux_workers(self):
+        a = Sequence('essai', lambda: 0, taille_bloc=3)
+        b = Sequence('essai', lambda: 0, taille_bloc=3)
+
+        numeros_a, numeros_b = [], []
+        for _ in range(7):
+            numeros_a.append(a.suivant())
+            numeros_b.append(b.suivant())
+
+        # Un bloc de 3 numéros par worker, pris tour à tour
+        self.assertEqual(numeros_a[:3], [1, 2, 3])
+        self.assertEqual(numeros_b[:3], [4, 5, 6])
+        self.assertEqual(numeros_a, sorted(numeros_a))
+        self.assertEqual(numeros_b, sorted(numeros_b))
+        self.assertEqual(len(set(numeros_a + numeros_b)), 14)
+        self.assertLessEqual(
+            max(numeros_a + numeros_b), CompteurSequence.objects.get(nom='essai').valeur)
+
+
+@override_settings(CACHES=CACHE_TEST)
+class ReservationLignesTests(TestCase):
+    """Réservation du stock de toutes les lignes d'une vente en un lot"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username='admin', email='admin@test.local', password='x', role='admin')
+        self.entrepot, self.produits = creer_stock(self.admin, [10, 10])
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def reserves(self):
+        return list(StockEntrepot.objects.order_by('produit_id').values_list(
+            'quantite_reservee', flat=True))
+
+    def test_toutes_les_lignes_sont_reservees(self):
+        reponse = self.api.post('/ventes/', {
+            'type_vente': 'detail',
+            'lignes_vente': lignes_vente(
+                self.entrepot, [(self.produits[0], 2), (self.produits[1], 3)]),
+        }, format='json')
+
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(self.reserves(), [2, 3])
+
+    def test_stock_insuffisant_annule_tout_le_lot(self):
+        reponse = self.api.post('/ventes/', {
+            'type_vente': 'detail',
+            'lignes_vente': lignes_vente(
+                self.entrepot, [(self.produits[0], 2), (self.produits[1], 50)]),
+        }, format='json')
+
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(self.reserves(), [0, 0])
+        self.assertFalse(Vente.objects.exists())
+        self.assertFalse(LigneDeVente.objects.exists())
+
+    def test_lignes_d_un_meme_stock_cumulees(self):
+        # 6 + 6 dépasse les 10 disponibles, bien que chaque ligne tienne seule
+        lignes = [
+            LigneDeVente(produit=self.produits[0], entrepot=self.entrepot, quantite=6),
+            LigneDeVente(produit=self.produits[0], entrepot=self.entrepot, quantite=6),
+            LigneDeVente(produit=self.produits[1], entrepot=self.entrepot, quantite=1),
+        ]
+
+        with self.assertRaises(ValueError):
+            StockEntrepot.reserver_lignes(lignes)
+        self.assertEqual(self.reserves(), [0, 0])
+
+
+@override_settings(CACHES=CACHE_TEST)
+class TotauxStockProduitTests(TestCase):
+    """Totaux dénormalisés de Produit égaux aux sommes de StockEntrepot"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username='admin', email='admin@test.local', password='x', role='admin')
+        self.entrepot, self.produits = creer_stock(self.admin, [10, 8])
+        self.annexe = Entrepot.objects.create(
+            nom='Annexe test', adresse='Zone test', created_by=self.admin)
+        StockEntrepot.objects.create(
+            produit=self.produits[0], entrepot=self.annexe, quantite=5, stock_alerte=1)
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def creer_vente(self, lignes):
+        reponse = self.api.post('/ventes/', {
+            'type_vente': 'detail',
+            'lignes_vente': [
+                {'produit': produit.id, 'entrepot': entrepot.id, 'quantite': quantite,
+                 'prix_unitaire': '150'}
+                for produit, entrepot, quantite in lignes
+            ],
+        }, format='json')
+        self.assertEqual(reponse.status_code, 201, reponse.data)
+        # Le serializer de création ne renvoie pas l'identifiant
+        return Vente.objects.latest('id').id
+
+    def verifier_totaux(self, attendus):
+        for produit, (total, reserve) in zip(self.produits, attendus):
+            produit.refresh_from_db()
+            sommes = StockEntrepot.objects.filter(produit=produit).aggregate(
+                quantite=Sum('quantite'), reserve=Sum('quantite_reservee'))
+            self.assertEqual(produit.stock_total, sommes['quantite'])
+            self.assertEqual(produit.stock_reserve_total, sommes['reserve'])
+            self.assertEqual(
+                produit.stock_disponible, sommes['quantite'] - sommes['reserve'])
+            self.assertEqual((produit.stock_total, produit.stock_reserve_total),
+                             (total, reserve))
+
+    def test_totaux_apres_reservation_confirmation_retrait_et_annulation(self):
+        a, b = self.produits
+        self.verifier_totaux([(15, 0), (8, 0)])
+
+        # Réservation
+        vente = self.creer_vente([(a, self.entrepot, 3), (a, self.annexe, 2),
+                                  (b, self.entrepot, 4)])
+        brouillon = self.creer_vente([(a, self.entrepot, 1)])
+        self.verifier_totaux([(15, 6), (8, 4)])
+
+        # Confirmation : prélèvement du stock réservé
+        reponse = self.api.post(f'/ventes/{vente}/confirmer/')
+        self.assertEqual(reponse.status_code, 200, reponse.data)
+        self.verifier_totaux([(10, 1), (4, 0)])
+
+        # Retrait manuel
+        MouvementStock.objects.create(
+            produit=a, entrepot=self.annexe, type_mouvement='sortie', quantite=1,
+            motif='Casse', created_by=self.admin)
+        self.verifier_totaux([(9, 1), (4, 0)])
+
+        # Annulation d'un brouillon : sa réservation est libérée
+        reponse = self.api.delete(f'/ventes/{brouillon}/')
+        self.assertEqual(reponse.status_code, 204)
+        self.verifier_totaux([(9, 0), (4, 0)])
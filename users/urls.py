@@ -39,6 +39,7 @@ router.register('rapport-paiements', RapportPaiementsViewSet,
 urlpatterns = [
     # Vos autres URLs...
     path('', include(router.urls)),
+    path('metrics/', exporter_metriques, name='metriques'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 # Ou si vous utilisez directement router.urls
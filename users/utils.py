@@ -72,3 +72,53 @@ def resize_image(image_field, max_size=(800, 800)):
     except Exception as e:
         print(f"Erreur lors du redimensionnement de l'image: {e}")
         return image_field
+
+
+def generate_webp(image_field, max_size=(800, 800), quality=80):
+    """Génère une variante WebP de l'image (dimensions max conservées)"""
+    if not image_field:
+        return None
+
+    try:
+        img = Image.open(image_field)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(max_size, Image.LANCZOS)
+
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+
+        buffer = BytesIO()
+        img.save(buffer, format='WEBP', quality=quality, method=4)
+        buffer.seek(0)
+
+        filename = os.path.splitext(os.path.basename(image_field.name))[0]
+        return ContentFile(buffer.getvalue(), name=f"{filename}.webp")
+    except Exception as e:
+        print(f"Erreur lors de la génération de l'image WebP: {e}")
+        return None
+
+
+def traiter_image_produit(contenu, nom, max_size, thumbnail_size):
+    """
+    Produire les variantes d'une image produit : image redimensionnée
+    (None si déjà aux bonnes dimensions), miniature et WebP.
+
+    Exécuté dans les processus du pool d'images (users/images.py) : ne
+    reçoit et ne retourne que des octets et des noms de fichiers.
+    """
+    def lire(fichier):
+        if fichier is None:
+            return None
+        fichier.seek(0)
+        return os.path.basename(fichier.name), fichier.read()
+
+    original = ContentFile(contenu, name=nom)
+    image = resize_image(original, max_size=max_size)
+    thumbnail = generate_thumbnail(ContentFile(contenu, name=nom), size=thumbnail_size)
+    webp = generate_webp(ContentFile(contenu, name=nom), max_size=max_size)
+
+    return {
+        'image': lire(image) if image is not original else None,
+        'thumbnail': lire(thumbnail),
+        'webp': lire(webp),
+    }
@@ -5,13 +5,26 @@ from rest_framework.decorators import action
 from django.contrib.auth import get_user_model, authenticate
 from knox.models import AuthToken
 from django.db import transaction
-from django.db.models import Sum, Q, Count, F
+from django.db.models import Sum, Q, Count, F, Prefetch, ExpressionWrapper, DecimalField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
 from datetime import datetime, timedelta
-from django.http import HttpResponse
+from decimal import Decimal, InvalidOperation
+from django.http import HttpResponse, FileResponse, Http404
 import csv
 
 from .serializers import *
 from .models import *
+from .pagination import CurseurPagination
+from .exports import (
+    reponse_export_csv, COLONNES_EXPORT_VENTES, COLONNES_EXPORT_MOUVEMENTS,
+    COLONNES_EXPORT_AUDIT
+)
+from .factures import obtenir_pdf_facture, preparer_factures, archive_factures
+from .audit import journaliser
+from .cache import reponse_en_cache, valeur_revalidee
+from .recherche import rechercher
+from .archives import mois_archives, rechercher_archive
+from . import metriques
 
 User = get_user_model()
 
@@ -26,6 +39,41 @@ class IsAdminOrVendeur(permissions.BasePermission):
         return request.user.is_authenticated and request.user.role in ['admin', 'vendeur']
 
 
+class RechercheMixin:
+    """
+    Recherche plein texte `?q=` sur la liste : résultats triés par
+    pertinence et limités (users/recherche.py), servis en une seule page
+    (même enveloppe que la liste paginée, sans `next` ni `previous`).
+    L'export retient tous les résultats.
+    """
+    parametres_recherche = ('q',)
+
+    def texte_recherche(self):
+        for parametre in self.parametres_recherche:
+            texte = self.request.query_params.get(parametre)
+            if texte:
+                return texte
+        return None
+
+    def filtrer_recherche(self, queryset):
+        texte = self.texte_recherche()
+        if texte and self.action == 'list':
+            return rechercher(queryset, texte)
+        if texte and self.action == 'export':
+            return rechercher(queryset, texte, limite=None)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        if self.texte_recherche():
+            return None if self.paginator is None else list(queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        if self.texte_recherche():
+            return Response({'next': None, 'previous': None, 'results': data})
+        return super().get_paginated_response(data)
+
+
 class LoginViewset(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     serializer_class = LoginSerializer
@@ -37,7 +85,7 @@ class LoginViewset(viewsets.ViewSet):
             password = serializer.validated_data['password']
             user = authenticate(request, email=email, password=password)
             if user:
-                AuditLog.objects.create(
+                journaliser(
                     user=user,
                     action='connexion',
                     modele='User',
@@ -141,7 +189,7 @@ class UserViewset(viewsets.ViewSet):
             user.set_password(new_password)
             user.save()
 
-            AuditLog.objects.create(
+            journaliser(
                 user=request.user,
                 action='modification',
                 modele='User',
@@ -178,6 +226,10 @@ class CategorieViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Categorie.objects.all()
 
+    @reponse_en_cache('categorie')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
@@ -193,7 +245,7 @@ class FournisseurViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
-class ProduitViewSet(viewsets.ModelViewSet):
+class ProduitViewSet(RechercheMixin, viewsets.ModelViewSet):
     serializer_class = ProduitSerializer
     permission_classes = [IsAdminOrVendeur]
 
@@ -203,7 +255,14 @@ class ProduitViewSet(viewsets.ModelViewSet):
         return context
 
     def get_queryset(self):
-        queryset = Produit.objects.all()
+        queryset = Produit.objects.select_related(
+            'categorie', 'fournisseur', 'created_by'
+        ).prefetch_related(
+            Prefetch(
+                'stockentrepot_set',
+                queryset=StockEntrepot.objects.select_related('entrepot')
+            )
+        )
 
         categorie_id = self.request.query_params.get('categorie')
         if categorie_id:
@@ -211,26 +270,29 @@ class ProduitViewSet(viewsets.ModelViewSet):
 
         low_stock = self.request.query_params.get('low_stock')
         if low_stock:
-            produits_ids = [p.id for p in queryset if p.stock_faible]
-            queryset = queryset.filter(id__in=produits_ids)
+            queryset = queryset.stock_faible()
 
         out_of_stock = self.request.query_params.get('out_of_stock')
         if out_of_stock:
-            produits_ids = [p.id for p in queryset if p.en_rupture]
-            queryset = queryset.filter(id__in=produits_ids)
+            queryset = queryset.en_rupture()
 
-        return queryset
+        return self.filtrer_recherche(queryset)
+
+    @reponse_en_cache('produit', 'stock', 'categorie', 'fournisseur', 'entrepot')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(RechercheMixin, viewsets.ModelViewSet):
     serializer_class = ClientSerializer
     permission_classes = [IsAdminOrVendeur]
+    pagination_class = CurseurPagination
 
     def get_queryset(self):
-        return Client.objects.all()
+        return self.filtrer_recherche(Client.objects.select_related('created_by'))
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -239,9 +301,12 @@ class ClientViewSet(viewsets.ModelViewSet):
 class MouvementStockViewSet(viewsets.ModelViewSet):
     serializer_class = MouvementStockSerializer
     permission_classes = [IsAdmin]
+    pagination_class = CurseurPagination
 
     def get_queryset(self):
-        queryset = MouvementStock.objects.all().order_by('-created_at')
+        queryset = MouvementStock.objects.select_related(
+            'produit', 'entrepot', 'created_by'
+        ).order_by('-created_at')
 
         entrepot_id = self.request.query_params.get('entrepot')
         if entrepot_id:
@@ -256,13 +321,22 @@ class MouvementStockViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV streamé des mouvements (mêmes filtres que la liste)"""
+        return reponse_export_csv(
+            request, self.get_queryset(), COLONNES_EXPORT_MOUVEMENTS,
+            'mouvements_stock')
+
 
 class EntrepotViewSet(viewsets.ModelViewSet):
     serializer_class = EntrepotSerializer
     permission_classes = [IsAdminOrVendeur]
 
     def get_queryset(self):
-        return Entrepot.objects.filter(actif=True)
+        return Entrepot.objects.filter(actif=True).avec_valeur_stock().select_related(
+            'responsable', 'created_by'
+        ).order_by('nom')
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -271,9 +345,10 @@ class EntrepotViewSet(viewsets.ModelViewSet):
 class StockEntrepotViewSet(viewsets.ModelViewSet):
     serializer_class = StockEntrepotSerializer
     permission_classes = [IsAdminOrVendeur]
+    pagination_class = CurseurPagination
 
     def get_queryset(self):
-        queryset = StockEntrepot.objects.all()
+        queryset = StockEntrepot.objects.select_related('entrepot', 'produit')
 
         entrepot_id = self.request.query_params.get('entrepot')
         if entrepot_id:
@@ -300,9 +375,10 @@ class StockEntrepotViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
 
         # Sérialiser les données
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_serializer(page, many=True)
         data = serializer.data
 
         # Pour les vendeurs, masquer les informations de valeur
@@ -316,62 +392,90 @@ class StockEntrepotViewSet(viewsets.ModelViewSet):
                 # Optionnel : ajouter un indicateur
                 item['valeur_masquee'] = True
 
-        return Response(data)
+        return self.get_paginated_response(data)
 
     @action(detail=False, methods=['get'])
+    @reponse_en_cache('stock', 'produit', 'entrepot')
     def stock_global(self, request):
         entrepot_id = request.query_params.get('entrepot')
         user = request.user
 
         if entrepot_id:
             stocks = StockEntrepot.objects.filter(entrepot_id=entrepot_id)
+            produits = Produit.objects.filter(
+                stockentrepot__entrepot_id=entrepot_id)
         else:
             stocks = StockEntrepot.objects.all()
+            produits = Produit.objects.filter(stockentrepot__isnull=False)
 
-        data = []
-        produits_ids = stocks.values_list('produit_id', flat=True).distinct()
-
-        # Variable pour stocker la valeur totale du stock (seulement pour admin)
-        valeur_stock_total = 0
+        # Un seul GROUP BY pour les totaux par produit ; le filtre posé
+        # avant annotate() restreint les sommes aux lignes de l'entrepôt.
+        valeur_expr = ExpressionWrapper(
+            F('stockentrepot__quantite') * F('prix_achat'),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+        produits = produits.annotate(
+            total_quantite=Sum('stockentrepot__quantite'),
+            total_reservee=Sum('stockentrepot__quantite_reservee'),
+            valeur_stock=Sum(valeur_expr),
+        ).prefetch_related(
+            Prefetch(
+                'stockentrepot_set',
+                queryset=stocks.select_related('entrepot')
+            )
+        ).order_by('nom', 'id')
 
-        for produit_id in produits_ids:
-            produit_stocks = stocks.filter(produit_id=produit_id)
-            produit = Produit.objects.get(id=produit_id)
+        # Pagination optionnelle (page / page_size, plafonné comme CurseurPagination)
+        page = request.query_params.get('page')
+        pagination = None
+        if page:
+            try:
+                page = int(page)
+                page_size = int(request.query_params.get('page_size', 50))
+            except ValueError:
+                page = page_size = 0
+            if page < 1 or page_size < 1:
+                return Response(
+                    {"error": "page et page_size doivent être des entiers positifs"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            page_size = min(page_size, CurseurPagination.max_page_size)
+            count = produits.count()
+            start_index = (page - 1) * page_size
+            produits = produits[start_index:start_index + page_size]
+            pagination = {
+                'count': count,
+                'page': page,
+                'page_size': page_size,
+                'total_pages': (count + page_size - 1) // page_size
+            }
 
-            total_quantite = float(produit_stocks.aggregate(
-                Sum('quantite'))['quantite__sum'] or 0)
-            total_reservee = float(produit_stocks.aggregate(
-                Sum('quantite_reservee'))['quantite_reservee__sum'] or 0)
+        data = []
+        for produit in produits:
+            total_quantite = float(produit.total_quantite or 0)
+            total_reservee = float(produit.total_reservee or 0)
 
             # Données de base (visibles par tous)
             item = {
-                'produit_id': produit_id,
+                'produit_id': produit.id,
                 'produit_nom': produit.nom,
                 'produit_code': produit.code,
                 'total_quantite': total_quantite,
                 'total_reservee': total_reservee,
                 'total_disponible': total_quantite - total_reservee,
                 'stocks_par_entrepot': StockEntrepotSerializer(
-                    produit_stocks, many=True
+                    produit.stockentrepot_set.all(), many=True
                 ).data
             }
 
             # Données financières (visibles seulement par les admins)
             if user.role == 'admin':
-                # Calculer la valeur du stock pour ce produit
-                valeur_produit = 0
-                for stock in produit_stocks:
-                    valeur_produit += float(stock.quantite) * \
-                        float(produit.prix_achat)
-
-                valeur_stock_total += valeur_produit
-
                 item['prix_achat'] = float(produit.prix_achat)
                 item['prix_vente'] = float(produit.prix_vente)
                 item['prix_vente_gros'] = float(produit.prix_vente_gros or 0)
                 item['prix_vente_detail'] = float(
                     produit.prix_vente_detail or 0)
-                item['valeur_stock'] = valeur_produit
+                item['valeur_stock'] = float(produit.valeur_stock or 0)
             else:
                 # Pour les vendeurs, valeurs masquées
                 item['valeur_masquee'] = True
@@ -386,12 +490,21 @@ class StockEntrepotViewSet(viewsets.ModelViewSet):
                 'valeur_masquee': user.role != 'admin'
             }
         }
+        if pagination:
+            response_data['meta'].update(pagination)
 
         # Ajouter la valeur totale du stock seulement pour les admins
         if user.role == 'admin':
+            totaux = stocks.aggregate(
+                valeur_stock_total=Sum(ExpressionWrapper(
+                    F('quantite') * F('produit__prix_achat'),
+                    output_field=DecimalField(max_digits=20, decimal_places=2)
+                )),
+                total_produits=Count('produit', distinct=True)
+            )
             response_data['stats'] = {
-                'valeur_stock_total': valeur_stock_total,
-                'total_produits': len(produits_ids)
+                'valeur_stock_total': float(totaux['valeur_stock_total'] or 0),
+                'total_produits': totaux['total_produits']
             }
 
         return Response(response_data)
@@ -619,18 +732,21 @@ class TransfertEntrepotViewSet(viewsets.ModelViewSet):
                     )
 
                     if float(ligne.quantite) > stock_source.quantite_disponible:  # MODIFICATION
+                        metriques.transferts.inc(resultat='refus')
                         return Response(
                             {"detail": f"Stock insuffisant pour {ligne.produit.nom}."},
                             status=status.HTTP_400_BAD_REQUEST
                         )
 
                 except StockEntrepot.DoesNotExist:
+                    metriques.transferts.inc(resultat='refus')
                     return Response(
                         {"detail": f"Produit {ligne.produit.nom} non disponible dans {transfert.entrepot_source.nom}."},
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
             transfert.confirmer_transfert()
+            metriques.transferts.inc(resultat='succes')
 
             return Response(
                 {"detail": "Transfert confirmé avec succès.",
@@ -644,6 +760,7 @@ class TransfertEntrepotViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
+            metriques.transferts.inc(resultat='erreur')
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
@@ -678,6 +795,7 @@ class TransfertEntrepotViewSet(viewsets.ModelViewSet):
 class VenteViewSet(viewsets.ModelViewSet):
     serializer_class = VenteDetailSerializer
     permission_classes = [IsAdminOrVendeur]
+    pagination_class = CurseurPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -721,7 +839,23 @@ class VenteViewSet(viewsets.ModelViewSet):
         if user.role != 'admin':
             queryset = queryset.filter(created_by=user)
 
-        return queryset
+        return self.avec_details(queryset)
+
+    @staticmethod
+    def avec_details(queryset):
+        """Précharger les relations lues par VenteDetailSerializer"""
+        return queryset.select_related(
+            'client', 'created_by', 'facture'
+        ).prefetch_related(
+            'lignes_vente__produit', 'lignes_vente__entrepot',
+            'paiements__created_by', 'entrepots'
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV streamé des ventes (mêmes filtres que la liste)"""
+        return reponse_export_csv(
+            request, self.get_queryset(), COLONNES_EXPORT_VENTES, 'ventes')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -744,49 +878,23 @@ class VenteViewSet(viewsets.ModelViewSet):
                 self.perform_create(serializer)
                 vente = serializer.instance
 
-                stocks_reserves = []
-                for ligne in vente.lignes_vente.all():
-                    try:
-                        stock_entrepot = StockEntrepot.objects.get(
-                            produit=ligne.produit,
-                            entrepot=ligne.entrepot
-                        )
-
-                        stock_disponible = stock_entrepot.quantite_disponible
-
-                        if float(ligne.quantite) > stock_disponible:  # MODIFICATION
-                            raise serializers.ValidationError({
-                                'lignes_vente': f'Stock insuffisant pour {ligne.produit.nom} dans {ligne.entrepot.nom}. Disponible: {stock_disponible:.2f}'
-                            })
+                # Une lecture verrouillée + un UPDATE pour toutes les lignes
+                try:
+                    stocks_reserves = StockEntrepot.reserver_lignes(
+                        vente.lignes_vente.select_related('produit', 'entrepot')
+                    )
+                except ValueError as e:
+                    raise serializers.ValidationError({
+                        'lignes_vente': str(e)
+                    })
 
-                        ancienne_reserve = float(
-                            stock_entrepot.quantite_reservee)  # MODIFICATION
-                        stock_entrepot.quantite_reservee = F(
-                            'quantite_reservee') + ligne.quantite
-                        stock_entrepot.save()
-                        stock_entrepot.refresh_from_db()
-
-                        stocks_reserves.append({
-                            'produit': ligne.produit.nom,
-                            'entrepot': ligne.entrepot.nom,
-                            'quantite': float(ligne.quantite),  # MODIFICATION
-                            'ancienne_reserve': ancienne_reserve,
-                            # MODIFICATION
-                            'nouvelle_reserve': float(stock_entrepot.quantite_reservee),
-                            # MODIFICATION
-                            'stock_total': float(stock_entrepot.quantite)
-                        })
-
-                    except StockEntrepot.DoesNotExist:
-                        raise serializers.ValidationError({
-                            'lignes_vente': f'Stock non trouvé pour {ligne.produit.nom} dans {ligne.entrepot.nom}'
-                        })
-
-                AuditLog.objects.create(
+                journaliser(
                     user=request.user,
                     action='creation',
                     modele='Vente',
                     objet_id=vente.id,
+                    vente_id=vente.id,
+                    montant=vente.montant_total,
                     details={
                         'numero_vente': vente.numero_vente,
                         'type_reduction': vente.type_reduction,
@@ -797,8 +905,12 @@ class VenteViewSet(viewsets.ModelViewSet):
                         'statut': vente.statut
                     }
                 )
+                transaction.on_commit(
+                    lambda: metriques.ventes.inc(operation='creation', resultat='succes'))
 
-                response_serializer = VenteDetailSerializer(vente)
+                response_serializer = VenteDetailSerializer(
+                    self.avec_details(Vente.objects.filter(pk=vente.pk)).get()
+                )
 
                 return Response(
                     {
@@ -817,11 +929,13 @@ class VenteViewSet(viewsets.ModelViewSet):
                 )
 
         except serializers.ValidationError as e:
+            metriques.ventes.inc(operation='creation', resultat='refus')
             return Response(
                 {"error": e.detail},
                 status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
+            metriques.ventes.inc(operation='creation', resultat='erreur')
             return Response(
                 {"error": f"Erreur interne: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -916,12 +1030,16 @@ class VenteViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
-                vente.calculer_total()
-                vente.save()
-
+                # confirmer_vente() recalcule les totaux avant d'enregistrer
                 vente.confirmer_vente()
+                montant = vente.montant_total
+
+                def compter_confirmation():
+                    metriques.ventes.inc(operation='confirmation', resultat='succes')
+                    metriques.montant_ventes_confirmees.inc(float(montant))
+                transaction.on_commit(compter_confirmation)
 
-                vente.refresh_from_db()
+                vente = self.avec_details(Vente.objects.filter(pk=vente.pk)).get()
 
                 reduction_info = {
                     'type': vente.type_reduction,
@@ -941,11 +1059,91 @@ class VenteViewSet(viewsets.ModelViewSet):
         except Vente.DoesNotExist:
             return Response({"error": "Vente non trouvée"}, status=status.HTTP_404_NOT_FOUND)
         except ValueError as e:
+            metriques.ventes.inc(operation='confirmation', resultat='refus')
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            metriques.ventes.inc(operation='confirmation', resultat='erreur')
             return Response({"error": f"Erreur interne: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['get'])
+    def facture(self, request, pk=None):
+        """Télécharger le PDF de la facture (rendu en arrière-plan si absent)"""
+        vente = self.get_object()
+
+        if vente.statut != 'confirmee':
+            return Response(
+                {"error": "Seules les ventes confirmées ont une facture"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        facture = Facture.creer_pour_vente(vente)
+        try:
+            chemin = obtenir_pdf_facture(facture)
+        except TimeoutError:
+            return Response(
+                {"message": "Facture en cours de génération, réessayez dans quelques instants",
+                 "numero_facture": facture.numero_facture},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        return FileResponse(
+            facture.pdf_facture.storage.open(chemin, 'rb'),
+            as_attachment=True,
+            filename=f'{facture.numero_facture}.pdf',
+            content_type='application/pdf'
+        )
+
     @action(detail=False, methods=['get'])
+    def factures_periode(self, request):
+        """
+        Archive zip des factures des ventes confirmées sur une période. Les
+        PDF manquants sont rendus en arrière-plan : tant qu'il en reste, la
+        réponse est 202 avec le nombre de factures en attente. Aucune facture
+        n'est créée ici : celles des ventes confirmées avant la génération
+        automatique le sont par la commande creer_factures_manquantes
+        """
+        date_debut = request.query_params.get('date_debut')
+        date_fin = request.query_params.get('date_fin')
+        if not date_debut or not date_fin:
+            return Response(
+                {"error": "date_debut et date_fin sont requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ventes = list(self.get_queryset().filter(statut='confirmee'))
+        factures = []
+        for vente in ventes:
+            if hasattr(vente, 'facture'):
+                vente.facture.vente = vente
+                factures.append(vente.facture)
+        if not factures:
+            return Response(
+                {"error": "Aucune facture de vente confirmée sur cette période"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        sans_facture = len(ventes) - len(factures)
+
+        chemins, en_attente = preparer_factures(factures)
+        if en_attente:
+            return Response(
+                {"message": "Factures en cours de génération, réessayez dans quelques instants",
+                 "factures_en_attente": en_attente,
+                 "factures_pretes": len(factures) - en_attente,
+                 "ventes_sans_facture": sans_facture},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        response = FileResponse(
+            archive_factures(factures, chemins),
+            as_attachment=True,
+            filename=f'factures_{date_debut}_{date_fin}.zip',
+            content_type='application/zip'
+        )
+        response['X-Ventes-Sans-Facture'] = str(sans_facture)
+        return response
+
+    @action(detail=False, methods=['get'])
+    @reponse_en_cache('vente')
     def statistiques_reductions(self, request):
         user = request.user
         date_debut = request.query_params.get('date_debut')
@@ -959,17 +1157,23 @@ class VenteViewSet(viewsets.ModelViewSet):
                 created_by=user
             )
 
+        faits = VenteJournaliere.objects.pour_utilisateur(user)
+
         if date_debut and date_fin:
             queryset = queryset.filter(
                 created_at__date__gte=date_debut,
                 created_at__date__lte=date_fin
             )
+            faits = faits.filter(date__gte=date_debut, date__lte=date_fin)
 
-        stats_par_type = queryset.values('type_reduction').annotate(
-            nombre_ventes=Count('id'),
-            total_reduction=Sum('montant_reduction'),
-            total_ventes=Sum('montant_total')
-        ).order_by('type_reduction')
+        stats_par_type = [
+            dict(stats, nombre_ventes=round(float(stats['nombre_ventes'])))
+            for stats in faits.values('type_reduction').annotate(
+                nombre_ventes=Sum('nombre_ventes'),
+                total_reduction=Sum('montant_reduction'),
+                total_ventes=Sum('chiffre_affaires')
+            ).order_by('type_reduction')
+        ]
 
         top_reductions = queryset.filter(
             type_reduction__in=['pourcentage', 'montant']
@@ -988,16 +1192,13 @@ class VenteViewSet(viewsets.ModelViewSet):
                 'date': vente.created_at.strftime('%d/%m/%Y')
             })
 
-        total_reductions = float(queryset.filter(
-            type_reduction__in=['pourcentage', 'montant']
-        ).aggregate(total=Sum('montant_reduction'))['total'] or 0)
-
-        total_ventes = float(queryset.aggregate(
-            total=Sum('montant_total'))['total'] or 0)
+        totaux = faits.totaux()
+        total_reductions = totaux['montant_reduction']
+        total_ventes = totaux['chiffre_affaires']
         total_avant_reduction = total_ventes + total_reductions
 
         return Response({
-            'stats_par_type': list(stats_par_type),
+            'stats_par_type': stats_par_type,
             'top_reductions': top_reductions_data,
             'totaux': {
                 'total_reductions': total_reductions,
@@ -1043,13 +1244,11 @@ class HistoriqueClientViewSet(viewsets.ViewSet):
             if premiere_vente:
                 dernier_achat = premiere_vente.created_at
 
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 10))
-
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
+        nombre_ventes = ventes.count()
 
-        ventes_paginees = ventes[start_index:end_index]
+        paginator = CurseurPagination()
+        ventes_paginees = paginator.paginate_queryset(
+            VenteViewSet.avec_details(ventes), request, view=self)
 
         ventes_serializer = VenteDetailSerializer(ventes_paginees, many=True)
 
@@ -1059,15 +1258,15 @@ class HistoriqueClientViewSet(viewsets.ViewSet):
                 'total_achats': total_achats,
                 'total_paye': total_paye,
                 'solde_restant': total_achats - total_paye,
-                'nombre_ventes': ventes.count(),
+                'nombre_ventes': nombre_ventes,
                 'ventes_en_retard': ventes_en_retard,
                 'dernier_achat': dernier_achat
             },
             'ventes': ventes_serializer.data,
-            'count': ventes.count(),
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (ventes.count() + page_size - 1) // page_size
+            'count': nombre_ventes,
+            'page_size': paginator.page_size,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link()
         })
 
 
@@ -1122,36 +1321,24 @@ class RapportPaiementsViewSet(viewsets.ViewSet):
 class DashboardViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminOrVendeur]
 
-    def list(self, request):
-        user = request.user
-        today = datetime.now().date()
-        month_start = today.replace(day=1)
-        week_start = today - timedelta(days=today.weekday())
-
-        if user.role == 'admin':
-            ventes_filter = Vente.objects.filter(statut='confirmee')
-            clients_filter = Client.objects.all()
+    @staticmethod
+    def _bloc_stocks(role):
+        """Partie du tableau de bord commune à tous les utilisateurs d'un rôle"""
+        if role == 'admin':
             entrepots_filter = Entrepot.objects.all()
         else:
-            ventes_filter = Vente.objects.filter(
-                created_by=user, statut='confirmee'
-            )
-            clients_filter = Client.objects.all()
             entrepots_filter = Entrepot.objects.filter(actif=True)
 
-        total_ventes = ventes_filter.count()
-        chiffre_affaires = float(ventes_filter.aggregate(
-            Sum('montant_total'))['montant_total__sum'] or 0)
-        total_clients = clients_filter.count()
-        total_produits = Produit.objects.count()
-        total_entrepots = entrepots_filter.count()
+        # Valeur et nombre de produits calculés en une requête pour tous les entrepôts
+        entrepots_filter = list(
+            entrepots_filter.avec_valeur_stock().order_by('nom'))
 
         # Initialiser les variables liées au stock
         valeur_stock_total = 0
         entrepots_stocks = []
 
         # NE calculer la valeur du stock que pour les administrateurs
-        if user.role == 'admin':
+        if role == 'admin':
             for entrepot in entrepots_filter:
                 valeur_stock = entrepot.stock_total_valeur()
                 valeur_stock_total += valeur_stock
@@ -1175,12 +1362,6 @@ class DashboardViewSet(viewsets.ViewSet):
                     'occupation': 0  # Cacher le pourcentage d'occupation basé sur la valeur
                 })
 
-        ventes_mois = float(ventes_filter.filter(created_at__gte=month_start).aggregate(
-            Sum('montant_total'))['montant_total__sum'] or 0)
-
-        ventes_semaine = float(ventes_filter.filter(created_at__gte=week_start).aggregate(
-            Sum('montant_total'))['montant_total__sum'] or 0)
-
         produits_low_stock = []
         stocks_faibles = StockEntrepot.objects.filter(
             quantite__gt=F('quantite_reservee'),
@@ -1199,23 +1380,70 @@ class DashboardViewSet(viewsets.ViewSet):
                 'statut': 'faible'
             })
 
-        dernieres_ventes = ventes_filter.order_by('-created_at')[:5]
+        return {
+            'total_clients': Client.objects.count(),
+            'total_produits': Produit.objects.count(),
+            'total_entrepots': len(entrepots_filter),
+            'valeur_stock_total': valeur_stock_total,
+            'entrepots': entrepots_stocks,
+            'produits_low_stock': produits_low_stock,
+        }
+
+    @classmethod
+    def _donnees(cls, role, vendeur_id, today):
+        """
+        Tableau de bord d'un rôle, restreint aux ventes de `vendeur_id` (None :
+        toutes les ventes). Ne dépend pas de la requête : peut être recalculé
+        en arrière-plan après la fin de celle-ci.
+        """
+        month_start = today.replace(day=1)
+        week_start = today - timedelta(days=today.weekday())
+
+        ventes_filter = Vente.objects.filter(statut='confirmee')
+        faits = VenteJournaliere.objects.all()
+        if vendeur_id is not None:
+            ventes_filter = ventes_filter.filter(created_by_id=vendeur_id)
+            faits = faits.filter(vendeur_id=vendeur_id)
+
+        # Stocks et entrepôts : identiques pour tous les utilisateurs d'un
+        # rôle, calculés une seule fois et partagés entre leurs requêtes
+        stocks, fraicheur_stocks = valeur_revalidee(
+            f'dashboard-stocks:{role}',
+            lambda: cls._bloc_stocks(role),
+            ('produit', 'entrepot', 'stock', 'client')
+        )
+
+        # Agrégats de ventes lus dans la table de faits pré-agrégée
+        totaux_ventes = faits.aggregate(
+            total_ventes=Sum('nombre_ventes'),
+            total_ca=Sum('chiffre_affaires'),
+            total_ca_mois=Sum(
+                'chiffre_affaires', filter=Q(date__gte=month_start)),
+            total_ca_semaine=Sum(
+                'chiffre_affaires', filter=Q(date__gte=week_start)),
+        )
+
+        total_ventes = round(float(totaux_ventes['total_ventes'] or 0))
+        chiffre_affaires = float(totaux_ventes['total_ca'] or 0)
+        ventes_mois = float(totaux_ventes['total_ca_mois'] or 0)
+        ventes_semaine = float(totaux_ventes['total_ca_semaine'] or 0)
+
+        dernieres_ventes = VenteViewSet.avec_details(
+            ventes_filter).order_by('-created_at')[:5]
         ventes_serializer = VenteSerializer(dernieres_ventes, many=True)
 
-        top_produits = Produit.objects.filter(
-            lignedevente__vente__in=ventes_filter.filter(
-                created_at__gte=month_start
-            )
+        top_produits = faits.filter(date__gte=month_start).values(
+            'produit_id', 'produit__nom'
         ).annotate(
-            total_vendu=Sum('lignedevente__quantite')
+            total_vendu=Sum('quantite')
         ).order_by('-total_vendu')[:5]
 
         top_produits_data = []
         for produit in top_produits:
             top_produits_data.append({
-                'id': produit.id,
-                'nom': produit.nom,
-                'total_vendu': float(produit.total_vendu) if produit.total_vendu else 0
+                'id': produit['produit_id'],
+                'nom': produit['produit__nom'],
+                'total_vendu': float(produit['total_vendu'] or 0)
             })
 
         # Construire la réponse avec des données conditionnelles
@@ -1225,37 +1453,53 @@ class DashboardViewSet(viewsets.ViewSet):
                 'chiffre_affaires': chiffre_affaires,
                 'chiffre_affaires_mois': ventes_mois,
                 'chiffre_affaires_semaine': ventes_semaine,
-                'total_clients': total_clients,
-                'total_produits': total_produits,
-                'total_entrepots': total_entrepots,
+                'total_clients': stocks['total_clients'],
+                'total_produits': stocks['total_produits'],
+                'total_entrepots': stocks['total_entrepots'],
             },
-            'entrepots': entrepots_stocks,
-            'produits_low_stock': produits_low_stock,
+            'entrepots': stocks['entrepots'],
+            'produits_low_stock': stocks['produits_low_stock'],
             'top_produits': top_produits_data,
-            'dernieres_ventes': ventes_serializer.data
+            'dernieres_ventes': ventes_serializer.data,
+            'fraicheur_stocks': fraicheur_stocks,
         }
 
         # Ajouter la valeur du stock seulement pour les administrateurs
-        if user.role == 'admin':
-            response_data['stats']['valeur_stock_total'] = valeur_stock_total
+        if role == 'admin':
+            response_data['stats']['valeur_stock_total'] = stocks['valeur_stock_total']
 
-        return Response(response_data)
+        return response_data
 
+    def list(self, request):
+        user = request.user
+        today = datetime.now().date()
+        # Un administrateur voit toutes les ventes, un vendeur les siennes :
+        # une entrée par périmètre, partagée par les requêtes identiques
+        role = user.role
+        vendeur_id = None if role == 'admin' else user.pk
+        donnees, fraicheur = valeur_revalidee(
+            f'dashboard:{role}:{vendeur_id or "tous"}:{today.isoformat()}',
+            lambda: self._donnees(role, vendeur_id, today),
+            ('vente', 'produit', 'entrepot', 'stock', 'client')
+        )
+        return Response({**donnees, 'fraicheur': fraicheur})
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+
+class AuditLogViewSet(RechercheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = AuditLogSerializer
     permission_classes = [IsAdmin]
+    pagination_class = CurseurPagination
 
     def get_queryset(self):
         queryset = AuditLog.objects.all().order_by('-created_at')
 
+        # `search` : ancien paramètre, resté un filtre paginé. Il trouve
+        # aussi l'email de l'utilisateur, absent de l'index plein texte
         search = self.request.query_params.get('search')
         if search:
             queryset = queryset.filter(
-                Q(user__email__icontains=search) |
-                Q(modele__icontains=search) |
-                Q(action__icontains=search) |
-                Q(details__icontains=search)
+                Q(pk__in=rechercher(AuditLog.objects.all(), search, limite=None).values('pk')) |
+                Q(user__email__icontains=search)
             )
 
         action = self.request.query_params.get('action')
@@ -1274,21 +1518,69 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
         if date_fin:
             queryset = queryset.filter(created_at__date__lte=date_fin)
 
-        entrepot_id = self.request.query_params.get('entrepot')
-        if entrepot_id:
-            queryset = queryset.filter(
-                Q(modele='MouvementStock', details__icontains=f'"entrepot_id": {entrepot_id}') |
-                Q(modele='Vente',
-                  details__icontains=f'"entrepots": ["{entrepot_id}"')
-            )
+        # Colonnes indexées extraites de `details`
+        for parametre in ('entrepot', 'produit', 'vente'):
+            valeur = self.request.query_params.get(parametre)
+            if valeur:
+                if not valeur.isdigit():
+                    raise serializers.ValidationError({parametre: "Identifiant invalide"})
+                queryset = queryset.filter(**{f'{parametre}_id': valeur})
+
+        try:
+            montant_min = self.request.query_params.get('montant_min')
+            if montant_min:
+                queryset = queryset.filter(montant__gte=Decimal(montant_min))
+            montant_max = self.request.query_params.get('montant_max')
+            if montant_max:
+                queryset = queryset.filter(montant__lte=Decimal(montant_max))
+        except InvalidOperation:
+            raise serializers.ValidationError({'montant': "Montant invalide"})
 
-        return queryset.select_related('user')
+        return self.filtrer_recherche(queryset.select_related('user'))
+
+    @action(detail=False, methods=['get'])
+    def archives(self, request):
+        """
+        Sans `mois` : liste des mois archivés. Avec `mois` (AAAA-MM) :
+        recherche dans l'archive du mois (filtres action, modele, objet_id,
+        entrepot, produit, vente, utilisateur ; texte `q`)
+        """
+        mois = request.query_params.get('mois')
+        if not mois:
+            return Response(mois_archives())
+
+        correspondances = {
+            'action': 'action', 'modele': 'modele', 'objet_id': 'objet_id',
+            'entrepot': 'entrepot_id', 'produit': 'produit_id',
+            'vente': 'vente_id', 'utilisateur': 'user_email',
+        }
+        filtres = {
+            champ: request.query_params[parametre]
+            for parametre, champ in correspondances.items()
+            if request.query_params.get(parametre)
+        }
+        try:
+            limite = min(int(request.query_params.get('limite', 100)), 1000)
+            resultats = rechercher_archive(
+                mois, filtres, request.query_params.get('q'), limite)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except FileNotFoundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'mois': mois, 'nombre': len(resultats), 'resultats': resultats})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV streamé du journal d'audit (mêmes filtres que la liste)"""
+        return reponse_export_csv(
+            request, self.get_queryset(), COLONNES_EXPORT_AUDIT, 'audit_logs')
 
 
 class RapportsViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminOrVendeur]
 
     @action(detail=False, methods=['get'])
+    @reponse_en_cache('vente', 'produit', 'entrepot', 'client')
     def ventes(self, request):
         user = request.user
         date_debut = request.query_params.get('date_debut')
@@ -1305,83 +1597,86 @@ class RapportsViewSet(viewsets.ViewSet):
                 created_by=user
             )
 
+        # Les agrégats viennent de la table de faits ; avec un filtre
+        # entrepôt ou catégorie, les ventes et montants sont ceux des lignes
+        # concernées (répartis au prorata)
+        faits = VenteJournaliere.objects.pour_utilisateur(user)
+
         if date_debut and date_fin:
             queryset = queryset.filter(
                 created_at__date__gte=date_debut,
                 created_at__date__lte=date_fin
             )
+            faits = faits.filter(date__gte=date_debut, date__lte=date_fin)
 
         if vendeur_id and user.role == 'admin':
             queryset = queryset.filter(created_by_id=vendeur_id)
+            faits = faits.filter(vendeur_id=vendeur_id)
 
         if entrepot_id:
             queryset = queryset.filter(
                 lignes_vente__entrepot_id=entrepot_id
             ).distinct()
+            faits = faits.filter(entrepot_id=entrepot_id)
 
         if categorie_id:
             queryset = queryset.filter(
                 lignes_vente__produit__categorie_id=categorie_id
             ).distinct()
+            faits = faits.filter(produit__categorie_id=categorie_id)
 
+        totaux = faits.totaux()
         stats = {
-            'total_ventes': queryset.count(),
-            'chiffre_affaires_total': float(queryset.aggregate(
-                total=Sum('montant_total')
-            )['total'] or 0),
-            'clients_actifs': Client.objects.filter(
-                vente__in=queryset
-            ).distinct().count(),
-            'total_produits_vendus': float(LigneDeVente.objects.filter(
-                vente__in=queryset
-            ).aggregate(total=Sum('quantite'))['total'] or 0),
+            'total_ventes': totaux['nombre_ventes'],
+            'chiffre_affaires_total': totaux['chiffre_affaires'],
+            # Faits encore non nuls : les ventes annulées sont retranchées
+            'clients_actifs': faits.filter(
+                client__isnull=False, nombre_ventes__gt=0
+            ).values('client_id').distinct().count(),
+            'total_produits_vendus': totaux['quantite'],
         }
 
         if user.role == 'admin':
-            top_vendeur = User.objects.filter(
-                vente__in=queryset
+            top_vendeur = faits.filter(vendeur__isnull=False).values(
+                'vendeur_id', 'vendeur__email'
             ).annotate(
-                total_ventes=Count('vente')
+                total_ventes=Sum('nombre_ventes')
             ).order_by('-total_ventes').first()
 
             stats['top_vendeur'] = {
-                'id': top_vendeur.id if top_vendeur else None,
-                'email': top_vendeur.email if top_vendeur else 'N/A',
-                'total_ventes': top_vendeur.total_ventes if top_vendeur else 0
+                'id': top_vendeur['vendeur_id'] if top_vendeur else None,
+                'email': top_vendeur['vendeur__email'] if top_vendeur else 'N/A',
+                'total_ventes': round(float(top_vendeur['total_ventes'])) if top_vendeur else 0
             }
         else:
             stats['top_vendeur'] = {
                 'id': user.id,
                 'email': user.email,
-                'total_ventes': queryset.count()
+                'total_ventes': totaux['nombre_ventes']
             }
 
-        top_produit = Produit.objects.filter(
-            lignedevente__vente__in=queryset
-        ).annotate(
-            total_vendu=Sum('lignedevente__quantite')
+        top_produit = faits.values('produit_id', 'produit__nom').annotate(
+            total_vendu=Sum('quantite')
         ).order_by('-total_vendu').first()
 
         stats['top_produit'] = {
-            'id': top_produit.id if top_produit else None,
-            'nom': top_produit.nom if top_produit else 'N/A',
-            'total_vendu': float(top_produit.total_vendu) if top_produit and top_produit.total_vendu else 0
+            'id': top_produit['produit_id'] if top_produit else None,
+            'nom': top_produit['produit__nom'] if top_produit else 'N/A',
+            'total_vendu': float(top_produit['total_vendu'] or 0) if top_produit else 0
         }
 
-        top_entrepot = Entrepot.objects.filter(
-            lignes_vente__vente__in=queryset
-        ).annotate(
-            total_ventes=Count('lignedevente__vente', distinct=True)
+        top_entrepot = faits.values('entrepot_id', 'entrepot__nom').annotate(
+            total_ventes=Sum('nombre_ventes')
         ).order_by('-total_ventes').first()
 
         stats['top_entrepot'] = {
-            'id': top_entrepot.id if top_entrepot else None,
-            'nom': top_entrepot.nom if top_entrepot else 'N/A',
-            'total_ventes': top_entrepot.total_ventes if top_entrepot else 0
+            'id': top_entrepot['entrepot_id'] if top_entrepot else None,
+            'nom': top_entrepot['entrepot__nom'] if top_entrepot else 'N/A',
+            'total_ventes': round(float(top_entrepot['total_ventes'])) if top_entrepot else 0
         }
 
         ventes_detaillees = VenteSerializer(
-            queryset.order_by('-created_at')[:50],
+            VenteViewSet.avec_details(queryset).order_by('-created_at')[:50],
             many=True
         ).data
 
@@ -1391,6 +1686,7 @@ class RapportsViewSet(viewsets.ViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @reponse_en_cache('stock', 'produit', 'entrepot', 'categorie')
     def stocks(self, request):
         entrepot_id = request.query_params.get('entrepot')
 
@@ -1435,49 +1731,91 @@ class RapportsViewSet(viewsets.ViewSet):
 class StatistiquesViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminOrVendeur]
 
+    # Granularité -> (fonction de troncature SQL, format du libellé)
+    GRANULARITES = {
+        'jour': (TruncDay, '%d/%m'),
+        'semaine': (TruncWeek, '%d/%m'),
+        'mois': (TruncMonth, '%m/%Y'),
+    }
+
+    @staticmethod
+    def _periode_suivante(debut, granularite):
+        if granularite == 'jour':
+            return debut + timedelta(days=1)
+        if granularite == 'semaine':
+            return debut + timedelta(days=7)
+        if debut.month == 12:
+            return debut.replace(year=debut.year + 1, month=1)
+        return debut.replace(month=debut.month + 1)
+
     @action(detail=False, methods=['get'])
+    @reponse_en_cache('vente')
     def evolution_ventes(self, request):
         user = request.user
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
+        granularite = request.query_params.get('granularite', 'jour')
+        if granularite not in self.GRANULARITES:
+            return Response(
+                {'error': f"granularite doit valoir {', '.join(self.GRANULARITES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if user.role == 'admin':
-            ventes = Vente.objects.filter(
-                statut='confirmee',
-                created_at__date__gte=start_date,
-                created_at__date__lte=end_date
+        try:
+            end_date = datetime.strptime(
+                request.query_params['date_fin'], '%Y-%m-%d').date() \
+                if request.query_params.get('date_fin') else datetime.now().date()
+            start_date = datetime.strptime(
+                request.query_params['date_debut'], '%Y-%m-%d').date() \
+                if request.query_params.get('date_debut') else end_date - timedelta(days=30)
+        except ValueError:
+            return Response(
+                {'error': 'Dates attendues au format AAAA-MM-JJ'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        else:
-            ventes = Vente.objects.filter(
-                created_by=user,
-                statut='confirmee',
-                created_at__date__gte=start_date,
-                created_at__date__lte=end_date
+        if start_date > end_date:
+            return Response(
+                {'error': 'date_debut doit précéder date_fin'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        jours = {}
-        current_date = start_date
-        while current_date <= end_date:
-            jours[current_date.strftime('%Y-%m-%d')] = {
-                'date': current_date.strftime('%d/%m'),
-                'ventes': 0,
-                'chiffre_affaires': 0
-            }
-            current_date += timedelta(days=1)
+        tronquer, format_libelle = self.GRANULARITES[granularite]
 
-        for vente in ventes:
-            date_str = vente.created_at.date().strftime('%Y-%m-%d')
-            if date_str in jours:
-                jours[date_str]['ventes'] += 1
-                jours[date_str]['chiffre_affaires'] += float(
-                    vente.montant_total)
+        # Regroupement par période fait en base : seules les périodes
+        # ayant des ventes sont renvoyées
+        ventes_par_periode = VenteJournaliere.objects.pour_utilisateur(user).filter(
+            date__gte=start_date,
+            date__lte=end_date
+        ).annotate(
+            periode=tronquer('date')
+        ).values('periode').annotate(
+            nombre_ventes=Sum('nombre_ventes'),
+            chiffre_affaires=Sum('chiffre_affaires')
+        ).order_by('periode')
+        totaux = {ligne['periode']: ligne for ligne in ventes_par_periode}
+
+        # Périodes sans vente complétées à zéro
+        evolution = []
+        periode = start_date
+        if granularite == 'semaine':
+            periode = start_date - timedelta(days=start_date.weekday())
+        elif granularite == 'mois':
+            periode = start_date.replace(day=1)
+        while periode <= end_date:
+            ligne = totaux.get(periode)
+            evolution.append({
+                'date': periode.strftime(format_libelle),
+                'periode': periode.isoformat(),
+                'ventes': round(float(ligne['nombre_ventes'])) if ligne else 0,
+                'chiffre_affaires': float(ligne['chiffre_affaires']) if ligne else 0
+            })
+            periode = self._periode_suivante(periode, granularite)
 
         return Response({
             'periode': {
                 'debut': start_date.strftime('%d/%m/%Y'),
-                'fin': end_date.strftime('%d/%m/%Y')
+                'fin': end_date.strftime('%d/%m/%Y'),
+                'granularite': granularite
             },
-            'evolution': list(jours.values())
+            'evolution': evolution
         })
 
 
@@ -1531,11 +1869,13 @@ class StockOperationsViewSet(viewsets.ViewSet):
                     created_by=request.user
                 )
 
-                AuditLog.objects.create(
+                journaliser(
                     user=request.user,
                     action='modification',
                     modele='StockEntrepot',
                     objet_id=stock.id,
+                    entrepot=data['entrepot'],
+                    produit=data['produit'],
                     details={
                         'entrepot': data['entrepot'].nom,
                         'produit': data['produit'].nom,
@@ -1581,3 +1921,10 @@ class StockOperationsViewSet(viewsets.ViewSet):
                 })
         except Exception as e:
             return Response({'error': str(e)}, status=400)
+
+
+def exporter_metriques(request):
+    """Métriques au format texte Prometheus (users/metriques.py)"""
+    if not metriques.acces_autorise(request):
+        raise Http404
+    return HttpResponse(metriques.exporter(), content_type=metriques.TYPE_CONTENU)